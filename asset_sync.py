@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+AWS サービスアイコン認識ゲーム
+マニフェストを使ったアイコンの差分同期
+
+assets/icons/manifest.json に展開済みアイコンのファイル名・サイズ・CRC-32・SHA-256 を
+記録しておき、新しいアセットパッケージとの差分（追加・更新・削除）だけを反映する。
+パッケージに URL を指定した場合は HTTP Range リクエストで ZIP の中央ディレクトリと
+変更のあったメンバーだけをダウンロードするため、転送量も差分の大きさ程度で済む。
+
+使い方:
+    python asset_sync.py [アセットパッケージの URL または ZIP ファイルのパス]
+"""
+import hashlib
+import json
+import os
+import sys
+import time
+import zipfile
+import zlib
+
+from downloader import HTTPRangeFile
+from icon_cache import DEFAULT_CACHE_PATH, remove_pack_entries
+
+ICON_PACKAGE_URL = "https://d1.awsstatic.com/webteam/architecture-icons/q1-2025/Asset-Package_02072025.dee42cd0a6eaacc3da1ad9519579357fb546f803.zip"
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+def is_icon_filename(filename):
+    """出題対象のアイコンファイル（隠しファイルでなく "_64@5x.png" で終わるもの）か判定する関数"""
+    return filename.endswith("_64@5x.png") and not filename.startswith("._")
+
+def is_package_icon(member_name):
+    """
+    アセットパッケージ内の出題対象のアイコン（Architecture-Service-Icons の "_64@5x.png"）か判定する関数
+
+    同期（sync_icons）とパッケージからの読み込み（utils.ZipIconSource）で同じ判定を使う
+    """
+    return "Architecture-Service-Icons" in member_name and is_icon_filename(member_name.rsplit("/", 1)[-1])
+
+def _file_crc32(path):
+    """ファイルの CRC-32 を計算する"""
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+def build_manifest(icons_dir):
+    """
+    展開済みのアイコンファイルからマニフェストを作成する関数（マニフェストがない場合の基準）
+
+    Returns:
+        {ファイル名: {"size", "crc32", "sha256"}} の辞書
+    """
+    icons = {}
+    if not os.path.isdir(icons_dir):
+        return icons
+    for filename in sorted(os.listdir(icons_dir)):
+        if is_icon_filename(filename):
+            path = os.path.join(icons_dir, filename)
+            with open(path, "rb") as f:
+                data = f.read()
+            icons[filename] = {
+                "size": len(data),
+                "crc32": zlib.crc32(data),
+                "sha256": hashlib.sha256(data).hexdigest(),
+            }
+    return icons
+
+def load_manifest(icons_dir):
+    """
+    マニフェストを読み込む関数（ない場合は展開済みのファイルから作成する）
+
+    Returns:
+        {ファイル名: {"size", "crc32", "sha256"}} の辞書
+    """
+    path = os.path.join(icons_dir, MANIFEST_NAME)
+    if os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest["icons"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"警告: マニフェスト {path} を読み込めませんでした: {e}")
+    return build_manifest(icons_dir)
+
+def save_manifest(icons_dir, icons, package):
+    """マニフェストを書き出す関数"""
+    path = os.path.join(icons_dir, MANIFEST_NAME)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "package": package, "icons": icons},
+                  f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(temp_path, path)
+
+def open_package(package):
+    """
+    アセットパッケージを開く関数
+
+    Args:
+        package: ZIP ファイルのパス、または URL（Range リクエストで必要な部分だけを読み込む）
+
+    Returns:
+        (zipfile.ZipFile, HTTPRangeFile または None)
+    """
+    if package.startswith(("http://", "https://")):
+        remote = HTTPRangeFile(package)
+        return zipfile.ZipFile(remote), remote
+    return zipfile.ZipFile(package), None
+
+def sync_icons(package=ICON_PACKAGE_URL, icons_dir=os.path.join("assets", "icons"),
+               cache_path=DEFAULT_CACHE_PATH):
+    """
+    アセットパッケージとマニフェストを比較し、変更のあったアイコンだけを反映する関数
+
+    Args:
+        package: アセットパッケージの URL または ZIP ファイルのパス
+        icons_dir: アイコンディレクトリ
+        cache_path: アイコンキャッシュのパス（変更のあったアイコンのエントリを無効化する）
+
+    Returns:
+        {"added", "updated", "removed", "unchanged", "bytes_fetched"} の辞書
+    """
+    start = time.perf_counter()
+    os.makedirs(icons_dir, exist_ok=True)
+    current = load_manifest(icons_dir)
+
+    zip_ref, remote = open_package(package)
+    with zip_ref:
+        # 新しいパッケージの出題対象のメンバー（同じファイル名は最初のものを使う）
+        members = {}
+        for info in zip_ref.infolist():
+            if is_package_icon(info.filename):
+                members.setdefault(info.filename.rsplit("/", 1)[-1], info)
+
+        added, updated, unchanged = [], [], []
+        for filename, info in sorted(members.items()):
+            entry = current.get(filename)
+            if (entry is not None and entry["size"] == info.file_size and entry["crc32"] == info.CRC
+                    and os.path.exists(os.path.join(icons_dir, filename))):
+                unchanged.append(filename)
+            else:
+                (updated if entry is not None else added).append(filename)
+        removed = sorted(set(current) - set(members))
+
+        icons = {filename: current[filename] for filename in unchanged}
+        for filename in added + updated:
+            data = zip_ref.read(members[filename])
+            path = os.path.join(icons_dir, filename)
+            temp_path = path + ".tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+            icons[filename] = {
+                "size": len(data),
+                "crc32": zlib.crc32(data),
+                "sha256": hashlib.sha256(data).hexdigest(),
+            }
+
+    for filename in removed:
+        path = os.path.join(icons_dir, filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+    save_manifest(icons_dir, icons, package)
+
+    # 変更のあったアイコンだけキャッシュのエントリを無効化する
+    changed = updated + removed
+    invalidated = remove_pack_entries(cache_path, changed) if cache_path and changed else 0
+
+    bytes_fetched = remote.bytes_fetched if remote is not None else 0
+    elapsed = time.perf_counter() - start
+    print(f"アイコンを同期しました: 追加 {len(added)}、更新 {len(updated)}、削除 {len(removed)}、"
+          f"変更なし {len(unchanged)}（{elapsed:.1f}秒）")
+    if remote is not None:
+        print(f"ダウンロード量: {bytes_fetched / 1e6:.2f}MB / パッケージ全体 {remote.size / 1e6:.1f}MB"
+              f"（{remote.requests}リクエスト）")
+    if invalidated:
+        print(f"アイコンキャッシュのエントリを{invalidated}件無効化しました")
+
+    return {
+        "added": added,
+        "updated": updated,
+        "removed": removed,
+        "unchanged": unchanged,
+        "bytes_fetched": bytes_fetched,
+    }
+
+def main():
+    """コマンドラインから差分同期を実行する"""
+    package = sys.argv[1] if len(sys.argv) > 1 else ICON_PACKAGE_URL
+    try:
+        sync_icons(package)
+    except Exception as e:
+        print(f"エラー: アイコンの同期中に問題が発生しました: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+AWS サービスアイコン認識ゲーム
+画面と同じピクセル形式のテクスチャアトラス
+
+アイコンやピクセル化画像を、画面と同じピクセル形式の大きな Surface（ページ）に
+格子状に並べて格納する。格納した画像はページの部分 Surface（subsurface）として
+返すため、描画時はピクセル形式の変換なしに矩形をコピーするだけで済み、
+画像ごとに Surface を確保することもなくなる。
+"""
+import pygame
+
+from utils import ICON_SIZE
+
+class TextureAtlas:
+    """
+    固定サイズのスロットを格子状に並べたテクスチャアトラス
+
+    {キー: (ページ番号, 矩形)} の索引を持ち、空きスロットがなくなると新しいページを追加する。
+    スロットの解放（remove）は画像を参照する側が行う（PixelationCache が LRU で
+    破棄したアイコンのスロットを解放する）。解放したスロットは別の画像で上書きされるため、
+    remove した後は get や add で返された Surface を描画に使ってはならない。
+    """
+    def __init__(self, slot_size=ICON_SIZE, columns=5, rows=5, max_pages=None):
+        """
+        Args:
+            slot_size: スロットの大きさ（これより大きい画像は格納しない）
+            columns: 1ページの横方向のスロット数
+            rows: 1ページの縦方向のスロット数
+            max_pages: ページ数の上限（None の場合は制限しない）
+        """
+        self.slot_size = tuple(slot_size)
+        self.columns = columns
+        self.rows = rows
+        self.max_pages = max_pages
+        self.pages = []
+        self._free = []  # 空きスロット (ページ番号, 矩形)
+        self._slots = {}  # キー -> (ページ番号, 矩形, Surface)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, key):
+        return key in self._slots
+
+    @property
+    def capacity(self):
+        """現在のページで格納できる画像の数"""
+        return len(self.pages) * self.columns * self.rows
+
+    def _add_page(self):
+        """ページを追加し、そのスロットを空きスロットに加える"""
+        width, height = self.slot_size
+        page = pygame.Surface((width * self.columns, height * self.rows), pygame.SRCALPHA, 32)
+        if pygame.display.get_surface() is not None:
+            page = page.convert_alpha()
+        page.fill((0, 0, 0, 0))
+        index = len(self.pages)
+        self.pages.append(page)
+        # 左上のスロットから順に使う
+        for row in reversed(range(self.rows)):
+            for column in reversed(range(self.columns)):
+                self._free.append((index, pygame.Rect(column * width, row * height, width, height)))
+
+    def add(self, key, surface):
+        """
+        画像をアトラスに格納する（同じキーの画像があれば置き換える）
+
+        Args:
+            key: 画像を識別するキー
+            surface: 格納する画像（pygame.Surface）
+
+        Returns:
+            ページの部分 Surface（スロットより大きい画像やページ数の上限で格納できない場合は None）
+        """
+        width, height = surface.get_size()
+        if width > self.slot_size[0] or height > self.slot_size[1]:
+            return None
+        self.remove(key)
+        if not self._free:
+            if self.max_pages is not None and len(self.pages) >= self.max_pages:
+                return None
+            self._add_page()
+
+        index, slot = self._free.pop()
+        page = self.pages[index]
+        page.fill((0, 0, 0, 0), slot)
+        page.blit(surface, slot)
+        region = page.subsurface((slot.x, slot.y, width, height))
+        self._slots[key] = (index, slot, region)
+        return region
+
+    def get(self, key):
+        """格納した画像（ページの部分 Surface）を返す（格納していない場合は None）"""
+        slot = self._slots.get(key)
+        return slot[2] if slot is not None else None
+
+    def region(self, key):
+        """
+        格納した画像の位置を返す
+
+        Returns:
+            (ページ番号, 矩形)（格納していない場合は None）
+        """
+        slot = self._slots.get(key)
+        if slot is None:
+            return None
+        index, _, region = slot
+        return index, pygame.Rect(region.get_offset(), region.get_size())
+
+    def remove(self, key):
+        """画像のスロットを解放する"""
+        slot = self._slots.pop(key, None)
+        if slot is not None:
+            self._free.append(slot[:2])
+
+    def clear(self):
+        """全てのスロットを解放する（ページは再利用するため残す）"""
+        for key in list(self._slots):
+            self.remove(key)
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+AWS サービスアイコン認識ゲーム
+パフォーマンス計測（ベンチマーク）
+
+合成したアイコンカタログを使って、アイコンの読み込み・ピクセル化・画面描画・
+1ゲーム分のセッションの所要時間を計測する。画面は SDL のダミードライバーで
+作成するため、ディスプレイのない環境（CI など）でも実行できる。
+
+使い方:
+    python benchmark.py [--output 結果.json] [--baseline 基準.json] [--threshold 0.25]
+                        [--sizes 20,500,5000] [--repeat 5] [--filter 名前の一部]
+
+--baseline を指定すると基準の結果と中央値を比較し、threshold を超えて遅くなった
+項目があれば終了コード 1 で終了する。揺らぎによる誤判定を避けるため、比較する場合は
+MIN_REPEAT 回以上計測し、差が揺らぎの幅に収まる項目は遅くなったと判定しない。
+"""
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import pygame
+
+from engine import RESOLUTION_STEPS
+
+SCREEN_SIZE = (800, 600)
+SOURCE_ICON_SIZE = (320, 320)  # "_64@5x.png" のアイコンと同じ大きさ
+MIN_REPEAT = 5  # 基準と比較する場合の最小の計測回数（少ないと中央値が揺らぎで外れ値になる）
+NOISE_FLOOR_MS = 0.05  # これより小さい中央値の差は遅くなったと判定しない（ミリ秒）
+
+def measure(func, repeat=5, warmup=1, setup=None):
+    """
+    関数の実行時間を計測する
+
+    Args:
+        func: 計測する関数
+        repeat: 計測する回数
+        warmup: 計測前に実行する回数
+        setup: 毎回の実行前に呼び出す関数（計測には含めない）
+
+    Returns:
+        {"median_ms", "min_ms", "max_ms", "mean_ms", "runs"} の辞書
+    """
+    for _ in range(warmup):
+        if setup is not None:
+            setup()
+        func()
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "median_ms": statistics.median(times),
+        "min_ms": min(times),
+        "max_ms": max(times),
+        "mean_ms": statistics.fmean(times),
+        "runs": repeat,
+    }
+
+@contextlib.contextmanager
+def quiet():
+    """計測対象の print を抑止する"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def make_icon(rng):
+    """合成アイコンを1つ作成する（色付きの背景に図形を重ねた画像）"""
+    icon = pygame.Surface(SOURCE_ICON_SIZE, pygame.SRCALPHA)
+    icon.fill((rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255), 255))
+    for _ in range(6):
+        color = (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255), 255)
+        center = (rng.randint(0, SOURCE_ICON_SIZE[0]), rng.randint(0, SOURCE_ICON_SIZE[1]))
+        pygame.draw.circle(icon, color, center, rng.randint(10, 80))
+    return icon
+
+def make_catalog(root, count, seed=0):
+    """
+    合成アイコンのカタログ（assets/icons に "_64@5x.png" のファイルを並べたもの）を作成する
+
+    Returns:
+        カタログのディレクトリ（ゲームの作業ディレクトリとして使える）
+    """
+    directory = os.path.join(root, f"catalog_{count}")
+    icons_dir = os.path.join(directory, "assets", "icons")
+    os.makedirs(icons_dir, exist_ok=True)
+    rng = random.Random(seed)
+    for i in range(count):
+        path = os.path.join(icons_dir, f"Arch_Benchmark-Service-{i:05d}_64@5x.png")
+        if not os.path.exists(path):
+            pygame.image.save(make_icon(rng), path)
+    return directory
+
+def bench_load(results, root, sizes, repeat):
+    """ゲームと同じ IconStore と IconLoader によるアイコンの読み込み（キャッシュなし・キャッシュあり）"""
+    from icon_store import IconLoader, IconStore
+
+    for count in sizes:
+        directory = make_catalog(root, count)
+        icons_dir = os.path.join(directory, "assets", "icons")
+        cache_path = os.path.join(directory, "assets", "cache", "icons.pack")
+
+        def remove_cache():
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+
+        def load():
+            # ゲームと同じ設定のストアに、バックグラウンドの読み込みと同じ処理で登録する
+            store = IconStore(icons_dir, cache_path, max_entries=16)
+            loader = IconLoader(store)
+            with quiet():
+                loader.run()
+            return store
+
+        # 件数の多いカタログは1回の読み込みに時間がかかるため、計測回数を減らす
+        runs = repeat if count <= 500 else max(MIN_REPEAT, repeat // 2)
+        results[f"load_icons/cold/{count}"] = measure(lambda: load().close(), runs, setup=remove_cache)
+        load().close()
+        results[f"load_icons/warm/{count}"] = measure(lambda: load().close(), runs)
+
+        # 出題時のアイコンの取得（キャッシュのピクセルから Surface を作る。LRU に残らない数の名前を順に取得する）
+        store = load()
+        names = list(store)[:100]
+        stats = measure(lambda: [store[name] for name in names], repeat)
+        results[f"load_icons/get/{count}"] = {
+            key: value / len(names) if key.endswith("_ms") else value for key, value in stats.items()
+        }
+        store.close()
+
+def bench_pixelate(results, repeat):
+    """pixelate_image（解像度ステップごと）"""
+    from utils import ICON_SIZE, PIXELATE_ENGINES, PixelationCache, numpy, pixelate_image
+
+    image = pygame.transform.smoothscale(make_icon(random.Random(0)), ICON_SIZE)
+    for resolution in RESOLUTION_STEPS:
+        # 1回の実行が短いため、100回分をまとめて計測し1回あたりに換算する
+        stats = measure(lambda: [pixelate_image(image, resolution) for _ in range(100)], repeat)
+        results[f"pixelate_image/{resolution}"] = {
+            key: value / 100 if key.endswith("_ms") else value for key, value in stats.items()
+        }
+    
+    # 1つのアイコンの全解像度ステップの生成（問題の切り替え時の処理）
+    for engine in PIXELATE_ENGINES:
+        if engine == "mosaic" and numpy is None:
+            continue
+        cache = PixelationCache(engine=engine)
+        
+        def build():
+            for _ in range(20):
+                cache.clear()
+                cache.build("icon", image, RESOLUTION_STEPS)
+        
+        stats = measure(build, repeat)
+        results[f"pixelate_levels/{engine}"] = {
+            key: value / 20 if key.endswith("_ms") else value for key, value in stats.items()
+        }
+
+def bench_similarity(results, repeat, count=5000):
+    """見た目の近さの索引の作成と検索（紛らわしい選択肢用）"""
+    from similarity import SimilarityIndex
+
+    rng = random.Random(0)
+    # 合成アイコンの作成に時間がかかるため、少数の画像を繰り返して count 個にする
+    images = [make_icon(rng) for _ in range(64)]
+    icons = [(f"Service {i:05d}", images[i % len(images)]) for i in range(count)]
+    index = SimilarityIndex()
+
+    def build():
+        index.__init__()
+        index.add_many(icons)
+
+    results[f"similarity/build/{count}"] = measure(build, max(1, repeat // 2), warmup=0)
+    names = [name for name, _ in icons[:100]]
+    stats = measure(lambda: [index.similar(name, 3, rng) for name in names], repeat)
+    results[f"similarity/query/{count}"] = {key: value / len(names) if key.endswith("_ms") else value
+                                            for key, value in stats.items()}
+
+def create_game(directory):
+    """カタログのディレクトリを作業ディレクトリとしてゲームを作成し、アイコンの読み込みを待つ"""
+    from game import Game
+
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+    os.chdir(directory)
+    with quiet():
+        game = Game(screen)
+        game.icon_loader.join()
+        game.update_icon_loading()
+    return game
+
+def bench_screens(results, root, repeat):
+    """menu_screen・game_screen の全画面描画（1フレーム分）"""
+    game = create_game(make_catalog(root, 500))
+    frames = 60
+
+    def menu_frames():
+        for _ in range(frames):
+            game.menu_screen([])
+            game.renderer.present()
+
+    def game_frames():
+        for _ in range(frames):
+            game.game_screen([])
+            game.renderer.present()
+
+    stats = measure(menu_frames, repeat)
+    results["render/menu_screen"] = {key: value / frames if key.endswith("_ms") else value
+                                     for key, value in stats.items()}
+
+    with quiet():
+        game.start_game()
+    game.frame_time = 0.0  # 時間を進めずに同じ問題を描画し続ける
+    stats = measure(game_frames, repeat)
+    results["render/game_screen"] = {key: value / frames if key.endswith("_ms") else value
+                                     for key, value in stats.items()}
+    game.aws_icons.close()
+
+def bench_session(results, root, repeat):
+    """1ゲーム（10問）のセッション（出題、アイコンのデコード、ピクセル化、描画を含む）"""
+    game = create_game(make_catalog(root, 500))
+    frame_time = 0.25  # 1フレームで進める時間（秒）
+    answer_after = 4  # 出題から回答までのフレーム数
+
+    def session():
+        game.pixel_cache.clear()
+        with quiet():
+            game.start_game()
+        game.frame_time = frame_time
+        frame = 0
+        while game.state == "playing":
+            events = []
+            if game.engine.waiting and frame % answer_after == answer_after - 1:
+                # 先頭の選択肢をクリックする
+                events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=(150, 415), button=1))
+            game.game_screen(events)
+            game.renderer.present()
+            frame += 1
+        game.game_over_screen([])
+        game.renderer.present()
+
+    results["session/10_questions"] = measure(session, repeat)
+    game.aws_icons.close()
+
+def compare(results, baseline, threshold):
+    """
+    基準の結果と中央値を比較する
+
+    中央値が threshold を超えて遅くなっていても、その差が揺らぎの幅（NOISE_FLOOR_MS と、基準・今回の
+    それぞれの中央値と最小値の差のうち最大のもの）に収まる場合は遅くなったと判定しない
+
+    Returns:
+        遅くなった項目の名前のリスト
+    """
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"  {name}: 基準なし")
+            continue
+        ratio = stats["median_ms"] / base["median_ms"] if base["median_ms"] > 0 else 1.0
+        noise = max(NOISE_FLOOR_MS, base["median_ms"] - base["min_ms"], stats["median_ms"] - stats["min_ms"])
+        mark = ""
+        if ratio > 1 + threshold:
+            if stats["median_ms"] - base["median_ms"] > noise:
+                mark = "  <-- 遅くなっています"
+                regressions.append(name)
+            else:
+                mark = f"  （揺らぎの幅 {noise:.3f}ms の範囲内）"
+        print(f"  {name}: {base['median_ms']:.3f}ms -> {stats['median_ms']:.3f}ms（{ratio:.2f}倍）{mark}")
+    return regressions
+
+def main():
+    """ベンチマークを実行して結果を表示・保存する"""
+    parser = argparse.ArgumentParser(description="パフォーマンスを計測する")
+    parser.add_argument("--output", help="結果を書き出す JSON ファイル")
+    parser.add_argument("--baseline", help="比較する基準の結果（JSON ファイル）")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="基準より遅くなったと判定する割合（0.25 は 25%%）")
+    parser.add_argument("--sizes", default="20,500,5000", help="読み込みを計測するカタログのアイコン数（カンマ区切り）")
+    parser.add_argument("--repeat", type=int, default=5, help="各項目を計測する回数")
+    parser.add_argument("--filter", default="", help="名前にこの文字列を含む項目だけを計測する")
+    parser.add_argument("--workdir", help="合成カタログを作成するディレクトリ（指定した場合は次回以降も再利用する）")
+    args = parser.parse_args()
+
+    if args.baseline and args.repeat < MIN_REPEAT:
+        print(f"基準と比較するため、計測回数を {MIN_REPEAT} 回にします")
+        args.repeat = MIN_REPEAT
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    root = args.workdir or tempfile.mkdtemp(prefix="icon-benchmark-")
+    root = os.path.abspath(root)
+    cwd = os.getcwd()
+    # ゲームのモジュールはこのファイルと同じディレクトリから読み込む
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    pygame.init()
+    pygame.display.set_mode(SCREEN_SIZE)
+
+    benchmarks = [
+        ("load_icons", lambda results: bench_load(results, root, sizes, args.repeat)),
+        ("pixelate_image", lambda results: bench_pixelate(results, args.repeat)),
+        ("similarity", lambda results: bench_similarity(results, args.repeat)),
+        ("render", lambda results: bench_screens(results, root, args.repeat)),
+        ("session", lambda results: bench_session(results, root, args.repeat)),
+    ]
+
+    results = {}
+    try:
+        for name, run in benchmarks:
+            if args.filter and args.filter not in name:
+                continue
+            print(f"{name} を計測しています...")
+            run(results)
+    finally:
+        os.chdir(cwd)
+        if not args.workdir:
+            shutil.rmtree(root, ignore_errors=True)
+        pygame.quit()
+
+    for name, stats in results.items():
+        print(f"  {name}: 中央値 {stats['median_ms']:.3f}ms（最小 {stats['min_ms']:.3f}ms、{stats['runs']}回）")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1, sort_keys=True)
+        print(f"結果を {args.output} に書き出しました")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        print(f"基準 {args.baseline} との比較（許容 +{args.threshold:.0%}）:")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"エラー: {len(regressions)}項目が基準より遅くなっています: {', '.join(regressions)}")
+            sys.exit(1)
+        print("基準より遅くなった項目はありません")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+AWS サービスアイコン認識ゲーム
+中断からの再開と整合性チェックに対応したダウンローダー
+
+PyGame がインストールされる前の setup.py からも使うため、標準ライブラリだけで実装する
+"""
+import hashlib
+import io
+import http.client
+import os
+import re
+import socket
+import time
+import urllib.error
+import urllib.request
+
+class DownloadError(Exception):
+    """ダウンロードに失敗した場合の例外"""
+
+def _content_range_total(value):
+    """Content-Range ヘッダー（例: "bytes 100-199/1000"）から全体のサイズを取り出す"""
+    match = re.match(r"bytes\s+(?:(\d+)-\d+|\*)/(\d+|\*)", value or "")
+    if not match:
+        return None, None
+    start = int(match.group(1)) if match.group(1) is not None else None
+    total = int(match.group(2)) if match.group(2) != "*" else None
+    return start, total
+
+def file_sha256(path, chunk_size=1 << 20):
+    """ファイルの SHA-256 を計算する関数"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def download_file(url, dest_path, expected_size=None, sha256=None, chunk_size=1 << 20,
+                  retries=3, timeout=30, progress_interval=2.0):
+    """
+    ファイルをチャンク単位でディスクに書き出しながらダウンロードする関数
+
+    ダウンロード中のデータは "<dest_path>.part" に書き出し、中断した場合は
+    HTTP Range リクエストで続きからダウンロードする。完了後にサイズと
+    SHA-256 を検証してから dest_path に置き換える。
+
+    Args:
+        url: ダウンロードする URL
+        dest_path: 保存先のパス
+        expected_size: 期待するファイルサイズ（None の場合はサーバーの申告値で検証する）
+        sha256: 期待する SHA-256 の16進文字列（None の場合は検証しない）
+        chunk_size: 一度に読み書きするバイト数
+        retries: 通信エラー時に再開を試みる回数
+        timeout: 通信のタイムアウト（秒）
+        progress_interval: 進捗を表示する間隔（秒）
+
+    Returns:
+        ダウンロードしたファイルのサイズ（バイト）
+
+    Raises:
+        DownloadError: ダウンロードまたは検証に失敗した場合
+    """
+    directory = os.path.dirname(dest_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    part_path = dest_path + ".part"
+
+    start_time = time.perf_counter()
+    received = 0  # 今回の実行で受信したバイト数
+    total = expected_size
+    attempt = 0
+
+    while True:
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if total is not None and offset == total:
+            break
+
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                if offset and response.status == 206:
+                    range_start, range_total = _content_range_total(response.headers.get("Content-Range"))
+                    if range_start != offset:
+                        raise DownloadError(f"サーバーが要求と異なる範囲を返しました: {response.headers.get('Content-Range')}")
+                    mode = "ab"
+                    if range_total is not None:
+                        total = range_total
+                    print(f"{offset}バイト目からダウンロードを再開します")
+                else:
+                    # Range に対応していないサーバーの場合は最初からダウンロードし直す
+                    offset = 0
+                    mode = "wb"
+                    length = response.headers.get("Content-Length")
+                    if length is not None:
+                        total = int(length)
+
+                if expected_size is not None and total is not None and total != expected_size:
+                    raise DownloadError(f"ファイルサイズが一致しません（期待値 {expected_size}、サーバー {total}）")
+
+                last_report = time.perf_counter()
+                with open(part_path, mode) as f:
+                    while True:
+                        chunk = response.read(chunk_size)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        offset += len(chunk)
+                        received += len(chunk)
+
+                        now = time.perf_counter()
+                        if now - last_report >= progress_interval:
+                            last_report = now
+                            rate = received / (now - start_time) / 1e6
+                            if total:
+                                print(f"  {offset / 1e6:.1f}/{total / 1e6:.1f}MB（{offset * 100 // total}%、{rate:.1f}MB/s）")
+                            else:
+                                print(f"  {offset / 1e6:.1f}MB（{rate:.1f}MB/s）")
+        except urllib.error.HTTPError as e:
+            if e.code == 416 and offset:
+                # 既に最後まで受信済みの場合はそのまま検証に進む
+                _, range_total = _content_range_total(e.headers.get("Content-Range"))
+                if range_total == offset:
+                    total = offset
+                    break
+                os.remove(part_path)
+                continue
+            raise DownloadError(f"HTTPエラー {e.code}: {e.reason}") from e
+        except (urllib.error.URLError, http.client.HTTPException, socket.timeout, ConnectionError) as e:
+            attempt += 1
+            if attempt > retries:
+                raise DownloadError(f"通信エラーのためダウンロードを中断しました: {e}") from e
+            print(f"警告: 通信エラーが発生しました。再開します（{attempt}/{retries}）: {e}")
+            time.sleep(min(2 ** (attempt - 1), 10))
+            continue
+
+        if total is None or offset >= total:
+            break
+        # 接続が途中で切れた場合は続きから再開する
+        attempt += 1
+        if attempt > retries:
+            raise DownloadError(f"ダウンロードが途中で終了しました（{offset}/{total}バイト）")
+        print(f"警告: ダウンロードが途中で終了しました。再開します（{attempt}/{retries}）")
+
+    # サイズと SHA-256 の検証
+    size = os.path.getsize(part_path)
+    if total is not None and size != total:
+        os.remove(part_path)
+        raise DownloadError(f"ファイルサイズが一致しません（期待値 {total}、実際 {size}）")
+    if sha256 is not None:
+        actual = file_sha256(part_path)
+        if actual.lower() != sha256.lower():
+            os.remove(part_path)
+            raise DownloadError(f"SHA-256 が一致しません（期待値 {sha256}、実際 {actual}）")
+
+    os.replace(part_path, dest_path)
+
+    elapsed = time.perf_counter() - start_time
+    rate = received / elapsed / 1e6 if elapsed > 0 else 0.0
+    print(f"ダウンロードが完了しました: {size / 1e6:.1f}MB（{elapsed:.1f}秒、{rate:.1f}MB/s）")
+    return size
+
+class HTTPRangeFile(io.RawIOBase):
+    """
+    HTTP Range リクエストでリモートのファイルを部分的に読み込む、シーク可能なファイルオブジェクト
+
+    zipfile.ZipFile に渡すと、中央ディレクトリと実際に読み込むメンバーの分だけを
+    ダウンロードしてリモートの ZIP ファイルを扱える
+    """
+    def __init__(self, url, block_size=64 * 1024, timeout=30, retries=3):
+        """
+        Args:
+            url: 読み込むファイルの URL（サーバーが Range リクエストに対応している必要がある）
+            block_size: 一度に先読みするバイト数
+            timeout: 通信のタイムアウト（秒）
+            retries: 通信エラー時に再試行する回数
+        """
+        super().__init__()
+        self.url = url
+        self.block_size = block_size
+        self.timeout = timeout
+        self.retries = retries
+        self.bytes_fetched = 0  # 実際にダウンロードしたバイト数
+        self.requests = 0  # 送信した Range リクエストの数
+        self._pos = 0
+        self._block_start = 0
+        self._block = b""
+
+        # 先頭の1バイトを要求してファイルサイズと Range への対応を確認する
+        with self._open_range(0, 0) as response:
+            if response.status != 206:
+                raise DownloadError("サーバーが Range リクエストに対応していません")
+            _, self.size = _content_range_total(response.headers.get("Content-Range"))
+            if self.size is None:
+                raise DownloadError("ファイルサイズを取得できませんでした")
+            response.read()
+
+    def _open_range(self, start, end):
+        request = urllib.request.Request(self.url, headers={"Range": f"bytes={start}-{end}"})
+        self.requests += 1
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def _fetch(self, start, end):
+        """指定した範囲（end を含む）をダウンロードする"""
+        attempt = 0
+        while True:
+            try:
+                with self._open_range(start, end) as response:
+                    if response.status != 206:
+                        raise DownloadError("サーバーが Range リクエストに対応していません")
+                    data = response.read()
+                if len(data) != end - start + 1:
+                    raise http.client.IncompleteRead(data, end - start + 1 - len(data))
+                self.bytes_fetched += len(data)
+                return data
+            except (urllib.error.URLError, http.client.HTTPException, socket.timeout, ConnectionError) as e:
+                attempt += 1
+                if attempt > self.retries:
+                    raise DownloadError(f"通信エラーのため読み込みを中断しました: {e}") from e
+                time.sleep(min(2 ** (attempt - 1), 10))
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = self.size + offset
+        else:
+            raise ValueError(f"whence の値が正しくありません: {whence}")
+        self._pos = max(0, self._pos)
+        return self._pos
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.size - self._pos)
+        if size <= 0:
+            return 0
+        block_end = self._block_start + len(self._block)
+        if not (self._block_start <= self._pos and self._pos + size <= block_end):
+            # 先読みしたブロックに含まれない場合はまとめてダウンロードする
+            end = min(self.size, self._pos + max(size, self.block_size)) - 1
+            self._block = self._fetch(self._pos, end)
+            self._block_start = self._pos
+        start = self._pos - self._block_start
+        buffer[:size] = self._block[start:start + size]
+        self._pos += size
+        return size
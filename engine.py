@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+AWS サービスアイコン認識ゲーム
+PyGame に依存しないゲームのルール（出題、制限時間、スコア計算、時間切れ）
+
+画面の描画や入力の受け付けとは独立しているため、SDL のない環境でも
+ゲームのセッションを高速にシミュレーションできる。
+
+使い方:
+    python engine.py [--sessions 回数] [--icons アイコン数] [--accuracy 正答率] [--reaction 平均回答時間] [--seed シード]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from sampler import QuestionSampler
+
+RESOLUTION_STEPS = [256, 400, 576, 784, 1024, 1536, 2048]  # ピクセル化の解像度ステップ
+
+class QuizEngine:
+    """
+    ゲームのルールだけを扱うエンジン
+
+    時間は update(dt) で渡された分だけ進み、実時間の時計は参照しない。
+    状態が変化すると登録したリスナーを listener(イベント名, エンジン) の形で呼び出す。
+
+    イベント:
+        "start": ゲームを開始した
+        "question": 新しい問題を出題した
+        "upcoming": 次の問題を先に選んだ（upcoming に (正解, 選択肢) が入る。結果表示の間に
+            アイコンを先読みしておくために使う）
+        "answer": 選択肢が回答された
+        "timeout": 時間切れになった
+        "game_over": 全ての問題が終わった
+        "update": プレイ中に update で時間を進めた（進めた時間は last_dt に入る。
+            セッションの記録に使い、この後に時間切れなどのイベントが続くことがある）
+        "catalog": カタログに増えたサービス名をサンプラーに登録した（登録した順に added に入る）
+        "exclude": サービス名を出題対象から外した（外したサービス名は last_excluded に入る）
+    """
+    def __init__(self, catalog, rng=None, validate=None, countdown_time=30, max_questions=10,
+                 num_options=4, resolution_steps=RESOLUTION_STEPS, original_time=3.0,
+                 result_display_time=1.0, timeout_display_time=2.0, weight=None, similarity=None,
+                 sampler=None):
+        """
+        Args:
+            catalog: 出題するサービス名の集まり（出題のたびに読み直すため、読み込み中に増えてもよい）
+            rng: 出題に使う乱数生成器（random.Random 互換、None の場合は新しく作成する）
+            validate: 出題前に呼び出し、False を返したサービス名を出題対象から外す関数
+                （アイコンを読み込めなかった場合など）
+            countdown_time: 制限時間（秒）
+            max_questions: 1ゲームの問題数
+            num_options: 選択肢の数
+            resolution_steps: ピクセル化の解像度ステップ
+            original_time: 残り時間がこの秒数以下になったら元のアイコンを表示する
+            result_display_time: 回答後に結果を表示する時間（秒）
+            timeout_display_time: 時間切れの後に結果を表示する時間（秒）
+            weight: サービス名を受け取って正解としての選ばれやすさを返す関数（None の場合は一様）
+            similarity: 正解と見た目の近いアイコンを不正解の選択肢にするための索引
+                （similarity.SimilarityIndex、None の場合は一様に選ぶ）
+            sampler: 複数のエンジンで共有する QuestionSampler（None の場合はエンジンごとに作成する。
+                共有する場合はサービス名の登録は呼び出し側が行い、catalog からは登録しない）
+        """
+        self.catalog = catalog
+        self.rng = rng if rng is not None else random.Random()
+        self.validate = validate
+        self.countdown_time = countdown_time
+        self.max_questions = max_questions
+        self.num_options = num_options
+        self.resolution_steps = list(resolution_steps)
+        self.original_time = original_time
+        self.result_display_time = result_display_time
+        self.timeout_display_time = timeout_display_time
+        self.listeners = []
+        self.excluded = set()  # validate で出題対象から外したサービス名
+        # 正解は山札から引くため、全てのサービス名を出題するまで同じ問題は出ない
+        self._owns_sampler = sampler is None
+        self.sampler = QuestionSampler(rng=self.rng, weight=weight) if sampler is None else sampler
+        self.similarity = similarity
+        self._catalog_size = 0  # サンプラーに登録した時点のカタログの件数
+
+        self.state = "idle"  # idle, playing, game_over
+        self.time = 0.0  # エンジン内の経過時間（秒）
+        self.score = 0
+        self.combo = 0
+        self.correct_count = 0
+        self.timeout_count = 0
+        self.question_count = 0
+        self.current_time = self.countdown_time
+        self.correct_answer = ""
+        self.current_options = []
+        self.selected_answer = None  # None: 回答待ち、"": 時間切れ、それ以外: 選んだ選択肢
+        self.result_correct = False
+        self.result_time = 0.0
+        self.upcoming = None  # 先に選んだ次の問題 (正解, 選択肢)
+        self.last_dt = 0.0  # 最後に update で進めた時間（秒）
+        self.added = []  # 最後にサンプラーに登録したサービス名
+        self.last_excluded = None  # 最後に出題対象から外したサービス名
+
+    def add_listener(self, listener):
+        """状態の変化を通知するリスナーを登録する"""
+        self.listeners.append(listener)
+
+    @property
+    def owns_sampler(self):
+        """サンプラーをこのエンジンで作成したか（共有するサンプラーを渡した場合は False）"""
+        return self._owns_sampler
+
+    def _emit(self, event):
+        for listener in self.listeners:
+            listener(event, self)
+
+    def names(self):
+        """出題できるサービス名のリストを返す"""
+        self._sync_catalog()
+        return list(self.sampler)
+
+    def _sync_catalog(self):
+        """カタログに増えたサービス名をサンプラーに登録する（件数が変わった場合だけ走査する）"""
+        size = len(self.catalog)
+        if size == self._catalog_size or not self._owns_sampler:
+            return
+        self._catalog_size = size
+        added = []
+        for name in self.catalog:
+            if name not in self.excluded and name not in self.sampler:
+                self.sampler.add(name)
+                added.append(name)
+        if added:
+            self.added = added
+            self._emit("catalog")
+
+    def exclude(self, name):
+        """サービス名を出題対象から外す"""
+        self.excluded.add(name)
+        self.sampler.remove(name)
+        self.last_excluded = name
+        self._emit("exclude")
+
+    def can_start(self):
+        """選択肢を作れるだけのサービス名があるか"""
+        return len(self.catalog) - len(self.excluded) >= self.num_options
+
+    @property
+    def resolution_level(self):
+        """残り時間に応じたピクセル化の解像度"""
+        steps = self.resolution_steps
+        index = min(len(steps) - 1, int((1 - self.current_time / self.countdown_time) * len(steps)))
+        return steps[index]
+
+    @property
+    def show_original(self):
+        """元のアイコンをそのまま表示するか（時間切れ間近）"""
+        return self.current_time <= self.original_time
+
+    @property
+    def waiting(self):
+        """回答を待っている状態か"""
+        return self.state == "playing" and self.selected_answer is None
+
+    def result_remaining(self):
+        """結果表示が終わって次の問題に進むまでの時間（秒）"""
+        duration = self.timeout_display_time if self.selected_answer == "" else self.result_display_time
+        return self.result_time + duration - self.time
+
+    def start(self):
+        """ゲームを開始する"""
+        self.state = "playing"
+        self.score = 0
+        self.combo = 0
+        self.correct_count = 0
+        self.timeout_count = 0
+        self.question_count = 0
+        self._emit("start")
+        self.next_question()
+
+    def _choose_question(self):
+        """
+        ランダムに問題を選ぶ（validate は呼び出さない）
+
+        Returns:
+            (正解, 選択肢のリスト)
+        """
+        self._sync_catalog()
+        if len(self.sampler) < self.num_options:
+            raise ValueError(f"出題できるサービスが{self.num_options}個未満です")
+        similarity = self.similarity
+        if similarity is None:
+            return self.sampler.question(self.num_options)
+
+        # 正解と見た目の近いアイコンを不正解の選択肢にする（足りない分は一様に選ぶ）
+        correct_answer = self.sampler.draw()
+        count = self.num_options - 1
+        options = [correct_answer]
+        options += [name for name in similarity.similar(correct_answer, count, self.rng, exclude=self.excluded)
+                    if name in self.sampler]
+        if len(options) < self.num_options:
+            extra = self.sampler.distractors(correct_answer, min(count + len(options) - 1, len(self.sampler) - 1))
+            options += [name for name in extra if name not in options][:self.num_options - len(options)]
+        self.rng.shuffle(options)
+        return correct_answer, options
+
+    def prepare_next(self):
+        """
+        次の問題を先に選んでおき、"upcoming" を通知する
+
+        回答後の結果表示の間に呼び出すことで、出題前にアイコンの読み込みや
+        ピクセル化を済ませておける。選んだ問題は次の next_question で出題する。
+        """
+        if self.upcoming is not None or not self.can_start():
+            return
+        if self.state == "playing" and self.question_count >= self.max_questions:
+            return
+        self.upcoming = self._choose_question()
+        self._emit("upcoming")
+
+    def next_question(self):
+        """次の問題を出題する（問題数に達した場合はゲームを終了する）"""
+        if self.question_count >= self.max_questions:
+            self.state = "game_over"
+            self._emit("game_over")
+            return
+
+        # 先に選んでおいた問題があればそれを出題する（validate で弾かれたものは選び直す）
+        question, self.upcoming = self.upcoming, None
+        while True:
+            if question is None or question[0] in self.excluded:
+                question = self._choose_question()
+            if self.validate is None or self.validate(question[0]):
+                break
+            self.exclude(question[0])
+            question = None
+        self.correct_answer, self.current_options = question
+
+        self.question_count += 1
+        self.current_time = self.countdown_time
+        self.selected_answer = None
+        self.result_correct = False
+        self.result_time = 0.0
+        self._emit("question")
+
+    def answer(self, option):
+        """
+        選択肢を回答する
+
+        Returns:
+            正解の場合は True（回答を受け付けない状態の場合は None）
+        """
+        if not self.waiting:
+            return None
+        self.selected_answer = option
+        self.result_correct = (option == self.correct_answer)
+        self.result_time = self.time
+
+        if self.result_correct:
+            # スコア計算（残り時間が多いほど高得点）
+            time_bonus = int(self.current_time * 10)
+            self.combo += 1
+            combo_bonus = self.combo * 5
+            self.score += 100 + time_bonus + combo_bonus
+            self.correct_count += 1
+        else:
+            self.combo = 0
+        self._emit("answer")
+        self.prepare_next()
+        return self.result_correct
+
+    def update(self, dt):
+        """
+        時間を dt 秒進める
+
+        dt が大きくても時間切れや結果表示の終了を1つずつ正確な時刻で処理するため、
+        細かく刻んで呼び出した場合と同じ結果になる。
+
+        Args:
+            dt: 進める時間（秒）
+        """
+        if self.state == "playing":
+            self.last_dt = dt
+            self._emit("update")
+        while self.state == "playing":
+            if self.selected_answer is None:
+                if dt < self.current_time:
+                    self.current_time -= dt
+                    self.time += dt
+                    return
+                # 時間切れ
+                dt -= self.current_time
+                self.time += self.current_time
+                self.current_time = 0.0
+                self.selected_answer = ""
+                self.result_correct = False
+                self.result_time = self.time
+                self.combo = 0
+                self.timeout_count += 1
+                self._emit("timeout")
+                self.prepare_next()
+            else:
+                remaining = self.result_remaining()
+                if dt < remaining:
+                    self.time += dt
+                    return
+                # 結果表示の終了
+                remaining = max(0.0, remaining)
+                dt -= remaining
+                self.time += remaining
+                self.next_question()
+
+    def finish_result(self):
+        """結果表示の残り時間を進めて次の問題に進む"""
+        if self.state == "playing" and self.selected_answer is not None:
+            self.update(max(self.result_remaining(), 0.0))
+
+class RandomPlayer:
+    """
+    シミュレーション用のプレイヤー
+
+    平均 reaction 秒（指数分布）で回答し、accuracy の確率で正解を選ぶ
+    """
+    def __init__(self, accuracy=0.7, reaction=5.0, rng=None):
+        self.accuracy = accuracy
+        self.reaction = reaction
+        self.rng = rng if rng is not None else random.Random()
+
+    def __call__(self, engine):
+        """
+        Returns:
+            (回答までの時間（秒）, 選んだ選択肢)
+        """
+        delay = self.rng.expovariate(1.0 / self.reaction) if self.reaction > 0 else 0.0
+        if self.rng.random() < self.accuracy:
+            option = engine.correct_answer
+        else:
+            wrong = [option for option in engine.current_options if option != engine.correct_answer]
+            option = self.rng.choice(wrong)
+        return delay, option
+
+def simulate_session(engine, player):
+    """
+    1ゲーム分のセッションをシミュレーションする関数
+
+    Args:
+        engine: QuizEngine
+        player: engine を受け取り (回答までの時間, 選択肢) を返す関数（回答しない場合は None）
+
+    Returns:
+        最終スコア
+    """
+    engine.start()
+    while engine.state == "playing":
+        if engine.selected_answer is None:
+            move = player(engine)
+            if move is not None and move[0] < engine.current_time:
+                delay, option = move
+                engine.update(delay)
+                engine.answer(option)
+            else:
+                engine.update(engine.current_time)
+        else:
+            engine.finish_result()
+    return engine.score
+
+def main():
+    """コマンドラインからセッションをシミュレーションし、スコアの分布を表示する"""
+    parser = argparse.ArgumentParser(description="ゲームのセッションをシミュレーションする")
+    parser.add_argument("--sessions", type=int, default=10000, help="シミュレーションするセッション数")
+    parser.add_argument("--icons", type=int, default=300, help="出題するアイコンの数")
+    parser.add_argument("--accuracy", type=float, default=0.7, help="プレイヤーの正答率")
+    parser.add_argument("--reaction", type=float, default=5.0, help="プレイヤーの平均回答時間（秒）")
+    parser.add_argument("--seed", type=int, default=None, help="乱数のシード")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    catalog = [f"Service {i:04d}" for i in range(args.icons)]
+    engine = QuizEngine(catalog, rng=rng)
+    player = RandomPlayer(args.accuracy, args.reaction, rng=rng)
+
+    start = time.perf_counter()
+    scores = []
+    correct = timeouts = 0
+    for _ in range(args.sessions):
+        scores.append(simulate_session(engine, player))
+        correct += engine.correct_count
+        timeouts += engine.timeout_count
+    elapsed = time.perf_counter() - start
+
+    questions = args.sessions * engine.max_questions
+    print(f"{args.sessions}セッションをシミュレーションしました（{elapsed:.2f}秒、{args.sessions / elapsed:.0f}セッション/秒）")
+    print(f"スコア: 平均 {statistics.fmean(scores):.1f}、中央値 {statistics.median(scores):.0f}、"
+          f"最小 {min(scores)}、最大 {max(scores)}")
+    print(f"正解率 {correct / questions:.1%}、時間切れ {timeouts / questions:.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,20 @@
 """
 AWS サービスアイコン認識ゲーム
-ゲームのメインロジック
+ゲーム画面の描画と入力の処理
 """
 import os
 import random
+import threading
 import time
 import pygame
-from utils import load_aws_icons, pixelate_image
+from atlas import TextureAtlas
+from engine import QuizEngine
+from icon_cache import IconPack, variants_cache_path
+from icon_store import IconStore, IconLoader
+from profiler import null_section
+from renderer import FrameRenderer
+from similarity import build_index
+from utils import create_dummy_icons, DEFAULT_PIXELATE_ENGINE, PixelationCache, TextCache
 
 # 色の定義
 WHITE = (255, 255, 255)
@@ -16,13 +24,39 @@ BLUE = (0, 0, 255)
 GREEN = (0, 255, 0)
 RED = (255, 0, 0)
 
+LOADER_STOP_TIMEOUT = 5.0  # 終了時にアイコンの読み込みスレッドの終了を待つ最大時間（秒）
+
 class Game:
     """ゲームのメインクラス"""
-    def __init__(self, screen):
-        """初期化"""
+    def __init__(self, screen, dirty_rects=False, profiler=None, pixelate_engine=DEFAULT_PIXELATE_ENGINE,
+                 hard_distractors=False, recorder=None, show_profile=False):
+        """
+        初期化
+        
+        Args:
+            screen: 描画先の画面
+            dirty_rects: 変化した領域だけを画面に反映する差分描画を使うか
+                （リモートデスクトップや VNC 経由の表示で転送量を減らせる）
+            profiler: 処理時間を記録する FrameProfiler（None の場合は記録しない）
+            pixelate_engine: ピクセル化の方式（"scale": 最近傍の縮小・拡大、"mosaic": ブロックごとの平均色）
+            hard_distractors: 正解と見た目の近いアイコンを不正解の選択肢にするか
+                （アイコンの読み込み後に索引を作成し、完成するまでは一様に選ぶ）
+            recorder: プレイを記録する SessionRecorder（None の場合は記録しない）
+            show_profile: 処理時間のオーバーレイを最初から表示するか（profiler がある場合だけ有効）
+        """
         self.screen = screen
         self.width, self.height = screen.get_size()
         self.clock = pygame.time.Clock()
+        self.renderer = FrameRenderer(screen, WHITE, dirty_rects)
+        self.idle_timeout = 1000  # 静止画面で入力を待つ最大時間（ミリ秒）
+        
+        # プロファイラー（F3キーで処理時間のオーバーレイを表示する）
+        self.profiler = profiler
+        self.profile = profiler.section if profiler is not None else null_section
+        self.show_profile = show_profile and profiler is not None
+        self.profile_overlay = None
+        self.profile_overlay_time = 0.0
+        self.profile_font = pygame.font.Font(None, 20)
         
         # 日本語対応フォントの設定
         # デフォルトフォントを先に設定（フォールバック用）
@@ -72,60 +106,168 @@ class Game:
         self.running = True
         self.state = "menu"  # menu, playing, game_over
         
-        # ゲーム設定
-        self.countdown_time = 30  # 制限時間（秒）
-        self.current_time = self.countdown_time
-        self.score = 0
-        self.combo = 0
-        self.question_count = 0
-        self.max_questions = 10  # 最大問題数
-        
-        # AWS アイコンの読み込み
-        self.aws_icons = load_aws_icons()
+        # AWS アイコンの読み込み（バックグラウンドで読み込み、画像は出題時にデコードする）
+        self.aws_icons = IconStore(max_entries=16)
+        self.icon_loader = IconLoader(self.aws_icons)
+        self.icon_loader.start()
+        print("AWSサービスアイコンを読み込んでいます...")
         self.current_icon = None
-        self.current_options = []
-        self.correct_answer = ""
-        self.selected_answer = None
-        self.last_update_time = 0
-        self.resolution_level = 256  # 初期解像度を256x256に変更
-        self.resolution_steps = [256, 400, 576, 784, 1024, 1536, 2048]  # 解像度ステップを拡張
-        self.show_original = False  # 最終的に元のアイコンを表示するフラグ
-        
-        # 結果表示用
-        self.result_display_time = 1.0  # 結果表示時間（秒）
-        self.result_time = 0
-        self.result_correct = False
+        # ピクセル化画像のキャッシュ（元のアイコンとともに画面と同じピクセル形式のアトラスに格納する）
+        self.pixel_cache = PixelationCache(engine=pixelate_engine, atlas=TextureAtlas())
+        # prerender.py で事前レンダリングしたピクセル化画像があれば使う
+        self.pixel_cache.variants = IconPack.open(variants_cache_path(self.pixel_cache.engine))
+        self.text_cache = TextCache()  # 描画済みテキストのキャッシュ
+        
+        # ゲームのルール（出題、制限時間、スコア計算）はエンジンが扱い、このクラスは入力と描画だけを行う
+        # 記録したプレイを再現できるよう、出題の乱数のシードを決めておく
+        seed = random.randrange(1 << 63)
+        self.engine = QuizEngine(self.aws_icons, rng=random.Random(seed), validate=self.is_icon_available)
+        self.engine.add_listener(self.on_engine_event)
+        if recorder is not None:
+            recorder.attach(self.engine, seed)
+        self.hard_distractors = hard_distractors
+        
+        # 固定タイムステップ
+        self.fixed_dt = 1 / 60  # ゲームの状態を進める間隔（秒）
+        self.max_frame_time = 0.25  # 1フレームで進める時間の上限（長い停止の後に一気に進まないように）
+        self.time_accumulator = 0.0  # まだ進めていない経過時間（秒）
+        self.frame_time = 0.0  # 前のフレームからの経過時間（秒）
         
     def run(self):
         """ゲームのメインループ"""
+        previous = time.perf_counter()
         while self.running:
+            self.update_icon_loading()
+            
+            if self.is_animating():
+                waited = []
+            else:
+                # 時間で変化しない画面では、入力があるまで描画せずに待機する
+                event = pygame.event.wait(self.idle_timeout)
+                if event.type == pygame.NOEVENT:
+                    continue
+                waited = [event]
+            
+            if self.profiler is not None:
+                self.profiler.begin_frame()
+            
+            # 前のフレームからの経過時間（単調増加する時計で計測する）
+            now = time.perf_counter()
+            self.frame_time = min(now - previous, self.max_frame_time)
+            previous = now
+            
+            with self.profile("events"):
+                events = waited + pygame.event.get()
+                for event in events:
+                    if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                        # ウィンドウが再表示された場合は画面全体を描き直す
+                        self.renderer.invalidate()
+                    elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3 and self.profiler is not None:
+                        self.show_profile = not self.show_profile
+            
             if self.state == "menu":
-                self.menu_screen()
+                with self.profile("menu_screen"):
+                    self.menu_screen(events)
             elif self.state == "playing":
-                self.game_screen()
+                with self.profile("game_screen"):
+                    self.game_screen(events)
             elif self.state == "game_over":
-                self.game_over_screen()
+                with self.profile("game_over_screen"):
+                    self.game_over_screen(events)
+            
+            if self.show_profile:
+                self.draw_profile_overlay()
             
-            pygame.display.flip()
+            with self.profile("flip"):
+                self.renderer.present()
+            
+            if self.profiler is not None:
+                # フレームレート調整の待ち時間はフレームの処理時間に含めない
+                self.profiler.end_frame(self.clock.get_fps())
             self.clock.tick(60)
+        
+        if self.icon_loader:
+            # pygame の終了前に、デコードや Surface の変換の途中のチャンクを終わらせる
+            self.icon_loader.stop()
+            self.icon_loader.join(timeout=LOADER_STOP_TIMEOUT)
+        self.aws_icons.close()
+        self.pixel_cache.close()
+    
+    def update_icon_loading(self):
+        """バックグラウンドでのアイコン読み込みの完了を確認する"""
+        if self.icon_loader is None or not self.icon_loader.done.is_set():
+            return
+        
+        loader = self.icon_loader
+        self.icon_loader = None
+        if len(self.aws_icons) >= 4:
+            print(f"{len(self.aws_icons)}個のAWSサービスアイコンを読み込みました"
+                  f"（{loader.elapsed:.2f}秒、キャッシュ利用 {loader.hits}/{loader.total}）")
+        else:
+            # 選択肢を4つ作れない場合はダミーアイコンを使う
+            print("AWSサービスアイコンが見つかりません。ダミーアイコンを生成します...")
+            for name, icon in create_dummy_icons().items():
+                self.aws_icons.add_surface(name, icon)
+        if self.hard_distractors:
+            self.build_similarity_index()
+        # 最初の問題もメニュー画面の間に選んで先読みしておく
+        self.engine.prepare_next()
+    
+    def build_similarity_index(self):
+        """紛らわしい選択肢を選ぶための索引をバックグラウンドで作成し、完成したらエンジンに渡す"""
+        def build():
+            start = time.perf_counter()
+            index = build_index(self.aws_icons, self.aws_icons.pack)
+            self.engine.similarity = index
+            print(f"{len(index)}個のアイコンの見た目の索引を作成しました（{time.perf_counter() - start:.2f}秒）")
+        
+        threading.Thread(target=build, name="SimilarityIndex", daemon=True).start()
+    
+    def draw_profile_overlay(self):
+        """処理時間の p50/p99 と FPS のオーバーレイを描画する（表示は0.5秒ごとに更新する）"""
+        now = time.perf_counter()
+        if self.profile_overlay is None or now - self.profile_overlay_time >= 0.5:
+            lines = self.profiler.summary_lines()
+            line_height = self.profile_font.get_linesize()
+            width = max(self.profile_font.size(line)[0] for line in lines) + 10
+            overlay = pygame.Surface((width, line_height * len(lines) + 10), pygame.SRCALPHA)
+            overlay.fill((0, 0, 0, 170))
+            for i, line in enumerate(lines):
+                overlay.blit(self.profile_font.render(line, True, WHITE), (5, 5 + i * line_height))
+            self.profile_overlay = overlay
+            self.profile_overlay_time = now
+        self.renderer.blit("profile_overlay", self.profile_overlay, (5, self.height - self.profile_overlay.get_height() - 5))
+    
+    def is_animating(self):
+        """時間の経過で画面が変化する状態か（プレイ中、またはアイコンの読み込み中）"""
+        return self.state == "playing" or self.icon_loader is not None
+    
+    def can_start(self):
+        """選択肢を作れるだけのアイコンが読み込まれているか"""
+        return self.engine.can_start()
     
-    def menu_screen(self):
+    def render_text(self, font, text, color):
+        """テキストを描画した Surface を返す（同じテキストは再描画せずにキャッシュから返す）"""
+        return self.text_cache.render(font, text, color)
+    
+    def menu_screen(self, events):
         """メニュー画面の表示"""
-        for event in pygame.event.get():
+        for event in events:
             if event.type == pygame.QUIT:
                 self.running = False
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_RETURN:
-                    self.start_game()
+                    if self.can_start():
+                        self.start_game()
                 elif event.key == pygame.K_ESCAPE:
                     self.running = False
         
-        self.screen.fill(WHITE)
+        self.renderer.begin()
         
         # タイトル
-        title = self.title_font.render("AWS サービスアイコン認識ゲーム", True, BLACK)
+        title = self.render_text(self.title_font, "AWS サービスアイコン認識ゲーム", BLACK)
         title_rect = title.get_rect(center=(self.width // 2, self.height // 3))
-        self.screen.blit(title, title_rect)
+        self.renderer.blit("title", title, title_rect)
         
         # 説明
         instructions = [
@@ -138,182 +280,176 @@ class Game:
         ]
         
         for i, line in enumerate(instructions):
-            text = self.font.render(line, True, BLACK)
+            text = self.render_text(self.font, line, BLACK)
             text_rect = text.get_rect(center=(self.width // 2, self.height // 2 + i * 30))
-            self.screen.blit(text, text_rect)
+            self.renderer.blit(f"instruction_{i}", text, text_rect)
+        
+        # アイコン読み込みの進捗
+        loader = self.icon_loader
+        if loader is not None:
+            progress_rect = pygame.Rect(self.width // 4, self.height - 60, self.width // 2, 10)
+            self.renderer.fill("progress_bar", progress_rect, GRAY)
+            filled_rect = progress_rect.copy()
+            filled_rect.width = int(progress_rect.width * loader.progress)
+            self.renderer.fill("progress_fill", filled_rect, BLUE)
+            
+            progress_text = self.render_text(self.font, f"アイコンを読み込み中... {loader.loaded}/{loader.total}", BLACK)
+            progress_text_rect = progress_text.get_rect(center=(self.width // 2, self.height - 80))
+            self.renderer.blit("progress_text", progress_text, progress_text_rect)
     
     def start_game(self):
         """ゲームの開始"""
         self.state = "playing"
-        self.score = 0
-        self.combo = 0
-        self.question_count = 0
-        self.next_question()
+        self.time_accumulator = 0.0
+        self.engine.start()
+    
+    def is_icon_available(self, name):
+        """出題するアイコンを読み込めるか（読み込めないアイコンはエンジンが選び直す）"""
+        return self.aws_icons.get(name) is not None
+    
+    def load_icon(self, name):
+        """
+        先読み用にアイコンを読み込む（バックグラウンドのワーカーから呼び出す）
+        
+        Returns:
+            (アイコン, 事前レンダリングしたピクセル化画像を探すための (元ファイルのキー, 署名))
+            （読み込めない場合は None）
+        """
+        icon = self.aws_icons.get(name)
+        if icon is None:
+            return None
+        return icon, self.icon_variant(name)
+    
+    def icon_variant(self, name):
+        """事前レンダリングしたピクセル化画像を探すための (元ファイルのキー, 署名) を返す"""
+        if self.pixel_cache.variants is None:
+            return None
+        located = self.aws_icons.locate(name)
+        if located is None:
+            return None
+        source, key = located
+        try:
+            return key, source.signature(key)
+        except (OSError, KeyError):
+            return None
     
-    def next_question(self):
-        """次の問題を設定"""
-        if self.question_count >= self.max_questions:
+    def on_engine_event(self, event, engine):
+        """エンジンの状態の変化に合わせて表示を更新する"""
+        if event == "question":
+            icon = self.aws_icons[engine.correct_answer]
+            # 全解像度ステップのピクセル化画像を先に生成しておく
+            with self.profile("pixelate"):
+                self.pixel_cache.build(engine.correct_answer, icon, engine.resolution_steps,
+                                       self.icon_variant(engine.correct_answer))
+                self.current_icon = self.pixel_cache.original(engine.correct_answer, icon)
+        elif event == "upcoming":
+            # 結果表示の間に次の問題のアイコンをデコードし、ピクセル化しておく
+            name = engine.upcoming[0]
+            self.aws_icons.prefetch([name])
+            self.pixel_cache.prefetch(name, lambda: self.load_icon(name), engine.resolution_steps)
+        elif event == "game_over":
             self.state = "game_over"
-            return
-        
-        self.question_count += 1
-        self.current_time = self.countdown_time
-        self.resolution_level = 256  # 初期解像度を256x256に設定
-        self.last_update_time = time.time()
-        self.show_original = False  # 元のアイコン表示フラグをリセット
-        
-        # ランダムにアイコンを選択
-        icon_names = list(self.aws_icons.keys())
-        self.correct_answer = random.choice(icon_names)
-        self.current_icon = self.aws_icons[self.correct_answer]
-        
-        # 選択肢を作成（正解を含む4つ）
-        self.current_options = [self.correct_answer]
-        while len(self.current_options) < 4:
-            option = random.choice(icon_names)
-            if option not in self.current_options:
-                self.current_options.append(option)
-        
-        # 選択肢をシャッフル
-        random.shuffle(self.current_options)
-        
-        self.selected_answer = None
-        self.result_time = 0
     
-    def game_screen(self):
+    def game_screen(self, events):
         """ゲーム画面の表示"""
-        current_time = time.time()
-        
-        # 経過時間の計算
-        if self.selected_answer is None:
-            elapsed = current_time - self.last_update_time
-            self.current_time -= elapsed
-            self.last_update_time = current_time
-            
-            # 解像度の更新
-            resolution_index = min(len(self.resolution_steps) - 1, 
-                                  int((1 - self.current_time / self.countdown_time) * len(self.resolution_steps)))
-            self.resolution_level = self.resolution_steps[resolution_index]
-            
-            # 時間切れに近づいたら元のアイコンを表示
-            self.show_original = (self.current_time <= 3.0)
-        
-        for event in pygame.event.get():
+        engine = self.engine
+        for event in events:
             if event.type == pygame.QUIT:
                 self.running = False
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     self.state = "menu"
-            elif event.type == pygame.MOUSEBUTTONDOWN and self.selected_answer is None:
+            elif event.type == pygame.MOUSEBUTTONDOWN and engine.selected_answer is None:
                 # 選択肢のクリック判定
-                mouse_pos = pygame.mouse.get_pos()
-                for i, option in enumerate(self.current_options):
+                for i, option in enumerate(engine.current_options):
                     option_rect = pygame.Rect(100, 400 + i * 40, self.width - 200, 30)
-                    if option_rect.collidepoint(mouse_pos):
-                        self.selected_answer = option
-                        self.result_correct = (option == self.correct_answer)
-                        self.result_time = current_time
-                        
-                        if self.result_correct:
-                            # スコア計算（残り時間が多いほど高得点）
-                            time_bonus = int(self.current_time * 10)
-                            self.combo += 1
-                            combo_bonus = self.combo * 5
-                            self.score += 100 + time_bonus + combo_bonus
-                        else:
-                            self.combo = 0
-        
-        self.screen.fill(WHITE)
+                    if option_rect.collidepoint(event.pos):
+                        engine.answer(option)
+        
+        # 固定タイムステップでゲームの状態を進める（描画の頻度に関係なく同じ速さで進む）
+        with self.profile("update"):
+            self.time_accumulator += self.frame_time
+            while self.time_accumulator >= self.fixed_dt and self.state == "playing":
+                engine.update(self.fixed_dt)
+                self.time_accumulator -= self.fixed_dt
+        
+        # 先読みが完了した次の問題のピクセル化画像を、出題前にアトラスへ格納しておく
+        with self.profile("prefetch"):
+            self.pixel_cache.collect()
+        
+        if self.state != "playing":
+            return
+        
+        self.renderer.begin()
         
         # 問題番号と残り時間の表示
-        question_text = self.font.render(f"問題 {self.question_count}/{self.max_questions}", True, BLACK)
-        self.screen.blit(question_text, (20, 20))
+        question_text = self.render_text(self.font, f"問題 {engine.question_count}/{engine.max_questions}", BLACK)
+        self.renderer.blit("question", question_text, (20, 20))
         
-        time_color = BLACK if self.current_time > 5 else RED
-        time_text = self.font.render(f"残り時間: {max(0, int(self.current_time))}", True, time_color)
-        self.screen.blit(time_text, (self.width - 150, 20))
+        time_color = BLACK if engine.current_time > 5 else RED
+        time_text = self.render_text(self.font, f"残り時間: {max(0, int(engine.current_time))}", time_color)
+        self.renderer.blit("time", time_text, (self.width - 150, 20))
         
-        score_text = self.font.render(f"スコア: {self.score}", True, BLACK)
-        self.screen.blit(score_text, (20, 50))
+        score_text = self.render_text(self.font, f"スコア: {engine.score}", BLACK)
+        self.renderer.blit("score", score_text, (20, 50))
         
-        combo_text = self.font.render(f"コンボ: {self.combo}", True, BLUE)
-        self.screen.blit(combo_text, (self.width - 150, 50))
+        combo_text = self.render_text(self.font, f"コンボ: {engine.combo}", BLUE)
+        self.renderer.blit("combo", combo_text, (self.width - 150, 50))
         
         # アイコンの表示（ピクセル化または元のアイコン）
         if self.current_icon:
-            if self.show_original:
+            if engine.show_original:
                 # 元のアイコンをそのまま表示
                 icon_rect = self.current_icon.get_rect(center=(self.width // 2, self.height // 3))
-                self.screen.blit(self.current_icon, icon_rect)
+                self.renderer.blit("icon", self.current_icon, icon_rect)
             else:
                 # ピクセル化したアイコンを表示
-                pixelated = pixelate_image(self.current_icon, self.resolution_level)
+                pixelated = self.pixel_cache.get(engine.correct_answer, self.current_icon, engine.resolution_level)
                 icon_rect = pixelated.get_rect(center=(self.width // 2, self.height // 3))
-                self.screen.blit(pixelated, icon_rect)
+                self.renderer.blit("icon", pixelated, icon_rect)
         
         # 選択肢の表示
-        option_text = self.font.render("以下から正しいAWSサービスを選んでください:", True, BLACK)
-        self.screen.blit(option_text, (100, 350))
+        option_text = self.render_text(self.font, "以下から正しいAWSサービスを選んでください:", BLACK)
+        self.renderer.blit("option_label", option_text, (100, 350))
         
-        for i, option in enumerate(self.current_options):
+        for i, option in enumerate(engine.current_options):
             option_rect = pygame.Rect(100, 400 + i * 40, self.width - 200, 30)
             
-            # 選択後の色分け
-            if self.selected_answer:
-                if option == self.correct_answer:
-                    pygame.draw.rect(self.screen, GREEN, option_rect)
-                elif option == self.selected_answer and option != self.correct_answer:
-                    pygame.draw.rect(self.screen, RED, option_rect)
+            # 選択後の色分け（時間切れの場合は正解の選択肢を強調表示する）
+            if engine.selected_answer is not None:
+                if option == engine.correct_answer:
+                    self.renderer.fill(f"option_{i}", option_rect, GREEN)
+                elif option == engine.selected_answer and option != engine.correct_answer:
+                    self.renderer.fill(f"option_{i}", option_rect, RED)
                 else:
-                    pygame.draw.rect(self.screen, GRAY, option_rect)
+                    self.renderer.fill(f"option_{i}", option_rect, GRAY)
             else:
-                pygame.draw.rect(self.screen, GRAY, option_rect)
+                self.renderer.fill(f"option_{i}", option_rect, GRAY)
             
-            option_text = self.font.render(option, True, BLACK)
-            self.screen.blit(option_text, (110, 405 + i * 40))
+            option_text = self.render_text(self.font, option, BLACK)
+            self.renderer.blit(f"option_text_{i}", option_text, (110, 405 + i * 40))
         
         # 結果表示
-        if self.selected_answer:
-            if current_time - self.result_time >= self.result_display_time:
-                self.next_question()
-            else:
-                result_text = "正解！" if self.result_correct else "不正解..."
-                result_color = GREEN if self.result_correct else RED
-                text = self.title_font.render(result_text, True, result_color)
-                text_rect = text.get_rect(center=(self.width // 2, 300))
-                self.screen.blit(text, text_rect)
-        
-        # 時間切れ
-        if self.current_time <= 0:
-            # まだ選択されていない場合のみ初期化処理を行う
-            if self.selected_answer is None:
-                self.selected_answer = ""
-                self.result_correct = False
-                self.result_time = current_time
-                self.combo = 0
-                
-                # 正解の選択肢を強調表示するために、選択済み状態にする
-                for i, option in enumerate(self.current_options):
-                    if option == self.correct_answer:
-                        pygame.draw.rect(self.screen, GREEN, pygame.Rect(100, 400 + i * 40, self.width - 200, 30))
-            
+        if engine.selected_answer:
+            result_text = "正解！" if engine.result_correct else "不正解..."
+            result_color = GREEN if engine.result_correct else RED
+            text = self.render_text(self.title_font, result_text, result_color)
+            text_rect = text.get_rect(center=(self.width // 2, 300))
+            self.renderer.blit("result", text, text_rect)
+        elif engine.selected_answer == "":
             # 時間切れの表示
-            time_up_text = self.title_font.render("時間切れ！", True, RED)
+            time_up_text = self.render_text(self.title_font, "時間切れ！", RED)
             time_up_rect = time_up_text.get_rect(center=(self.width // 2, 300))
-            self.screen.blit(time_up_text, time_up_rect)
+            self.renderer.blit("result", time_up_text, time_up_rect)
             
             # 正解の表示
-            correct_text = self.font.render(f"正解: {self.correct_answer}", True, BLACK)
+            correct_text = self.render_text(self.font, f"正解: {engine.correct_answer}", BLACK)
             correct_rect = correct_text.get_rect(center=(self.width // 2, 340))
-            self.screen.blit(correct_text, correct_rect)
-            
-            # 時間切れの場合も結果表示後に次の問題へ進む
-            if current_time - self.result_time >= self.result_display_time * 2:  # 表示時間を2倍に延長
-                self.next_question()
+            self.renderer.blit("correct_answer", correct_text, correct_rect)
     
-    def game_over_screen(self):
+    def game_over_screen(self, events):
         """ゲーム終了画面の表示"""
-        for event in pygame.event.get():
+        for event in events:
             if event.type == pygame.QUIT:
                 self.running = False
             elif event.type == pygame.KEYDOWN:
@@ -322,17 +458,17 @@ class Game:
                 elif event.key == pygame.K_ESCAPE:
                     self.running = False
         
-        self.screen.fill(WHITE)
+        self.renderer.begin()
         
         # 結果表示
-        game_over_text = self.title_font.render("ゲーム終了！", True, BLACK)
+        game_over_text = self.render_text(self.title_font, "ゲーム終了！", BLACK)
         game_over_rect = game_over_text.get_rect(center=(self.width // 2, self.height // 3))
-        self.screen.blit(game_over_text, game_over_rect)
+        self.renderer.blit("game_over", game_over_text, game_over_rect)
         
-        score_text = self.title_font.render(f"最終スコア: {self.score}", True, BLUE)
+        score_text = self.render_text(self.title_font, f"最終スコア: {self.engine.score}", BLUE)
         score_rect = score_text.get_rect(center=(self.width // 2, self.height // 2))
-        self.screen.blit(score_text, score_rect)
+        self.renderer.blit("final_score", score_text, score_rect)
         
-        restart_text = self.font.render("Enterキーでメニューに戻る", True, BLACK)
+        restart_text = self.render_text(self.font, "Enterキーでメニューに戻る", BLACK)
         restart_rect = restart_text.get_rect(center=(self.width // 2, self.height * 2 // 3))
-        self.screen.blit(restart_text, restart_rect)
+        self.renderer.blit("restart", restart_text, restart_rect)
@@ -0,0 +1,268 @@
+"""
+AWS サービスアイコン認識ゲーム
+前処理済みアイコンのバイナリキャッシュ（パックファイル）
+
+パックファイルの構成:
+    ヘッダー   : マジック(8) / バージョン(u32) / エントリ数(u32) / インデックス位置(u64)
+    データ部   : 各エントリの RGBA ピクセル列（raw または zlib 圧縮）
+    インデックス: エントリごとのメタデータ（キー、サービス名、署名、解像度レベル、サイズ、位置）
+
+キーには元ファイル名、署名には元ファイルの (mtime_ns, サイズ) を格納し、
+元ファイルと署名が一致しないエントリは無効として扱う。
+"""
+import mmap
+import os
+import struct
+import zlib
+from collections import namedtuple
+
+PACK_MAGIC = b"AWSICPK\0"
+PACK_VERSION = 1
+
+# 既定のキャッシュファイルの場所
+DEFAULT_CACHE_PATH = os.path.join("assets", "cache", "icons.pack")
+
+def variants_cache_path(engine, cache_dir=os.path.join("assets", "cache")):
+    """
+    事前レンダリングしたピクセル化画像のパックファイルの場所を返す関数
+
+    ピクセル化の方式ごとに別のファイルにする（エントリの解像度レベルに解像度を格納する）
+    """
+    return os.path.join(cache_dir, f"variants-{engine}.pack")
+
+# データ部の圧縮形式
+CODEC_RAW = 0
+CODEC_ZLIB = 1
+
+_HEADER = struct.Struct("<8sIIQ")
+_ENTRY = struct.Struct("<HHqqIHHBQQ")
+_ALIGN = 16
+
+PackEntry = namedtuple(
+    "PackEntry",
+    ["key", "name", "signature", "level", "width", "height", "codec", "offset", "length"],
+)
+
+def file_signature(path):
+    """
+    キャッシュの有効性判定に使うファイルの署名を返す関数
+
+    Args:
+        path: ファイルのパス
+
+    Returns:
+        (mtime_ns, ファイルサイズ) のタプル
+    """
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+class IconPack:
+    """パックファイルの読み込みクラス（メモリマップしたバッファを直接参照する）"""
+    def __init__(self, buffer, owner=None):
+        """
+        Args:
+            buffer: パックファイルの内容を持つバッファ（mmap など）
+            owner: バッファの寿命を管理するオブジェクト（close 時に閉じる）
+        """
+        self._view = memoryview(buffer)
+        self._owner = owner
+        self._entries = {}
+
+        magic, version, count, index_offset = _HEADER.unpack_from(self._view, 0)
+        if magic != PACK_MAGIC:
+            raise ValueError("パックファイルの形式が正しくありません")
+        if version != PACK_VERSION:
+            raise ValueError(f"パックファイルのバージョンが異なります: {version}")
+
+        pos = index_offset
+        for _ in range(count):
+            (key_len, name_len, sig_a, sig_b, level, width, height,
+             codec, offset, length) = _ENTRY.unpack_from(self._view, pos)
+            pos += _ENTRY.size
+            key = bytes(self._view[pos:pos + key_len]).decode("utf-8")
+            pos += key_len
+            name = bytes(self._view[pos:pos + name_len]).decode("utf-8")
+            pos += name_len
+            entry = PackEntry(key, name, (sig_a, sig_b), level, width, height, codec, offset, length)
+            self._entries[(key, level)] = entry
+
+    @classmethod
+    def open(cls, path):
+        """
+        パックファイルを開く
+
+        Returns:
+            IconPack（ファイルがない、または壊れている場合は None）
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                # 書き込み不可のマッピングを Surface が参照しないようコピーオンライトで開く
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        except (OSError, ValueError) as e:
+            print(f"警告: キャッシュファイル {path} を開けませんでした: {e}")
+            return None
+        try:
+            return cls(mapped, owner=mapped)
+        except (ValueError, struct.error, UnicodeDecodeError) as e:
+            print(f"警告: キャッシュファイル {path} を読み込めませんでした: {e}")
+            mapped.close()
+            return None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def entries(self):
+        """全エントリを返す"""
+        return list(self._entries.values())
+
+    def find(self, key, signature=None, level=0, size=None):
+        """
+        エントリを検索する
+
+        Args:
+            key: エントリのキー（元ファイル名）
+            signature: 元ファイルの署名（指定した場合は一致するものだけを返す）
+            level: 解像度レベル（0 は元のアイコン）
+            size: 画像サイズ (幅, 高さ)（指定した場合は一致するものだけを返す）
+
+        Returns:
+            PackEntry（見つからない、または無効な場合は None）
+        """
+        entry = self._entries.get((key, level))
+        if entry is None:
+            return None
+        if signature is not None and entry.signature != tuple(signature):
+            return None
+        if size is not None and (entry.width, entry.height) != tuple(size):
+            return None
+        return entry
+
+    def raw(self, entry):
+        """エントリのデータを格納されている形式（圧縮されている場合は圧縮されたまま）で返す"""
+        return self._view[entry.offset:entry.offset + entry.length]
+
+    def pixels(self, entry):
+        """エントリの RGBA ピクセル列を返す（raw の場合はコピーせずに参照する）"""
+        data = self.raw(entry)
+        if entry.codec == CODEC_ZLIB:
+            return zlib.decompress(data)
+        return data
+
+    def surface(self, entry, copy=False):
+        """
+        エントリから PNG デコードなしで Surface を作成する
+
+        Args:
+            entry: PackEntry
+            copy: True の場合はピクセルをコピーし、Surface がバッファを参照しないようにする
+        """
+        # setup.py（PyGame のインストール前）からも読み込めるよう、pygame はここで読み込む
+        import pygame
+
+        size = (entry.width, entry.height)
+        if copy:
+            return pygame.image.frombytes(bytes(self.pixels(entry)), size, "RGBA")
+        return pygame.image.frombuffer(self.pixels(entry), size, "RGBA")
+
+    def close(self):
+        """バッファを解放する（Surface が参照中の場合は参照が消えるまでマッピングを維持する）"""
+        self._view.release()
+        if self._owner is not None:
+            try:
+                self._owner.close()
+            except BufferError:
+                return
+            self._owner = None
+
+def write_pack(path, records, before_replace=None):
+    """
+    パックファイルを書き出す関数
+
+    一時ファイルに書き出してから置き換えるため、途中で失敗しても既存のキャッシュは壊れない
+
+    Args:
+        path: 出力先のパス
+        records: (key, name, signature, level, width, height, codec, data) の反復可能オブジェクト
+        before_replace: 既存のファイルを置き換える直前に呼び出す関数
+            （既存のキャッシュをメモリマップで開いている場合に閉じるため）
+
+    Returns:
+        書き出したエントリ数
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        count = write_pack_to(f, records)
+
+    if before_replace is not None:
+        before_replace()
+    os.replace(temp_path, path)
+    return count
+
+def write_pack_to(f, records):
+    """
+    パックファイルの内容をファイルオブジェクトに書き出す関数
+
+    Args:
+        f: 先頭に位置する書き込み可能なファイルオブジェクト（write / tell / seek を使う）
+        records: (key, name, signature, level, width, height, codec, data) の反復可能オブジェクト
+
+    Returns:
+        書き出したエントリ数
+    """
+    index = []
+    f.write(_HEADER.pack(PACK_MAGIC, PACK_VERSION, 0, 0))
+    for key, name, signature, level, width, height, codec, data in records:
+        pos = f.tell()
+        padding = -pos % _ALIGN
+        if padding:
+            f.write(b"\0" * padding)
+            pos += padding
+        f.write(data)
+        index.append((key, name, signature, level, width, height, codec, pos, len(data)))
+
+    index_offset = f.tell()
+    for key, name, signature, level, width, height, codec, offset, length in index:
+        key_bytes = key.encode("utf-8")
+        name_bytes = name.encode("utf-8")
+        f.write(_ENTRY.pack(len(key_bytes), len(name_bytes), signature[0], signature[1],
+                            level, width, height, codec, offset, length))
+        f.write(key_bytes)
+        f.write(name_bytes)
+
+    end = f.tell()
+    f.seek(0)
+    f.write(_HEADER.pack(PACK_MAGIC, PACK_VERSION, len(index), index_offset))
+    f.seek(end)
+    return len(index)
+
+def remove_pack_entries(path, keys):
+    """
+    パックファイルから指定したキーのエントリ（全解像度レベル）を取り除く関数
+
+    Args:
+        path: パックファイルのパス
+        keys: 取り除くエントリのキーの集合
+
+    Returns:
+        取り除いたエントリ数
+    """
+    keys = set(keys)
+    pack = IconPack.open(path)
+    if pack is None:
+        return 0
+    kept = [entry for entry in pack.entries() if entry.key not in keys]
+    removed = len(pack) - len(kept)
+    if removed:
+        records = ((entry.key, entry.name, entry.signature, entry.level, entry.width, entry.height,
+                    entry.codec, bytes(pack.raw(entry)))
+                   for entry in kept)
+        write_pack(path, records, before_replace=pack.close)
+    else:
+        pack.close()
+    return removed
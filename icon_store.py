@@ -0,0 +1,294 @@
+"""
+AWS サービスアイコン認識ゲーム
+必要になった時点でアイコンをデコードする LRU 付きアイコンストア
+"""
+import os
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+from icon_cache import IconPack, CODEC_RAW, DEFAULT_CACHE_PATH, write_pack
+from utils import (ICON_SIZE, ICON_LOAD_ERRORS, LRUCache, surface_nbytes, to_display_format,
+                   find_icon_sources, list_icons, resolve_icons)
+
+class IconStore(Mapping):
+    """
+    サービス名だけを先に索引し、ピクセルは参照された時点でデコードするアイコンストア
+
+    {サービス名: pygame.Surface} の辞書と同じように扱えるが、デコード済みの
+    Surface は件数・容量の上限付き LRU で保持するため、アイコンの数が増えても
+    常駐メモリはほぼ一定に保たれる
+    """
+    def __init__(self, icons_dir=os.path.join("assets", "icons"), cache_path=DEFAULT_CACHE_PATH,
+                 max_entries=32, max_bytes=None, prefetch_workers=2):
+        """
+        Args:
+            icons_dir: アイコンディレクトリ
+            cache_path: アイコンキャッシュ（パックファイル）のパス（None の場合は使わない）
+            max_entries: デコード済みの Surface を保持する最大数
+            max_bytes: デコード済みの Surface を保持する合計バイト数の上限
+            prefetch_workers: 先読みに使うワーカー数
+        """
+        self.icons_dir = icons_dir
+        self.cache_path = cache_path
+        self.prefetch_workers = prefetch_workers
+        self._icons = {}  # サービス名 -> (アイコンソース, キー)
+        self._pinned = {}  # 常に保持する Surface（ダミーアイコンなど）
+        self._surfaces = LRUCache(max_entries, max_bytes, surface_nbytes)
+        self._pending = {}  # 先読み中のサービス名 -> Future
+        self._lock = threading.Lock()
+        self._executor = None
+        self._sources = []
+        self._pack = IconPack.open(cache_path) if cache_path else None
+
+    @classmethod
+    def from_surfaces(cls, icons):
+        """デコード済みの Surface の辞書からストアを作成する（ダミーアイコン用）"""
+        store = cls(icons_dir=None, cache_path=None)
+        for name, surface in icons.items():
+            store.add_surface(name, surface)
+        return store
+
+    def find_sources(self):
+        """アイコンディレクトリのアイコンソースを探す（ストアを閉じる時にまとめて閉じる）"""
+        self._sources = find_icon_sources(self.icons_dir)
+        return self._sources
+
+    def index(self):
+        """
+        アイコンソースを走査してサービス名を索引する（ピクセルはデコードしない）
+
+        Returns:
+            索引したアイコンの数
+        """
+        for source, key, service_name in list_icons(self.find_sources()):
+            self.add_icon(service_name, source, key)
+        return len(self)
+
+    def add_icon(self, name, source, key):
+        """アイコンを索引に追加する"""
+        with self._lock:
+            self._icons[name] = (source, key)
+            self._surfaces.pop(name)
+
+    def locate(self, name):
+        """
+        アイコンの読み込み元を返す
+        
+        Returns:
+            (アイコンソース, キー)（デコード済みの Surface として追加したアイコンの場合は None）
+        """
+        with self._lock:
+            return self._icons.get(name)
+    
+    def add_surface(self, name, surface):
+        """デコード済みの Surface を追加する（LRU で破棄されない）"""
+        surface = to_display_format(surface)
+        with self._lock:
+            self._pinned[name] = surface
+            self._icons.pop(name, None)
+
+    def __getitem__(self, name):
+        with self._lock:
+            surface = self._pinned.get(name)
+            if surface is None:
+                surface = self._surfaces.get(name)
+            if surface is not None:
+                return surface
+            if name not in self._icons:
+                raise KeyError(name)
+            future = self._pending.get(name)
+
+        # 先読み中であれば完了を待つ
+        if future is not None:
+            surface = future.result()
+        else:
+            surface = self._decode(name)
+        if surface is None:
+            raise KeyError(name)
+        return surface
+
+    def __iter__(self):
+        with self._lock:
+            names = list(self._pinned) + list(self._icons)
+        return iter(names)
+
+    def __len__(self):
+        return len(self._pinned) + len(self._icons)
+
+    def __contains__(self, name):
+        return name in self._pinned or name in self._icons
+
+    def prefetch(self, names):
+        """
+        指定したアイコンをバックグラウンドでデコードしておく（先読みのヒント）
+
+        Args:
+            names: 近いうちに参照されるサービス名のリスト
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.prefetch_workers)
+            for name in names:
+                if name in self._icons and name not in self._surfaces and name not in self._pending:
+                    self._pending[name] = self._executor.submit(self._decode, name)
+
+    def _decode(self, name):
+        """アイコンをデコードして LRU に登録する"""
+        with self._lock:
+            icon = self._icons.get(name)
+        surface = None
+        if icon is not None:
+            source, key = icon
+            try:
+                surface = to_display_format(self._load(source, key))
+            except ICON_LOAD_ERRORS:
+                print(f"警告: {source.describe(key)} の読み込みに失敗しました")
+        with self._lock:
+            self._pending.pop(name, None)
+            if icon is not None and self._icons.get(name) == icon:
+                if surface is not None:
+                    self._surfaces.put(name, surface)
+                else:
+                    # 読み込めないアイコンは出題対象から外す
+                    del self._icons[name]
+        return surface
+
+    def _load(self, source, key):
+        """キャッシュが有効であれば PNG をデコードせずにピクセルを取り出す"""
+        pack = self._pack
+        if pack is not None:
+            entry = pack.find(key, source.signature(key), size=ICON_SIZE)
+            if entry is not None:
+                # キャッシュファイルを作り直せるよう、マッピングは参照せずにコピーする
+                return pack.surface(entry, copy=True)
+        return source.load(key)
+
+    @property
+    def pack(self):
+        """現在参照しているアイコンキャッシュ（IconPack または None）"""
+        return self._pack
+
+    def set_pack(self, pack):
+        """参照するアイコンキャッシュを切り替え、古いものを閉じる"""
+        with self._lock:
+            old_pack, self._pack = self._pack, pack
+        if old_pack is not None and old_pack is not pack:
+            old_pack.close()
+
+    def resident_bytes(self):
+        """デコード済みで保持している Surface の合計バイト数を返す"""
+        return self._surfaces.total_bytes
+
+    def close(self):
+        """先読み用のワーカーを停止し、アイコンソースを閉じる"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        for source in self._sources:
+            source.close()
+
+class IconLoader(threading.Thread):
+    """
+    アイコンをバックグラウンドで読み込むスレッド
+
+    アイコンソースを走査し、キャッシュが有効なものはそのまま、
+    無効なものは並列にデコードしてアイコンキャッシュを作り直しながら、
+    読み込めたアイコンから順にストアへ登録する。
+    デコードした Surface はキャッシュへ書き出すだけで保持しないため、
+    読み込み中のメモリ使用量もチャンクの大きさ程度に収まる。
+    """
+    def __init__(self, store, workers=None, chunk_size=32):
+        """
+        Args:
+            store: 読み込んだアイコンを登録する IconStore
+            workers: 並列にデコードするワーカー数（None の場合は CPU コア数）
+            chunk_size: 一度に並列デコードするアイコンの数
+        """
+        super().__init__(name="IconLoader", daemon=True)
+        self.store = store
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.total = 0  # 読み込み対象のアイコン数
+        self.loaded = 0  # 読み込みが完了したアイコン数
+        self.hits = 0  # キャッシュから読み込んだアイコン数
+        self.elapsed = 0.0
+        self.done = threading.Event()
+        self._stop_requested = False
+
+    @property
+    def progress(self):
+        """読み込みの進捗（0.0〜1.0）"""
+        return self.loaded / self.total if self.total else 1.0
+
+    def stop(self):
+        """読み込みを途中で打ち切る（それまでに読み込んだ分はキャッシュに書き出す）"""
+        self._stop_requested = True
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            items = list_icons(self.store.find_sources())
+            self.total = len(items)
+            if not items or self._register_cached(items):
+                return
+
+            records = self._records(items)
+            cache_path = self.store.cache_path
+            if not cache_path:
+                for _ in records:
+                    pass
+                return
+            try:
+                write_pack(cache_path, records, before_replace=lambda: self.store.set_pack(None))
+                self.store.set_pack(IconPack.open(cache_path))
+            except OSError as e:
+                print(f"警告: アイコンキャッシュを書き込めませんでした: {e}")
+        finally:
+            self.elapsed = time.perf_counter() - start
+            self.done.set()
+
+    def _register_cached(self, items):
+        """
+        全アイコンのキャッシュが有効であれば、キャッシュを書き直さずにそのまま登録する
+
+        Returns:
+            登録した場合は True
+        """
+        pack = self.store.pack
+        if pack is None or len(pack) != len(items):
+            return False
+        try:
+            for source, key, _ in items:
+                if pack.find(key, source.signature(key), size=ICON_SIZE) is None:
+                    return False
+        except (OSError, KeyError):
+            return False
+        for source, key, service_name in items:
+            self.store.add_icon(service_name, source, key)
+        self.loaded = self.hits = len(items)
+        return True
+
+    def _records(self, items):
+        """キャッシュへ書き出すレコードを順に生成し、読み込めたアイコンをストアへ登録する"""
+        pack = self.store.pack
+        for chunk_start in range(0, len(items), self.chunk_size):
+            if self._stop_requested:
+                return
+
+            chunk = items[chunk_start:chunk_start + self.chunk_size]
+            results = resolve_icons(chunk, pack, self.workers)
+            for source, key, service_name, signature, entry, icon in results:
+                if entry is not None:
+                    data = bytes(pack.pixels(entry))
+                    self.hits += 1
+                else:
+                    data = pygame.image.tobytes(icon, "RGBA")
+                self.store.add_icon(service_name, source, key)
+                self.loaded += 1
+                yield (key, service_name, signature, 0, ICON_SIZE[0], ICON_SIZE[1], CODEC_RAW, data)
+            # 読み込めなかったアイコンも進捗に含める
+            self.loaded += len(chunk) - len(results)
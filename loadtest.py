@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+AWS サービスアイコン認識ゲーム
+クイズサーバー（server.py）の負荷試験用クライアントシミュレーター
+
+多数の仮想プレイヤーが WebSocket でゲームを進め、出題のたびに画像を取得し、
+ランダムな時間の後にランダムな選択肢を回答する。終了時に回答から結果が届くまでの
+時間と画像の取得時間の分布、サーバーの統計を表示する。--answers で記録したプレイ
+（recorder.py のログ）を指定すると、回答までの時間と時間切れを記録から選んで再現する。
+
+使い方:
+    python server.py --speed 10 &
+    python loadtest.py [--clients 1000] [--games 1] [--reaction 5] [--ramp 5] [--answers sessions.rec]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import random
+import secrets
+import time
+
+from profiler import percentile
+from recorder import answer_delays, read_log
+from server import WebSocket, websocket_accept
+
+class Stats:
+    """負荷試験の集計"""
+    def __init__(self):
+        self.games = 0
+        self.answers = 0
+        self.messages = 0
+        self.errors = 0
+        self.stale = 0  # 取得する前に問題が進んで 404 になった画像
+        self.answer_latency = []  # 回答から結果が届くまでの時間（ミリ秒）
+        self.image_latency = []  # 画像の取得時間（ミリ秒）
+        self.image_bytes = 0
+
+class HTTPClient:
+    """keep-alive で GET リクエストを送るだけの HTTP クライアント"""
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+
+    async def get(self, path):
+        """
+        Returns:
+            (ステータスコード, 本文)
+        """
+        if self._writer is None or self._writer.is_closing():
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\n\r\n".encode("latin-1"))
+        head = await self._reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ")[1])
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        body = await self._reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, body
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+async def connect_websocket(host, port, path="/ws"):
+    """サーバーに WebSocket で接続する"""
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(secrets.token_bytes(16)).decode("ascii")
+    writer.write((f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\n"
+                  f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n")
+                 .encode("latin-1"))
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+    if not head.startswith("HTTP/1.1 101") or websocket_accept(key) not in head:
+        writer.close()
+        raise ConnectionError(f"WebSocket に接続できませんでした: {head.splitlines()[0]}")
+    return WebSocket(reader, writer, mask=True)
+
+async def player(host, port, games, reaction, fetch_images, stats, rng, delays=None):
+    """
+    1人の仮想プレイヤー
+
+    Args:
+        games: 続けて遊ぶゲーム数
+        reaction: 平均回答時間（ゲーム内の秒、サーバーの speed で実時間に換算する）
+        fetch_images: 画像を取得するか
+        delays: 記録した回答までの時間（ゲーム内の秒、None は時間切れ）のリスト
+            （指定した場合は reaction の代わりにここから選ぶ）
+    """
+    ws = await connect_websocket(host, port)
+    http = HTTPClient(host, port)
+    messages = asyncio.Queue()
+
+    async def receive():
+        while True:
+            text = await ws.recv()
+            await messages.put(None if text is None else json.loads(text))
+            if text is None:
+                return
+
+    receiver = asyncio.create_task(receive())
+    speed = 1.0
+    answer_at = None  # 回答する時刻
+    options = []
+    answered_at = None  # 回答を送った時刻
+    remaining = games
+    try:
+        while True:
+            timeout = None if answer_at is None else max(0.0, answer_at - time.monotonic())
+            try:
+                message = await asyncio.wait_for(messages.get(), timeout)
+            except asyncio.TimeoutError:
+                ws.send_json({"type": "answer", "option": rng.choice(options)})
+                answered_at, answer_at = time.monotonic(), None
+                stats.answers += 1
+                continue
+            if message is None:
+                break
+            stats.messages += 1
+            kind = message["type"]
+            if kind == "hello":
+                speed = message["speed"]
+                ws.send_json({"type": "start"})
+            elif kind == "question":
+                options = message["options"]
+                delay = rng.choice(delays) if delays else rng.expovariate(1.0 / reaction)
+                # 記録で時間切れだった問題は回答せずに時間切れを待つ
+                answer_at = None if delay is None else time.monotonic() + delay / speed
+            elif kind == "result":
+                answer_at = None
+                if answered_at is not None and not message["timeout"]:
+                    stats.answer_latency.append((time.monotonic() - answered_at) * 1000)
+                answered_at = None
+            elif kind == "game_over":
+                stats.games += 1
+                remaining -= 1
+                if remaining <= 0:
+                    break
+                ws.send_json({"type": "start"})
+
+            # 画像の取得中に次の解像度や問題に進んでいる場合は、古い画像は取得しない
+            if fetch_images and "image" in message and messages.empty():
+                start = time.monotonic()
+                status, body = await http.get(message["image"])
+                if status == 200:
+                    stats.image_latency.append((time.monotonic() - start) * 1000)
+                    stats.image_bytes += len(body)
+                elif status == 404:
+                    stats.stale += 1
+                else:
+                    stats.errors += 1
+    finally:
+        receiver.cancel()
+        ws.close()
+        http.close()
+
+async def run(args):
+    stats = Stats()
+    rng = random.Random(args.seed)
+    delays = None
+    if args.answers:
+        delays = answer_delays(read_log(args.answers))
+        print(f"{args.answers} から{len(delays)}問分の回答時間を読み込みました")
+
+    async def start_player(delay):
+        await asyncio.sleep(delay)
+        try:
+            await player(args.host, args.port, args.games, args.reaction, not args.no_images, stats,
+                         random.Random(rng.random()), delays)
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            stats.errors += 1
+            if stats.errors <= 5:
+                print(f"エラー: {e}")
+
+    start = time.monotonic()
+    await asyncio.gather(*(start_player(args.ramp * i / args.clients) for i in range(args.clients)))
+    elapsed = time.monotonic() - start
+
+    print(f"{args.clients}人のプレイヤーで{stats.games}ゲームを完了しました（{elapsed:.1f}秒、エラー {stats.errors}件）")
+    print(f"回答 {stats.answers}件（{stats.answers / elapsed:.0f}件/秒）、メッセージ {stats.messages}件")
+    if stats.answer_latency:
+        print(f"回答から結果まで: p50 {percentile(stats.answer_latency, 0.5):.1f}ms、"
+              f"p99 {percentile(stats.answer_latency, 0.99):.1f}ms")
+    if stats.image_latency:
+        print(f"画像の取得: {len(stats.image_latency)}件、p50 {percentile(stats.image_latency, 0.5):.1f}ms、"
+              f"p99 {percentile(stats.image_latency, 0.99):.1f}ms、平均 {stats.image_bytes / len(stats.image_latency):.0f}バイト、"
+              f"間に合わなかった画像 {stats.stale}件")
+    try:
+        status, body = await HTTPClient(args.host, args.port).get("/stats")
+        if status == 200:
+            print(f"サーバーの統計: {body.decode('utf-8')}")
+    except OSError:
+        pass
+
+def main():
+    """コマンドラインから負荷試験を実行する"""
+    parser = argparse.ArgumentParser(description="クイズサーバーの負荷試験を行う")
+    parser.add_argument("--host", default="127.0.0.1", help="サーバーのアドレス")
+    parser.add_argument("--port", type=int, default=8080, help="サーバーのポート")
+    parser.add_argument("--clients", type=int, default=100, help="同時に接続するプレイヤー数")
+    parser.add_argument("--games", type=int, default=1, help="プレイヤーごとに続けて遊ぶゲーム数")
+    parser.add_argument("--reaction", type=float, default=5.0, help="平均回答時間（ゲーム内の秒）")
+    parser.add_argument("--ramp", type=float, default=5.0, help="全員が接続し終えるまでの時間（秒）")
+    parser.add_argument("--no-images", action="store_true", help="画像を取得しない")
+    parser.add_argument("--seed", type=int, default=None, help="乱数のシード")
+    parser.add_argument("--answers", help="回答までの時間を選ぶ記録したプレイのファイル（recorder.py のログ）")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
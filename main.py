@@ -3,6 +3,7 @@
 AWS サービスアイコン認識ゲーム
 メインエントリーポイント
 """
+import argparse
 import os
 import sys
 import pygame
@@ -18,6 +19,9 @@ if sys.stderr.encoding != 'utf-8':
     sys.stderr = open(sys.stderr.fileno(), mode='w', encoding='utf-8', buffering=1)
 
 from game import Game
+from utils import DEFAULT_PIXELATE_ENGINE, PIXELATE_ENGINES
+from profiler import FrameProfiler
+from recorder import SessionRecorder
 
 def check_font_availability():
     """日本語フォントの利用可能性を確認"""
@@ -35,8 +39,27 @@ def check_font_availability():
             except Exception as e:
                 print(f"エラー: 日本語フォントのダウンロードに失敗しました: {e}")
 
+def parse_args():
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(description="AWS サービスアイコン認識ゲーム")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="変化した領域だけを画面に反映する（リモートデスクトップや VNC 向け）")
+    parser.add_argument("--pixelate", choices=PIXELATE_ENGINES, default=DEFAULT_PIXELATE_ENGINE,
+                        help="ピクセル化の方式（scale: 最近傍の縮小・拡大、mosaic: ブロックごとの平均色、NumPy が必要で生成は scale の 3〜4 倍遅い）")
+    parser.add_argument("--hard", action="store_true",
+                        help="正解と見た目の近いアイコンを不正解の選択肢にする")
+    parser.add_argument("--profile", action="store_true",
+                        help="処理時間を記録し、オーバーレイに表示する（F3キーで表示を切り替え）")
+    parser.add_argument("--trace-file",
+                        help="終了時に処理時間のトレースを書き出すファイル（.jsonl の場合は JSON Lines、それ以外は Chrome のトレース形式）")
+    parser.add_argument("--record",
+                        help="プレイを記録するファイル（追記する。python recorder.py ファイル --replay で再実行できる）")
+    return parser.parse_args()
+
 def main():
     """ゲームのメイン関数"""
+    args = parse_args()
+    
     # PyGameの初期化
     pygame.init()
     
@@ -55,11 +78,35 @@ def main():
     print("利用可能なフォント:")
     print(pygame.font.get_fonts())
     
+    # プロファイラーの作成（--trace-file を指定した場合も記録する）
+    profiler = FrameProfiler() if args.profile or args.trace_file else None
+    
+    # プレイの記録（ファイルへの書き込みはバックグラウンドで行う）
+    recorder = SessionRecorder(args.record) if args.record else None
+    
     # ゲームインスタンスの作成
-    game = Game(screen)
+    game = Game(screen, dirty_rects=args.dirty_rects, profiler=profiler, pixelate_engine=args.pixelate,
+                hard_distractors=args.hard, recorder=recorder, show_profile=args.profile)
     
     # ゲームループ
-    game.run()
+    try:
+        game.run()
+    finally:
+        if recorder is not None:
+            recorder.close()
+            print(f"プレイを {args.record} に記録しました（{recorder.bytes_written}バイト）")
+    
+    # 処理時間の集計とトレースの書き出し
+    if profiler is not None:
+        print("処理時間（直近のフレーム）:")
+        for line in profiler.summary_lines():
+            print(f"  {line}")
+        if args.trace_file:
+            try:
+                count = profiler.export(args.trace_file)
+                print(f"トレースを {args.trace_file} に書き出しました（{count}イベント）")
+            except OSError as e:
+                print(f"エラー: トレースを書き出せませんでした: {e}")
     
     # PyGameの終了
     pygame.quit()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+AWS サービスアイコン認識ゲーム
+ピクセル化画像の事前レンダリング
+
+全アイコン・全解像度ステップのピクセル化画像（引き伸ばす前のブロック画像）を
+複数のプロセスで生成し、ゲームがそのまま読み込めるパックファイルに書き出す。
+パックファイルの形式はアイコンキャッシュ（icon_cache.py）と同じで、エントリの
+解像度レベルに解像度を、署名に元ファイルの署名を格納する。
+元ファイルが変わっていないアイコンは生成し直さずに既存のエントリを引き継ぐ。
+
+使い方:
+    python prerender.py [--icons-dir assets/icons] [--output パックファイル]
+                        [--levels 256,400,...] [--engine scale|mosaic] [--workers プロセス数]
+"""
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import multiprocessing
+import sys
+import time
+import zlib
+
+import pygame
+
+from engine import RESOLUTION_STEPS
+from icon_cache import CODEC_ZLIB, IconPack, variants_cache_path, write_pack
+from utils import (DEFAULT_PIXELATE_ENGINE, ICON_LOAD_ERRORS, PIXELATE_ENGINES, find_icon_sources,
+                   list_icons, numpy, pixelation_blocks)
+
+# ワーカープロセスのアイコンソース（プロセスごとに開く）
+_worker_sources = None
+_worker_options = None
+
+def _init_worker(icons_dir, levels, engine):
+    """ワーカープロセスの初期化（アイコンソースはプロセス間で共有できないため、それぞれで開く）"""
+    global _worker_sources, _worker_options
+    _worker_sources = find_icon_sources(icons_dir)
+    _worker_options = (levels, engine)
+
+def _render_icon(task):
+    """
+    1つのアイコンの全解像度のブロック画像を生成する（ワーカープロセスで実行する）
+
+    Args:
+        task: (アイコンソースの番号, キー)
+
+    Returns:
+        (task, [(解像度, 幅, 高さ, zlib 圧縮した RGBA ピクセル列)])（読み込めなかった場合は None）
+    """
+    index, key = task
+    levels, engine = _worker_options
+    try:
+        image = _worker_sources[index].load(key)
+    except ICON_LOAD_ERRORS:
+        return task, None
+    variants = []
+    for resolution, block in pixelation_blocks(image, levels, engine).items():
+        data = zlib.compress(pygame.image.tobytes(block, "RGBA"), 6)
+        variants.append((resolution, block.get_width(), block.get_height(), data))
+    return task, variants
+
+def prerender(icons_dir, output, levels, engine, workers=None, progress_interval=2.0):
+    """
+    全アイコン・全解像度のピクセル化画像を生成してパックファイルに書き出す関数
+
+    Args:
+        icons_dir: アイコンディレクトリ
+        output: 出力するパックファイルのパス
+        levels: 生成する解像度のリスト
+        engine: ピクセル化の方式（"scale" または "mosaic"）
+        workers: ワーカープロセス数（None の場合は CPU コア数）
+        progress_interval: 進捗を表示する間隔（秒）
+
+    Returns:
+        {"rendered", "skipped", "failed", "entries"} の辞書
+    """
+    start = time.perf_counter()
+    sources = find_icon_sources(icons_dir)
+    items = list_icons(sources)
+    if not items:
+        raise ValueError(f"{icons_dir} にアイコンが見つかりません")
+
+    # 元ファイルと全解像度のエントリが揃っているアイコンは生成し直さない
+    previous = IconPack.open(output)
+    kept, tasks, names = [], [], {}
+    for source, key, service_name in items:
+        try:
+            signature = source.signature(key)
+        except (OSError, KeyError):
+            print(f"警告: {source.describe(key)} の読み込みに失敗しました")
+            continue
+        entries = [previous.find(key, signature, level=level) for level in levels] if previous else [None]
+        if all(entry is not None for entry in entries):
+            kept.extend(entries)
+        else:
+            task = (sources.index(source), key)
+            tasks.append(task)
+            names[task] = (service_name, signature)
+    for source in sources:
+        source.close()
+
+    print(f"{len(items)}個のアイコンのうち{len(tasks)}個をレンダリングします"
+          f"（{len(levels)}段階、方式 {engine}、変更なし {len(items) - len(tasks)}個）")
+
+    stats = {"rendered": 0, "skipped": len(items) - len(tasks), "failed": 0, "entries": len(kept)}
+    if not tasks and previous is not None and len(previous) == len(kept):
+        # 変更がなければパックファイルを書き直さない
+        previous.close()
+        print(f"{output} は最新です")
+        return stats
+
+    def records():
+        # 変更のないアイコンは既存のエントリをそのまま引き継ぐ
+        for entry in kept:
+            yield (entry.key, entry.name, entry.signature, entry.level, entry.width, entry.height,
+                   entry.codec, bytes(previous.raw(entry)))
+        if not tasks:
+            return
+
+        render_start = time.perf_counter()
+        last_report = render_start
+        processes = workers or os.cpu_count() or 1
+        with multiprocessing.Pool(processes, _init_worker, (icons_dir, levels, engine)) as pool:
+            for task, variants in pool.imap_unordered(_render_icon, tasks, chunksize=8):
+                if variants is None:
+                    stats["failed"] += 1
+                    print(f"警告: {task[1]} の読み込みに失敗しました")
+                    continue
+                service_name, signature = names[task]
+                for resolution, width, height, data in variants:
+                    yield (task[1], service_name, signature, resolution, width, height, CODEC_ZLIB, data)
+                stats["rendered"] += 1
+
+                now = time.perf_counter()
+                if now - last_report >= progress_interval:
+                    last_report = now
+                    done = stats["rendered"] + stats["failed"]
+                    rate = done / (now - render_start)
+                    print(f"  {done}/{len(tasks)}（{rate:.0f}アイコン/秒）")
+
+    before_replace = previous.close if previous is not None else None
+    stats["entries"] = write_pack(output, records(), before_replace=before_replace)
+
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(output)
+    rate = stats["rendered"] * len(levels) / elapsed if elapsed > 0 else 0.0
+    print(f"{output} に{stats['entries']}件を書き出しました（{size / 1e6:.1f}MB、{elapsed:.1f}秒、"
+          f"{rate:.0f}画像/秒）")
+    return stats
+
+def main():
+    """コマンドラインから事前レンダリングを実行する"""
+    parser = argparse.ArgumentParser(description="ピクセル化画像を事前レンダリングする")
+    parser.add_argument("--icons-dir", default=os.path.join("assets", "icons"), help="アイコンディレクトリ")
+    parser.add_argument("--output", help="出力するパックファイル（既定値は assets/cache/variants-<方式>.pack）")
+    parser.add_argument("--levels", default=",".join(str(level) for level in RESOLUTION_STEPS),
+                        help="生成する解像度（カンマ区切り）")
+    parser.add_argument("--engine", choices=PIXELATE_ENGINES, default=DEFAULT_PIXELATE_ENGINE,
+                        help="ピクセル化の方式")
+    parser.add_argument("--workers", type=int, help="ワーカープロセス数（既定値は CPU コア数）")
+    args = parser.parse_args()
+
+    if args.engine == "mosaic" and numpy is None:
+        print("エラー: mosaic 方式には NumPy が必要です（pip install numpy）")
+        sys.exit(1)
+    levels = [int(level) for level in args.levels.split(",") if level]
+    output = args.output or variants_cache_path(args.engine)
+    try:
+        prerender(args.icons_dir, output, levels, args.engine, args.workers)
+    except (OSError, ValueError) as e:
+        print(f"エラー: 事前レンダリング中に問題が発生しました: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+AWS サービスアイコン認識ゲーム
+フレームごとの処理時間を記録するプロファイラー
+
+区間（イベント処理、状態の更新、各画面の描画、ピクセル化、画面への反映など）ごとの
+処理時間と FPS を固定長のリングバッファに記録し、p50/p99 のオーバーレイ表示と
+トレースファイル（Chrome のトレース形式または JSON Lines）への書き出しを行う。
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# プロファイラーを使わない場合の区間（何もしない）
+_NULL_SECTION = contextlib.nullcontext()
+
+def null_section(name):
+    """プロファイラーが無効な場合に FrameProfiler.section の代わりに使う関数"""
+    return _NULL_SECTION
+
+def percentile(values, q):
+    """
+    値の分位数を返す関数
+
+    Args:
+        values: 値のリスト
+        q: 分位（0.0〜1.0）
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+class FrameProfiler:
+    """
+    区間ごとの処理時間を記録するプロファイラー
+
+    使い方:
+        with profiler.section("events"):
+            ...
+        profiler.end_frame(clock.get_fps())
+    """
+    def __init__(self, history=600, trace_events=200000):
+        """
+        Args:
+            history: 区間ごとに保持する処理時間の数（フレーム数）
+            trace_events: トレースとして保持するイベントの最大数（古いものから破棄する）
+        """
+        self.history = history
+        self.sections = {}  # 区間名 -> 処理時間（ミリ秒）のリングバッファ
+        self.fps = deque(maxlen=history)
+        self.frame_times = deque(maxlen=history)  # フレーム全体の処理時間（ミリ秒）
+        self.trace = deque(maxlen=trace_events)
+        self.frames = 0
+        self._origin = time.perf_counter()
+        self._frame_start = None
+        self._pid = os.getpid()
+
+    @contextlib.contextmanager
+    def section(self, name):
+        """区間の処理時間を計測するコンテキストマネージャー"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.record(name, start, end)
+
+    def record(self, name, start, end):
+        """
+        区間の処理時間を記録する
+
+        Args:
+            name: 区間名
+            start: 開始時刻（time.perf_counter の値）
+            end: 終了時刻（time.perf_counter の値）
+        """
+        buffer = self.sections.get(name)
+        if buffer is None:
+            buffer = self.sections[name] = deque(maxlen=self.history)
+        buffer.append((end - start) * 1000)
+        self.trace.append((name, start, end, threading.get_ident()))
+
+    def begin_frame(self):
+        """フレームの処理を開始する（入力待ちの時間はフレームに含めない）"""
+        self._frame_start = time.perf_counter()
+
+    def end_frame(self, fps=None):
+        """
+        フレームの処理を終了する
+
+        Args:
+            fps: 現在の FPS（pygame.time.Clock.get_fps() の値、計測前の 0 は記録しない）
+        """
+        end = time.perf_counter()
+        if self._frame_start is not None:
+            self.frame_times.append((end - self._frame_start) * 1000)
+            self.trace.append(("frame", self._frame_start, end, threading.get_ident()))
+            self._frame_start = None
+        if fps:
+            self.fps.append(fps)
+            self.trace.append(("fps", end, fps, None))
+        self.frames += 1
+
+    def stats(self, name):
+        """
+        区間の処理時間の統計を返す
+
+        Returns:
+            (p50, p99)（ミリ秒）
+        """
+        values = list(self.frame_times if name == "frame" else self.sections.get(name, ()))
+        return percentile(values, 0.5), percentile(values, 0.99)
+
+    def summary_lines(self):
+        """オーバーレイやログに表示する統計の行を返す"""
+        lines = []
+        if self.fps:
+            lines.append(f"FPS {self.fps[-1]:5.1f}  (min {min(self.fps):5.1f})")
+        for name in ["frame"] + list(self.sections):
+            p50, p99 = self.stats(name)
+            lines.append(f"{name:<16} p50 {p50:7.2f}ms  p99 {p99:7.2f}ms")
+        return lines
+
+    def export(self, path):
+        """
+        記録したトレースを書き出す
+
+        拡張子が .jsonl の場合は1行1イベントの JSON Lines、それ以外は
+        Chrome のトレース形式（chrome://tracing や Perfetto で開ける）で書き出す
+
+        Returns:
+            書き出したイベント数
+        """
+        events = []
+        for name, start, end, thread in list(self.trace):
+            if name == "fps":
+                events.append({"name": "fps", "ph": "C", "ts": self._micros(start),
+                               "pid": self._pid, "args": {"fps": round(end, 2)}})
+            else:
+                events.append({"name": name, "ph": "X", "ts": self._micros(start),
+                               "dur": round((end - start) * 1e6, 1), "pid": self._pid, "tid": thread})
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for event in events:
+                    f.write(json.dumps(event) + "\n")
+            else:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+    def _micros(self, timestamp):
+        return round((timestamp - self._origin) * 1e6, 1)
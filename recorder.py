@@ -0,0 +1,739 @@
+#!/usr/bin/env python3
+"""
+AWS サービスアイコン認識ゲーム
+セッションのバイナリ記録と再実行（リプレイ）
+
+QuizEngine のイベントを、追記のみのコンパクトなバイナリのログに記録する。
+記録するのは乱数のシードとエンジンの設定、サンプラーに登録したサービス名と出題対象から
+外したサービス名、出題した問題と選択肢（先に選んだ次の問題を含む）、update で進めた時間、回答（時刻と選択肢）、
+得点の変化で、ファイルへの書き込みはバックグラウンドのスレッドで行う。
+
+ログの構成:
+    セグメント: マジック(8) / バージョン(u16) に続くレコードの並び
+        （SessionRecorder を開くたびにファイルの末尾に新しいセグメントを追記する）
+    レコード  : 種類(u8) / ストリーム番号(可変長整数) / 種類ごとの内容
+        （サービス名は NAME レコードで一度だけ定義し、以降は番号で参照する）
+
+整数は可変長整数（LEB128）、時間は倍精度浮動小数点数で格納する。同じ dt の連続した
+update は回数と dt の1レコードにまとめるため、固定タイムステップのゲームでも
+1問あたり数十バイトに収まる。
+
+リプレイでは記録した update と回答を同じ順にエンジンに与えて、記録と一致するかを確かめる。
+
+- シードから: 記録したシードの乱数生成器で QuestionSampler を作り直し、記録した時点で
+  同じサービス名を登録して、出題（問題と選択肢の選び方）も含めて再現する
+- 記録した問題から: 記録した問題をそのまま出題し、時間・得点・時間切れだけを確かめる
+  （サーバーのセッションのように乱数生成器を共有している場合はシードから再現できないため、
+  警告を表示してこちらで確かめる）
+
+--hard の索引を使い始めた後の出題は索引に依存するため、シードからはその手前までを確かめる。
+
+使い方:
+    python recorder.py セッション.rec            # 記録したセッションの一覧
+    python recorder.py セッション.rec --replay   # 再実行して記録と一致するかを確かめる
+"""
+import argparse
+import os
+import queue
+import random
+import struct
+import threading
+import time
+from collections import namedtuple
+
+from engine import QuizEngine
+
+LOG_MAGIC = b"AWSQREC\0"
+LOG_VERSION = 2
+
+# レコードの種類（マジックの先頭バイトと区別できるよう 0x20 未満にする）
+REC_SESSION = 0x01
+REC_NAME = 0x02
+REC_START = 0x03
+REC_UPDATE = 0x04
+REC_QUESTION = 0x05
+REC_ANSWER = 0x06
+REC_TIMEOUT = 0x07
+REC_GAME_OVER = 0x08
+REC_CATALOG = 0x09
+REC_EXCLUDE = 0x0A
+REC_SIMILARITY = 0x0B
+REC_UPCOMING = 0x0C
+
+# SESSION レコードのフラグ
+FLAG_SEED = 0x01  # シードを記録した
+FLAG_SHARED_SAMPLER = 0x02  # エンジンの外で作成したサンプラーを使う（サーバーのセッションなど。シードから出題を再現できない）
+FLAG_WEIGHTED = 0x04  # 重み付きのサンプラーを使う（重みの関数は記録しないため、シードから出題を再現できない）
+
+# 記録した問題から再実行する場合に比べないレコードの種類（サンプラーと索引に関するもの）
+_SAMPLER_RECORDS = ("upcoming", "catalog", "exclude", "similarity")
+
+_VERSION = struct.Struct("<H")
+_DOUBLE = struct.Struct("<d")
+
+# エンジンの設定のうち、ログに記録してリプレイで同じ値にするもの
+_CONFIG_FLOATS = ("countdown_time", "original_time", "result_display_time", "timeout_display_time")
+_CONFIG_INTS = ("max_questions", "num_options")
+
+SessionLog = namedtuple("SessionLog", ["stream", "seed", "flags", "started", "config", "records"])
+
+class LogFormatError(ValueError):
+    """ログの形式が正しくない場合の例外"""
+
+def _write_varint(buffer, value):
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+def _read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise LogFormatError("ログが途中で切れています")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def _read_double(data, pos):
+    if pos + _DOUBLE.size > len(data):
+        raise LogFormatError("ログが途中で切れています")
+    return _DOUBLE.unpack_from(data, pos)[0], pos + _DOUBLE.size
+
+def capture(event, engine):
+    """
+    エンジンのイベントを記録用のレコード（タプル）にする関数
+
+    Returns:
+        ("start",)
+        ("update", 回数, dt)
+        ("question", 時刻, 問題番号, 正解, 選択肢のタプル)
+        ("upcoming", 正解, 選択肢のタプル)（先に選んだ次の問題）
+        ("answer", 時刻, 選んだ選択肢, 正解か, 得点, コンボ)
+        ("timeout", 時刻, 得点)
+        ("game_over", 得点, 正解数)
+        ("catalog", サンプラーに登録したサービス名のタプル)
+        ("exclude", 出題対象から外したサービス名)
+        記録しないイベントの場合は None
+    """
+    if event == "update":
+        return ("update", 1, engine.last_dt)
+    if event == "start":
+        return ("start",)
+    if event == "question":
+        return ("question", engine.time, engine.question_count, engine.correct_answer, tuple(engine.current_options))
+    if event == "answer":
+        return ("answer", engine.time, engine.selected_answer, engine.result_correct, engine.score, engine.combo)
+    if event == "timeout":
+        return ("timeout", engine.time, engine.score)
+    if event == "game_over":
+        return ("game_over", engine.score, engine.correct_count)
+    if event == "upcoming":
+        return ("upcoming", engine.upcoming[0], tuple(engine.upcoming[1]))
+    if event == "catalog":
+        return ("catalog", tuple(engine.added))
+    if event == "exclude":
+        return ("exclude", engine.last_excluded)
+    return None
+
+class _Stream:
+    """1つのエンジンのレコードの並び（同じ dt の連続した update を1つにまとめる）"""
+    def __init__(self):
+        self._updates = 0
+        self._dt = 0.0
+        self._similarity = False  # エンジンが見た目の近さの索引を使い始めたか
+
+    def capture(self, event, engine):
+        """
+        エンジンのイベントをレコードにして加える
+
+        エンジンに索引（--hard）が設定されたら、そのイベントの前に ("similarity",) を加える
+        （以降の不正解の選択肢は索引から選ばれるため、シードからは再現できない）
+
+        Returns:
+            確定したレコードのリスト
+        """
+        done = []
+        if not self._similarity and engine.similarity is not None:
+            self._similarity = True
+            done = self.push(("similarity",))
+        record = capture(event, engine)
+        return done + self.push(record) if record is not None else done
+
+    def push(self, record):
+        """
+        レコードを加える
+
+        Returns:
+            確定したレコードのリスト（まとめている update は次の別のレコードまで保留する）
+        """
+        if record[0] == "update":
+            if self._updates and record[2] == self._dt:
+                self._updates += 1
+                return []
+            done = self.flush()
+            self._updates, self._dt = 1, record[2]
+            return done
+        return self.flush() + [record]
+
+    @property
+    def pending(self):
+        """まとめている update があるか"""
+        return self._updates > 0
+
+    def flush(self):
+        """保留している update を確定する"""
+        if not self._updates:
+            return []
+        record = ("update", self._updates, self._dt)
+        self._updates = 0
+        return [record]
+
+class SessionRecorder:
+    """
+    エンジンのイベントをログファイルに記録するレコーダー
+
+    attach したエンジンのイベントはエンジンを動かすスレッドでバイト列にし、
+    ファイルへの書き込みはバックグラウンドのスレッドで行うため、ゲームループは I/O で止まらない。
+    1つのファイルに複数のエンジン（サーバーのセッションなど）をストリーム番号で区別して記録できる。
+    attach とイベントの通知は1つのスレッドから行う。
+    """
+    def __init__(self, path):
+        """
+        Args:
+            path: ログファイルのパス（既にある場合は末尾に追記する）
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "ab")
+        self._names = {}  # サービス名 -> 番号（セグメントごと）
+        self._streams = {}  # ストリーム番号 -> _Stream
+        self._next_stream = 0
+        self.bytes_written = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._write_loop, name="SessionRecorder", daemon=True)
+        self._thread.start()
+        self._queue.put(LOG_MAGIC + _VERSION.pack(LOG_VERSION))
+
+    def _write_loop(self):
+        while True:
+            chunks = [self._queue.get()]
+            # 溜まっている分はまとめて書き込む
+            while True:
+                try:
+                    chunks.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            closing = chunks[-1] is None
+            data = b"".join(chunk for chunk in chunks if chunk is not None)
+            if data:
+                self._file.write(data)
+                # プロセスが異常終了しても直前までの記録が残るよう、OS に渡しておく
+                self._file.flush()
+                self.bytes_written += len(data)
+            if closing:
+                self._file.close()
+                return
+
+    def attach(self, engine, seed=None):
+        """
+        エンジンのイベントの記録を始める
+
+        Args:
+            engine: QuizEngine
+            seed: エンジンの乱数生成器のシード（わかる場合）
+
+        Returns:
+            ストリーム番号
+        """
+        stream = self._next_stream
+        self._next_stream += 1
+        self._streams[stream] = _Stream()
+        flags = FLAG_SEED if seed is not None else 0
+        if not engine.owns_sampler:
+            flags |= FLAG_SHARED_SAMPLER
+        if engine.sampler.weight is not None:
+            flags |= FLAG_WEIGHTED
+        buffer = bytearray([REC_SESSION])
+        _write_varint(buffer, stream)
+        buffer.append(flags)
+        _write_varint(buffer, seed if seed is not None else 0)
+        buffer += _DOUBLE.pack(time.time())
+        for name in _CONFIG_FLOATS:
+            buffer += _DOUBLE.pack(getattr(engine, name))
+        for name in _CONFIG_INTS:
+            _write_varint(buffer, getattr(engine, name))
+        _write_varint(buffer, len(engine.resolution_steps))
+        for step in engine.resolution_steps:
+            _write_varint(buffer, step)
+        self._queue.put(bytes(buffer))
+        engine.add_listener(lambda event, engine: self._on_event(stream, event, engine))
+        return stream
+
+    def end(self, stream):
+        """ストリームの記録を終える（保留している update を書き出す）"""
+        state = self._streams.pop(stream, None)
+        if state is not None:
+            self._put(stream, state.flush())
+
+    def _on_event(self, stream, event, engine):
+        state = self._streams.get(stream)
+        if state is not None:
+            self._put(stream, state.capture(event, engine))
+
+    def _name_id(self, buffer, name):
+        """サービス名の番号を返す（初めての名前の場合は NAME レコードを buffer に加える）"""
+        index = self._names.get(name)
+        if index is None:
+            index = self._names[name] = len(self._names)
+            encoded = name.encode("utf-8")
+            buffer.append(REC_NAME)
+            _write_varint(buffer, len(encoded))
+            buffer += encoded
+        return index
+
+    def _put(self, stream, records):
+        if not records:
+            return
+        buffer = bytearray()
+        for record in records:
+            kind = record[0]
+            if kind == "update":
+                self._encode(buffer, REC_UPDATE, stream)
+                _write_varint(buffer, record[1])
+                buffer += _DOUBLE.pack(record[2])
+            elif kind == "start":
+                self._encode(buffer, REC_START, stream)
+            elif kind == "question":
+                _, at, number, correct, options = record
+                ids = [self._name_id(buffer, name) for name in (correct,) + options]
+                self._encode(buffer, REC_QUESTION, stream)
+                buffer += _DOUBLE.pack(at)
+                _write_varint(buffer, number)
+                _write_varint(buffer, len(options))
+                for index in ids:
+                    _write_varint(buffer, index)
+            elif kind == "answer":
+                _, at, option, correct, score, combo = record
+                index = self._name_id(buffer, option)
+                self._encode(buffer, REC_ANSWER, stream)
+                buffer += _DOUBLE.pack(at)
+                _write_varint(buffer, index)
+                buffer.append(correct)
+                _write_varint(buffer, score)
+                _write_varint(buffer, combo)
+            elif kind == "timeout":
+                self._encode(buffer, REC_TIMEOUT, stream)
+                buffer += _DOUBLE.pack(record[1])
+                _write_varint(buffer, record[2])
+            elif kind == "game_over":
+                self._encode(buffer, REC_GAME_OVER, stream)
+                _write_varint(buffer, record[1])
+                _write_varint(buffer, record[2])
+            elif kind == "upcoming":
+                _, correct, options = record
+                ids = [self._name_id(buffer, name) for name in (correct,) + options]
+                self._encode(buffer, REC_UPCOMING, stream)
+                _write_varint(buffer, len(options))
+                for index in ids:
+                    _write_varint(buffer, index)
+            elif kind == "catalog":
+                ids = [self._name_id(buffer, name) for name in record[1]]
+                self._encode(buffer, REC_CATALOG, stream)
+                _write_varint(buffer, len(ids))
+                for index in ids:
+                    _write_varint(buffer, index)
+            elif kind == "exclude":
+                index = self._name_id(buffer, record[1])
+                self._encode(buffer, REC_EXCLUDE, stream)
+                _write_varint(buffer, index)
+            elif kind == "similarity":
+                self._encode(buffer, REC_SIMILARITY, stream)
+        self._queue.put(bytes(buffer))
+
+    @staticmethod
+    def _encode(buffer, kind, stream):
+        buffer.append(kind)
+        _write_varint(buffer, stream)
+
+    def close(self):
+        """全てのストリームの記録を終え、書き込みが終わるまで待ってファイルを閉じる"""
+        for stream in list(self._streams):
+            self.end(stream)
+        self._queue.put(None)
+        self._thread.join()
+
+def _read_segment(data, pos, sessions):
+    """
+    1つのセグメントを読み込み、セッションごとのレコードを sessions に加える
+
+    Returns:
+        次のセグメントの位置
+    """
+    names = []
+    streams = {}  # セグメント内のストリーム番号 -> SessionLog
+    while pos < len(data):
+        if data.startswith(LOG_MAGIC, pos):
+            return pos
+        kind = data[pos]
+        pos += 1
+        if kind == REC_NAME:
+            length, pos = _read_varint(data, pos)
+            if pos + length > len(data):
+                raise LogFormatError("ログが途中で切れています")
+            names.append(data[pos:pos + length].decode("utf-8"))
+            pos += length
+            continue
+        stream, pos = _read_varint(data, pos)
+        if kind == REC_SESSION:
+            if pos >= len(data):
+                raise LogFormatError("ログが途中で切れています")
+            flags = data[pos]
+            seed, pos = _read_varint(data, pos + 1)
+            started, pos = _read_double(data, pos)
+            config = {}
+            for name in _CONFIG_FLOATS:
+                config[name], pos = _read_double(data, pos)
+            for name in _CONFIG_INTS:
+                config[name], pos = _read_varint(data, pos)
+            count, pos = _read_varint(data, pos)
+            steps = []
+            for _ in range(count):
+                step, pos = _read_varint(data, pos)
+                steps.append(step)
+            config["resolution_steps"] = steps
+            log = SessionLog(stream, seed if flags & FLAG_SEED else None, flags, started, config, [])
+            streams[stream] = log
+            sessions.append(log)
+            continue
+        log = streams.get(stream)
+        if log is None:
+            raise LogFormatError(f"定義されていないストリーム {stream} のレコードがあります")
+        if kind == REC_UPDATE:
+            count, pos = _read_varint(data, pos)
+            dt, pos = _read_double(data, pos)
+            record = ("update", count, dt)
+        elif kind == REC_START:
+            record = ("start",)
+        elif kind == REC_QUESTION:
+            at, pos = _read_double(data, pos)
+            number, pos = _read_varint(data, pos)
+            count, pos = _read_varint(data, pos)
+            ids = []
+            for _ in range(count + 1):
+                index, pos = _read_varint(data, pos)
+                ids.append(index)
+            record = ("question", at, number, names[ids[0]], tuple(names[index] for index in ids[1:]))
+        elif kind == REC_ANSWER:
+            at, pos = _read_double(data, pos)
+            index, pos = _read_varint(data, pos)
+            if pos >= len(data):
+                raise LogFormatError("ログが途中で切れています")
+            correct = bool(data[pos])
+            score, pos = _read_varint(data, pos + 1)
+            combo, pos = _read_varint(data, pos)
+            record = ("answer", at, names[index], correct, score, combo)
+        elif kind == REC_TIMEOUT:
+            at, pos = _read_double(data, pos)
+            score, pos = _read_varint(data, pos)
+            record = ("timeout", at, score)
+        elif kind == REC_GAME_OVER:
+            score, pos = _read_varint(data, pos)
+            correct, pos = _read_varint(data, pos)
+            record = ("game_over", score, correct)
+        elif kind == REC_UPCOMING:
+            count, pos = _read_varint(data, pos)
+            ids = []
+            for _ in range(count + 1):
+                index, pos = _read_varint(data, pos)
+                ids.append(index)
+            record = ("upcoming", names[ids[0]], tuple(names[index] for index in ids[1:]))
+        elif kind == REC_CATALOG:
+            count, pos = _read_varint(data, pos)
+            ids = []
+            for _ in range(count):
+                index, pos = _read_varint(data, pos)
+                ids.append(index)
+            record = ("catalog", tuple(names[index] for index in ids))
+        elif kind == REC_EXCLUDE:
+            index, pos = _read_varint(data, pos)
+            record = ("exclude", names[index])
+        elif kind == REC_SIMILARITY:
+            record = ("similarity",)
+        else:
+            raise LogFormatError(f"不明なレコードの種類です: {kind}")
+        log.records.append(record)
+    return pos
+
+def read_log(path):
+    """
+    ログファイルを読み込む関数
+
+    異常終了などで途中で切れたレコードは読み飛ばし、次のセグメントから読み込みを続ける
+
+    Returns:
+        SessionLog のリスト（記録を始めた順）
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    sessions = []
+    pos = 0
+    while True:
+        pos = data.find(LOG_MAGIC, pos)
+        if pos < 0:
+            return sessions
+        pos += len(LOG_MAGIC)
+        if pos + _VERSION.size > len(data):
+            return sessions
+        version = _VERSION.unpack_from(data, pos)[0]
+        pos += _VERSION.size
+        if version != LOG_VERSION:
+            raise LogFormatError(f"ログのバージョンが異なります: {version}")
+        # 切れたレコードが後に追記されたセグメントのバイト列を読まないよう、次のマジックの手前までを読む
+        end = data.find(LOG_MAGIC, pos)
+        if end < 0:
+            end = len(data)
+        try:
+            _read_segment(data[pos:end], 0, sessions)
+        except (LogFormatError, IndexError, UnicodeDecodeError):
+            # 切れたレコードの後に追記されたセグメントがあれば、そこから読み込みを続ける
+            pass
+        pos = end
+
+class ScriptedSampler:
+    """
+    記録した問題を記録した順に出題するサンプラー（リプレイ用）
+
+    QuizEngine に sampler として渡す。記録が尽きた後に選ばれた問題（記録の終わりに
+    先に選ばれ、出題されなかった次の問題）には最後の問題をもう一度返す。
+    """
+    def __init__(self, questions):
+        """
+        Args:
+            questions: (正解, 選択肢のリスト) のリスト
+        """
+        self._questions = list(questions)
+        self._next = 0
+        self._names = []
+        for correct, options in self._questions:
+            for name in [correct] + list(options):
+                if name not in self._names:
+                    self._names.append(name)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __iter__(self):
+        return iter(list(self._names))
+
+    def remove(self, name):
+        pass
+
+    def question(self, num_options=4):
+        """記録した次の問題を返す"""
+        if not self._questions:
+            raise ValueError("記録に問題がありません")
+        index = min(self._next, len(self._questions) - 1)
+        self._next += 1
+        correct, options = self._questions[index]
+        return correct, list(options)
+
+class _ReplayCatalog:
+    """
+    シードから再実行するエンジンに渡すカタログ（リプレイ用）
+
+    記録した時点でサンプラーに登録したサービス名だけを見せる。エンジンは出題のたびに件数を
+    確かめるため、その時点で記録の次のレコードが "catalog" であれば、その名前を見せる。
+    """
+    def __init__(self, expected, records, stream):
+        """
+        Args:
+            expected: 記録したレコードのリスト
+            records: 再実行で確定したレコードのリスト（再実行の進み具合）
+            stream: 再実行のレコードをまとめる _Stream
+        """
+        self._expected = expected
+        self._records = records
+        self._stream = stream
+        self._names = []
+        self._shown = set()  # 見せた "catalog" レコードの位置
+
+    def __len__(self):
+        position = len(self._records) + self._stream.pending
+        if (position < len(self._expected) and self._expected[position][0] == "catalog"
+                and position not in self._shown):
+            self._shown.add(position)
+            self._names.extend(self._expected[position][1])
+        return len(self._names)
+
+    def __iter__(self):
+        return iter(list(self._names))
+
+def _run(engine, expected, stop=None):
+    """
+    記録の入力（ゲームの開始、update、回答、エンジンの外から選ばせた次の問題）を順にエンジンに与える
+
+    Args:
+        engine: 再実行するエンジン（レコードは _Stream で集めてある）
+        expected: 記録したレコードのリスト
+        stop: この位置のレコードの手前で止める（None の場合は最後まで）
+    """
+    for record in expected[:stop]:
+        kind = record[0]
+        if kind == "start":
+            engine.start()
+        elif kind == "update":
+            for _ in range(record[1]):
+                engine.update(record[2])
+        elif kind == "answer":
+            engine.answer(record[2])
+        elif kind == "upcoming" and engine.upcoming is None:
+            # 回答や時間切れの後ではなく、メニュー画面などでゲームが先に選ばせた次の問題
+            engine.prepare_next()
+
+def _first_mismatch(expected, records):
+    """最初に一致しないレコードの位置を返す（一致した場合は None）"""
+    for index, (recorded, replayed) in enumerate(zip(expected, records)):
+        if recorded != replayed:
+            return index
+    if len(expected) != len(records):
+        return min(len(expected), len(records))
+    return None
+
+ReplayResult = namedtuple("ReplayResult", ["engine", "records", "expected", "mismatch", "seeded", "warning"])
+
+def replay_questions(log):
+    """
+    記録した問題をそのまま出題して再実行する関数（時間・得点・時間切れだけを確かめる）
+
+    Returns:
+        ReplayResult（expected は比べた記録のレコード、mismatch は最初に一致しなかった位置）
+    """
+    questions = [(record[3], record[4]) for record in log.records if record[0] == "question"]
+    sampler = ScriptedSampler(questions)
+    engine = QuizEngine(list(sampler), rng=random.Random(log.seed), sampler=sampler, **log.config)
+    stream = _Stream()
+    records = []
+    engine.add_listener(lambda event, engine: records.extend(stream.capture(event, engine)))
+    _run(engine, log.records)
+    records.extend(stream.flush())
+
+    # 出題の選び方に関するレコードは記録した問題からは再現しないため比べない
+    expected = [record for record in log.records if record[0] not in _SAMPLER_RECORDS]
+    records = [record for record in records if record[0] not in _SAMPLER_RECORDS]
+    return ReplayResult(engine, records, expected, _first_mismatch(expected, records), False, None)
+
+def replay(log):
+    """
+    記録したセッションを QuizEngine で再実行する関数
+
+    記録したシードの乱数生成器で QuestionSampler を作り直し、記録した時点で同じサービス名を
+    登録して、記録した update と回答を同じ順に与える。出題の選び方とエンジンのルールが
+    記録した時と同じであれば、全てのレコード（出題と選択肢、得点、時間切れ）が記録と一致する。
+
+    シードから出題を再現できない場合（シードがない、エンジンの外で作成したサンプラー、重み付き）は
+    記録した問題をそのまま出題して時間・得点・時間切れだけを確かめ、warning に理由を入れる。
+    --hard の索引を使い始めた場合は、その手前までをシードから再現して確かめる。
+
+    Args:
+        log: SessionLog
+
+    Returns:
+        ReplayResult（mismatch は最初に一致しなかったレコードの位置、一致した場合は None。
+        seeded はシードから出題を再現したか）
+    """
+    if log.flags & FLAG_SHARED_SAMPLER:
+        reason = "エンジンの外で作成したサンプラーを使っている（サーバーのセッションなど）"
+    elif log.seed is None:
+        reason = "シードが記録されていない"
+    elif log.flags & FLAG_WEIGHTED:
+        reason = "重み付きのサンプラーを使っている"
+    else:
+        reason = None
+    if reason is not None:
+        result = replay_questions(log)
+        return result._replace(warning=f"{reason}ため、出題は記録した問題から与えました")
+
+    stop = next((index for index, record in enumerate(log.records) if record[0] == "similarity"), None)
+    expected = log.records[:stop]
+    excluded = {record[1] for record in expected if record[0] == "exclude"}
+    stream = _Stream()
+    records = []
+    catalog = _ReplayCatalog(expected, records, stream)
+    engine = QuizEngine(catalog, rng=random.Random(log.seed), validate=lambda name: name not in excluded,
+                        **log.config)
+    engine.add_listener(lambda event, engine: records.extend(stream.capture(event, engine)))
+    _run(engine, expected)
+    records.extend(stream.flush())
+
+    warning = None
+    if stop is not None:
+        # 索引を使い始めた後は出題が索引に依存するため、手前までを比べる
+        records = records[:stop]
+        warning = f"{stop}番目のレコードから --hard の索引を使っているため、そこまでを確かめました"
+    return ReplayResult(engine, records, expected, _first_mismatch(expected, records), True, warning)
+
+def answer_delays(sessions):
+    """
+    記録から回答までの時間（ゲーム内の秒）を取り出す関数（負荷試験の入力に使う）
+
+    Returns:
+        問題ごとの回答までの時間のリスト（時間切れの場合は None）
+    """
+    delays = []
+    for log in sessions:
+        shown = None
+        for record in log.records:
+            if record[0] == "question":
+                shown = record[1]
+            elif record[0] in ("answer", "timeout") and shown is not None:
+                delays.append(record[1] - shown if record[0] == "answer" else None)
+                shown = None
+    return delays
+
+def main():
+    """コマンドラインから記録したセッションを表示・再実行する"""
+    parser = argparse.ArgumentParser(description="記録したセッションを表示・再実行する")
+    parser.add_argument("log", help="ログファイル")
+    parser.add_argument("--replay", action="store_true", help="再実行して記録と一致するかを確かめる")
+    args = parser.parse_args()
+
+    sessions = read_log(args.log)
+    print(f"{args.log}: {len(sessions)}セッション（{os.path.getsize(args.log)}バイト）")
+    failures = 0
+    start = time.perf_counter()
+    for log in sessions:
+        kinds = [record[0] for record in log.records]
+        scores = [record[1] for record in log.records if record[0] == "game_over"]
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(log.started))
+        line = (f"  #{log.stream} {started} シード {log.seed}: {kinds.count('start')}ゲーム、"
+                f"{kinds.count('question')}問、回答 {kinds.count('answer')}、時間切れ {kinds.count('timeout')}、"
+                f"最終スコア {scores}")
+        if args.replay:
+            result = replay(log)
+            if result.mismatch is None:
+                line += " -> 一致（出題もシードから再現）" if result.seeded else " -> 一致（出題は記録から）"
+            else:
+                failures += 1
+                index = result.mismatch
+                recorded = result.expected[index] if index < len(result.expected) else None
+                replayed = result.records[index] if index < len(result.records) else None
+                line += f" -> {index}番目のレコードが一致しません（記録: {recorded}、再実行: {replayed}）"
+        print(line)
+        if args.replay and result.warning:
+            print(f"    警告: {result.warning}")
+    if args.replay:
+        elapsed = time.perf_counter() - start
+        print(f"{len(sessions) - failures}/{len(sessions)}セッションが記録と一致しました（{elapsed:.2f}秒）")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+AWS サービスアイコン認識ゲーム
+全画面描画と差分（ダーティ矩形）描画を切り替えられるレンダラー
+"""
+import pygame
+
+class FrameRenderer:
+    """
+    1フレーム分の描画内容を (キー, 矩形, 内容) の一覧として受け取り、画面に反映するレンダラー
+
+    - 全画面モード: 毎フレーム背景から全て描き直して display.flip() する
+    - 差分モード: 前のフレームと比べて内容や位置が変わった項目の領域だけを描き直し、
+      display.update(rects) でその領域だけを画面に反映する
+
+    内容の比較は blit する Surface の同一性（テキストやピクセル化画像はキャッシュから
+    同じ Surface が返る）と塗りつぶしの色で行うため、画面側は変化した領域を意識せずに
+    毎フレーム同じように項目を登録すればよい。
+    """
+    def __init__(self, screen, background, dirty_rects=False):
+        """
+        Args:
+            screen: 描画先の Surface（ディスプレイ）
+            background: 背景色
+            dirty_rects: 差分モードで描画するか
+        """
+        self.screen = screen
+        self.background = background
+        self.dirty_rects = dirty_rects
+        self._items = {}
+        self._previous = None
+
+    def begin(self):
+        """フレームの描画を開始する"""
+        self._items = {}
+
+    def blit(self, key, surface, rect):
+        """
+        Surface を描画する項目を登録する
+
+        Args:
+            key: 項目を識別するキー（フレーム間で同じ項目には同じキーを使う）
+            surface: 描画する Surface
+            rect: 描画先の矩形または左上の座標
+        """
+        rect = pygame.Rect(rect, surface.get_size()) if len(rect) == 2 else pygame.Rect(rect)
+        self._items[key] = (rect, surface, None)
+
+    def fill(self, key, rect, color):
+        """
+        矩形を塗りつぶす項目を登録する
+
+        Args:
+            key: 項目を識別するキー
+            rect: 塗りつぶす矩形
+            color: 塗りつぶす色
+        """
+        self._items[key] = (pygame.Rect(rect), None, tuple(color))
+
+    def invalidate(self):
+        """次のフレームで画面全体を描き直す"""
+        self._previous = None
+
+    def present(self):
+        """
+        登録された項目を画面に反映する
+
+        Returns:
+            画面に反映した矩形のリスト（全画面の場合は画面全体の矩形）
+        """
+        items = self._items
+        if not self.dirty_rects or self._previous is None:
+            self.screen.fill(self.background)
+            self._draw(items.values())
+            pygame.display.flip()
+            self._previous = items
+            return [self.screen.get_rect()]
+
+        dirty = self._dirty_regions(self._previous, items)
+        if dirty:
+            for region in dirty:
+                # 領域内に重なる項目だけを背景から描き直す
+                self.screen.set_clip(region)
+                self.screen.fill(self.background, region)
+                self._draw(item for item in items.values() if item[0].colliderect(region))
+            self.screen.set_clip(None)
+            pygame.display.update(dirty)
+        self._previous = items
+        return dirty
+
+    def _draw(self, items):
+        for rect, surface, color in items:
+            if surface is not None:
+                self.screen.blit(surface, rect)
+            else:
+                pygame.draw.rect(self.screen, color, rect)
+
+    @staticmethod
+    def _dirty_regions(previous, current):
+        """前のフレームから変化した項目の領域（新旧両方の位置）を返す"""
+        regions = []
+        for key, (rect, surface, color) in current.items():
+            old = previous.get(key)
+            if old is None:
+                regions.append(rect)
+            elif old[0] != rect or old[1] is not surface or old[2] != color:
+                regions.append(rect)
+                regions.append(old[0])
+        for key, (rect, _, _) in previous.items():
+            if key not in current:
+                regions.append(rect)
+
+        # 重なり合う領域はまとめて、同じ場所を何度も描き直さないようにする
+        merged = []
+        for region in regions:
+            if region.width <= 0 or region.height <= 0:
+                continue
+            region = region.copy()
+            i = 0
+            while i < len(merged):
+                if merged[i].colliderect(region):
+                    region.union_ip(merged.pop(i))
+                    i = 0
+                else:
+                    i += 1
+            merged.append(region)
+        return merged
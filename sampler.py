@@ -0,0 +1,370 @@
+"""
+AWS サービスアイコン認識ゲーム
+出題する問題（正解と選択肢）を選ぶサンプラー
+
+サービス名の一覧を一度だけ索引し、出題のたびに一覧を作り直さずに問題を選ぶ。
+
+- 一様に選ぶ場合は、シャッフルした山札から1枚ずつ引く（Fisher-Yates を1段ずつ進める）
+- 重み付きで選ぶ場合は、まだ引いていないサービス名の重みを Fenwick 木で保持して引く
+- 不正解の選択肢は Floyd の方法で重複なく選ぶ（選び直しのループがない）
+
+サーバーのように多数のセッションがそれぞれ山札を持つ場合は、サービス名の一覧を SharedCatalog で
+共有し、セッションごとに QuestionDeck（入れ替えた位置だけを持つ山札）を使う。
+
+いずれも山札を一巡するまで同じサービス名を正解にしない。乱数生成器を渡せば
+同じシードで同じ問題の並びを再現できる。
+"""
+import random
+
+class FenwickTree:
+    """重みの累積和を O(log n) で更新・探索する Fenwick 木（Binary Indexed Tree）"""
+    def __init__(self, weights=()):
+        self._tree = [0.0]  # 1 始まりの添字で扱う
+        self._weights = []
+        self.reset(weights)
+
+    def __len__(self):
+        return len(self._weights)
+
+    @property
+    def total(self):
+        """重みの合計"""
+        return self.prefix_sum(len(self._weights))
+
+    def reset(self, weights):
+        """全ての重みを O(n) で設定し直す"""
+        self._weights = list(weights)
+        tree = [0.0] + self._weights
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def append(self, weight):
+        """末尾に重みを追加する"""
+        self._weights.append(weight)
+        i = len(self._weights)
+        # 新しい節点は (i - lowbit(i), i] の範囲の合計を持つ
+        self._tree.append(weight + self.prefix_sum(i - 1) - self.prefix_sum(i - (i & -i)))
+
+    def pop(self):
+        """末尾の重みを取り除いて返す（他の節点は末尾の節点を参照しないため、そのまま取り除ける）"""
+        self._tree.pop()
+        return self._weights.pop()
+
+    def get(self, index):
+        """添字 index（0 始まり）の重みを返す"""
+        return self._weights[index]
+
+    def set(self, index, weight):
+        """添字 index（0 始まり）の重みを変更する"""
+        delta = weight - self._weights[index]
+        self._weights[index] = weight
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, count):
+        """先頭から count 個の重みの合計を返す"""
+        total = 0.0
+        while count > 0:
+            total += self._tree[count]
+            count -= count & -count
+        return total
+
+    def find(self, value):
+        """
+        累積和が value を超える最初の添字（0 始まり）を返す
+
+        Args:
+            value: 0 以上 total 未満の値
+        """
+        index = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            next_index = index + step
+            if next_index < len(self._tree) and self._tree[next_index] <= value:
+                index = next_index
+                value -= self._tree[next_index]
+            step >>= 1
+        return min(index, len(self._weights) - 1)
+
+def _floyd_distractors(names, excluded, count, rng):
+    """
+    names から添字 excluded 以外のサービス名を count 個、重複なく一様に選ぶ（Floyd の方法）
+
+    Args:
+        names: サービス名のリスト
+        excluded: 選ばない添字（None の場合は全てから選ぶ）
+        count: 選ぶ数
+        rng: 乱数生成器
+    """
+    population = len(names) - (excluded is not None)
+    if count > population:
+        raise ValueError(f"選択肢にできるサービス名が{count}個未満です")
+    chosen = []
+    seen = set()
+    for upper in range(population - count, population):
+        index = rng.randint(0, upper)
+        if index in seen:
+            index = upper
+        seen.add(index)
+        chosen.append(index)
+    # 正解の位置を飛ばすように添字をずらす
+    return [names[index + 1 if excluded is not None and index >= excluded else index] for index in chosen]
+
+class QuestionSampler:
+    """
+    正解のサービス名を山札から引き、不正解の選択肢を重複なく選ぶサンプラー
+
+    サービス名は読み込み中に add で追加でき、追加したものはまだ引いていない山札に加わる。
+    """
+    def __init__(self, names=(), rng=None, weight=None):
+        """
+        Args:
+            names: 最初に登録するサービス名
+            rng: 乱数生成器（random.Random 互換、None の場合は新しく作成する）
+            weight: サービス名を受け取って正解としての選ばれやすさ（0 より大きい数）を返す関数
+                （None の場合は一様に選ぶ）
+        """
+        self.rng = rng if rng is not None else random.Random()
+        self.weight = weight
+        self._names = []  # 一様の場合は先頭の _drawn 個が山札から引いたもの
+        self._positions = {}  # サービス名 -> _names の添字
+        self._drawn = 0
+        self._pending = None  # 重み付きの場合のまだ引いていないサービス名の重み（FenwickTree）
+        self._remaining = 0  # 重み付きの場合のまだ引いていない（重みが 0 より大きい）サービス名の数
+        if weight is not None:
+            self._pending = FenwickTree()
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._positions
+
+    def __iter__(self):
+        return iter(list(self._names))
+
+    def add(self, name):
+        """サービス名を追加する（登録済みの場合は何もしない）"""
+        if name in self._positions:
+            return
+        self._positions[name] = len(self._names)
+        self._names.append(name)
+        if self._pending is not None:
+            weight = self._weight_of(name)
+            self._pending.append(weight)
+            self._remaining += weight > 0
+
+    def remove(self, name):
+        """サービス名を取り除く（末尾のサービス名と入れ替えるため O(1)、重み付きの場合は O(log n)）"""
+        position = self._positions.get(name)
+        if position is None:
+            return
+        if self._pending is None and position < self._drawn:
+            # 引いた側の末尾と入れ替えてから、まだ引いていない側として取り除く
+            self._drawn -= 1
+            self._swap(position, self._drawn)
+            position = self._drawn
+        self._swap(position, len(self._names) - 1)
+        del self._positions[name]
+        self._names.pop()
+        if self._pending is not None:
+            self._remaining -= self._pending.pop() > 0
+
+    def _weight_of(self, name):
+        return max(float(self.weight(name)), 0.0)
+
+    def _swap(self, i, j):
+        if i == j:
+            return
+        names = self._names
+        names[i], names[j] = names[j], names[i]
+        self._positions[names[i]] = i
+        self._positions[names[j]] = j
+        if self._pending is not None:
+            weight_i, weight_j = self._pending.get(i), self._pending.get(j)
+            self._pending.set(i, weight_j)
+            self._pending.set(j, weight_i)
+
+    def new_deck(self):
+        """山札を作り直す（全てのサービス名をまだ引いていない状態に戻す）"""
+        self._drawn = 0
+        if self._pending is not None:
+            weights = [self._weight_of(name) for name in self._names]
+            self._pending.reset(weights)
+            self._remaining = sum(weight > 0 for weight in weights)
+
+    def draw(self):
+        """
+        正解にするサービス名を山札から引く（山札を引き切ったら新しい山札にする）
+
+        Returns:
+            サービス名
+        """
+        if not self._names:
+            raise ValueError("サービス名が登録されていません")
+        if self._pending is not None:
+            return self._draw_weighted()
+        if self._drawn >= len(self._names):
+            self.new_deck()
+        # Fisher-Yates のシャッフルを1段だけ進める
+        position = self.rng.randrange(self._drawn, len(self._names))
+        self._swap(self._drawn, position)
+        self._drawn += 1
+        return self._names[self._drawn - 1]
+
+    def _draw_weighted(self):
+        pending = self._pending
+        if self._remaining <= 0:
+            self.new_deck()
+            if self._remaining <= 0:
+                raise ValueError("正解として選べるサービス名がありません（全ての重みが 0 です）")
+        position = pending.find(self.rng.random() * pending.total)
+        if pending.get(position) <= 0:
+            # 累積和の丸め誤差で引き済みの位置に当たった場合は、まだ引いていないものを探す
+            position = next(i for i in range(len(pending)) if pending.get(i) > 0)
+        # 引いたサービス名は山札を作り直すまで選ばれないよう重みを 0 にする
+        pending.set(position, 0.0)
+        self._remaining -= 1
+        return self._names[position]
+
+    def distractors(self, correct, count):
+        """
+        正解以外のサービス名を count 個、重複なく一様に選ぶ（Floyd の方法で O(count)）
+
+        Args:
+            correct: 正解のサービス名（選ばない）
+            count: 選ぶ数
+        """
+        return _floyd_distractors(self._names, self._positions.get(correct), count, self.rng)
+
+    def question(self, num_options=4):
+        """
+        1問分の正解と選択肢を選ぶ
+
+        Returns:
+            (正解, シャッフルした選択肢のリスト)
+        """
+        correct = self.draw()
+        options = [correct] + self.distractors(correct, num_options - 1)
+        self.rng.shuffle(options)
+        return correct, options
+
+class SharedCatalog:
+    """
+    複数の QuestionDeck で共有する、読み取り専用のサービス名の一覧
+
+    サービス名と添字の対応を一度だけ作り、山札ごとには持たない。
+    """
+    def __init__(self, names):
+        self.names = tuple(dict.fromkeys(names))
+        self.positions = {name: index for index, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.positions
+
+    def __iter__(self):
+        return iter(self.names)
+
+class QuestionDeck:
+    """
+    共有する SharedCatalog の上で、自分だけの山札から問題を選ぶサンプラー
+
+    多数のセッションがそれぞれ山札を持てるよう、山札は一覧を並べ替えずに、Fisher-Yates で
+    入れ替えた位置だけを辞書に持つ（引いた枚数に比例するメモリで済む）。QuestionSampler と
+    同じく、山札を一巡するまで同じサービス名を正解にしない。
+    """
+    weight = None
+
+    def __init__(self, catalog, rng=None):
+        """
+        Args:
+            catalog: SharedCatalog
+            rng: 乱数生成器（random.Random 互換、None の場合は新しく作成する。セッション間で共有してもよい）
+        """
+        self.catalog = catalog
+        self.rng = rng if rng is not None else random.Random()
+        self._swapped = {}  # 入れ替えた位置 -> catalog.names の添字
+        self._drawn = 0
+        self._removed = set()  # 出題対象から外したサービス名
+
+    def __len__(self):
+        return len(self.catalog) - len(self._removed)
+
+    def __contains__(self, name):
+        return name in self.catalog and name not in self._removed
+
+    def __iter__(self):
+        return iter([name for name in self.catalog.names if name not in self._removed])
+
+    def add(self, name):
+        """サービス名の一覧は共有しているため追加できない"""
+        raise TypeError("QuestionDeck のサービス名は SharedCatalog で決まります")
+
+    def remove(self, name):
+        """サービス名をこの山札から外す（共有する一覧は変更しない）"""
+        if name in self.catalog:
+            self._removed.add(name)
+
+    def new_deck(self):
+        """山札を作り直す（全てのサービス名をまだ引いていない状態に戻す）"""
+        self._swapped.clear()
+        self._drawn = 0
+
+    def draw(self):
+        """
+        正解にするサービス名を山札から引く（山札を引き切ったら新しい山札にする）
+
+        Returns:
+            サービス名
+        """
+        if not len(self):
+            raise ValueError("サービス名が登録されていません")
+        names = self.catalog.names
+        while True:
+            if self._drawn >= len(names):
+                self.new_deck()
+            # Fisher-Yates のシャッフルを1段だけ進める（入れ替えていない位置は添字そのもの）
+            position = self.rng.randrange(self._drawn, len(names))
+            index = self._swapped.get(position, position)
+            self._swapped[position] = self._swapped.pop(self._drawn, self._drawn)
+            self._drawn += 1
+            if names[index] not in self._removed:
+                return names[index]
+
+    def distractors(self, correct, count):
+        """
+        正解以外のサービス名を count 個、重複なく一様に選ぶ
+
+        Args:
+            correct: 正解のサービス名（選ばない）
+            count: 選ぶ数
+        """
+        if not self._removed:
+            return _floyd_distractors(self.catalog.names, self.catalog.positions.get(correct), count, self.rng)
+        # 外したサービス名がある場合（アイコンを読み込めなかった場合など）は残りから選ぶ
+        names = [name for name in self.catalog.names if name != correct and name not in self._removed]
+        if count > len(names):
+            raise ValueError(f"選択肢にできるサービス名が{count}個未満です")
+        return self.rng.sample(names, count)
+
+    def question(self, num_options=4):
+        """
+        1問分の正解と選択肢を選ぶ
+
+        Returns:
+            (正解, シャッフルした選択肢のリスト)
+        """
+        correct = self.draw()
+        options = [correct] + self.distractors(correct, num_options - 1)
+        self.rng.shuffle(options)
+        return correct, options
@@ -0,0 +1,985 @@
+#!/usr/bin/env python3
+"""
+AWS サービスアイコン認識ゲーム
+複数のプレイヤーが同時に遊べる HTTP / WebSocket サーバー
+
+1つのプロセスで多数のセッション（プレイヤーごとの QuizEngine）を扱う。
+ゲームのルールは画面版と同じ QuizEngine を使い、アイコンとピクセル化画像は
+全セッションで共有する。セッションごとの状態はエンジンの数値と選択肢、山札（引いた枚数に比例する）
+程度に収まる。
+
+- GET /                  : ブラウザ用のクライアント
+- GET /ws                : WebSocket（JSON メッセージでゲームを進める）
+- GET /image/<セッション>/<問題番号>/<解像度>.png : 出題中のアイコン（解像度 0 は元のアイコン）
+- GET /stats             : セッション数などの統計（JSON）
+
+ピクセル化画像はブロック数の大きさの小さな PNG で返し、ブラウザ側で
+image-rendering: pixelated を指定して引き伸ばす。エンコードした PNG は ETag と共に
+メモリにキャッシュし、起動時にアイコンディレクトリの全アイコンで満たしておく。
+--workers で複数のワーカープロセスに分ける場合は、アイコンとピクセル化画像を
+共有メモリ（shared_store.py）に置き、親プロセスが接続をワーカーに振り分ける。
+負荷試験には loadtest.py を使う。--record を指定すると全セッションのプレイを記録し
+（recorder.py）、負荷試験で記録した回答時間を再現できる。
+
+使い方:
+    python server.py [--host 0.0.0.0] [--port 8080] [--icons-dir assets/icons] [--speed 1.0] [--cache-mb 64]
+                     [--workers 4] [--record sessions.rec]
+"""
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import math
+import multiprocessing
+import random
+import secrets
+import signal
+import socket
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+from engine import RESOLUTION_STEPS, QuizEngine
+from icon_store import IconStore
+from recorder import SessionRecorder
+from sampler import QuestionDeck, SharedCatalog
+from shared_store import SharedIconStore
+from utils import (DEFAULT_PIXELATE_ENGINE, ORIGINAL_LEVEL, PIXELATE_ENGINES, LRUCache, create_dummy_icons,
+                   numpy, pixelation_blocks)
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_MESSAGE_SIZE = 64 * 1024  # 受け付ける WebSocket メッセージの最大サイズ
+MAX_WRITE_BUFFER = 256 * 1024  # 送信待ちがこれを超えたクライアントは切断する
+IMAGE_FORMATS = {"png": "image/png"}  # 配信する画像の形式 -> Content-Type
+MAX_REQUEST_LINE = 2048  # 接続を振り分けるために覗くリクエスト行の最大長
+DISPATCH_TIMEOUT = 10.0  # リクエスト行が届くのを待つ時間（秒）
+
+# WebSocket のオペコード
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+def _wait_readable(sock):
+    """ソケットが読み込み可能になるまで待つ Future を返す"""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    fd = sock.fileno()
+    loop.add_reader(fd, lambda: future.done() or future.set_result(None))
+    future.add_done_callback(lambda _: loop.remove_reader(fd))
+    return future
+
+def _wait_writable(sock):
+    """ソケットが書き込み可能になるまで待つ Future を返す（1つのソケットを同時に待つのは1つだけにする）"""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    fd = sock.fileno()
+    loop.add_writer(fd, lambda: future.done() or future.set_result(None))
+    future.add_done_callback(lambda _: loop.remove_writer(fd))
+    return future
+
+def etag_matches(header, etag):
+    """If-None-Match ヘッダーの値が ETag に一致するかを返す（弱い比較）"""
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+class ProtocolError(Exception):
+    """HTTP / WebSocket の要求が正しくない場合の例外"""
+
+def websocket_accept(key):
+    """Sec-WebSocket-Key から Sec-WebSocket-Accept の値を求める関数"""
+    digest = hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+def _mask(payload, mask):
+    """WebSocket のマスクを掛ける（外す）"""
+    if not payload:
+        return payload
+    repeated = (mask * (len(payload) // 4 + 1))[:len(payload)]
+    value = int.from_bytes(payload, "little") ^ int.from_bytes(repeated, "little")
+    return value.to_bytes(len(payload), "little")
+
+def encode_frame(opcode, payload, mask=False):
+    """
+    WebSocket のフレームを作成する関数
+
+    Args:
+        opcode: オペコード
+        payload: 送信するバイト列
+        mask: マスクを掛けるか（クライアントからサーバーへの送信では必須）
+    """
+    length = len(payload)
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, mask_bit | length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, mask_bit | 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, mask_bit | 127, length)
+    if mask:
+        key = secrets.token_bytes(4)
+        return header + key + _mask(payload, key)
+    return header + payload
+
+async def read_frame(reader):
+    """
+    WebSocket のフレームを1つ読み込む関数
+
+    Returns:
+        (FIN, オペコード, マスクを外したペイロード)
+    """
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    if length > MAX_MESSAGE_SIZE:
+        raise ProtocolError(f"メッセージが大きすぎます: {length}バイト")
+    key = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if key is not None:
+        payload = _mask(payload, key)
+    return bool(first & 0x80), first & 0x0F, payload
+
+class WebSocket:
+    """WebSocket の接続（テキストメッセージの送受信だけを扱う）"""
+    def __init__(self, reader, writer, mask=False):
+        """
+        Args:
+            reader: asyncio.StreamReader
+            writer: asyncio.StreamWriter
+            mask: 送信するフレームにマスクを掛けるか（クライアント側の場合は True）
+        """
+        self.reader = reader
+        self.writer = writer
+        self.mask = mask
+        self.closed = False
+
+    async def recv(self):
+        """
+        テキストメッセージを1つ受信する
+
+        Returns:
+            受信した文字列（接続が閉じられた場合は None）
+        """
+        message = b""
+        while True:
+            try:
+                fin, opcode, payload = await read_frame(self.reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                self.closed = True
+                return None
+            if opcode == OP_CLOSE:
+                if not self.closed:
+                    self._write(OP_CLOSE, payload[:2])
+                self.closed = True
+                return None
+            if opcode == OP_PING:
+                self._write(OP_PONG, payload)
+                continue
+            if opcode == OP_PONG:
+                continue
+            message += payload
+            if len(message) > MAX_MESSAGE_SIZE:
+                raise ProtocolError("メッセージが大きすぎます")
+            if fin:
+                return message.decode("utf-8")
+
+    def _write(self, opcode, payload):
+        if self.writer.is_closing():
+            self.closed = True
+            return
+        self.writer.write(encode_frame(opcode, payload, self.mask))
+
+    def send(self, text):
+        """
+        テキストメッセージを送信する（送信待ちに積むだけで完了は待たない）
+
+        送信待ちが MAX_WRITE_BUFFER を超えた（受信の遅い）クライアントは切断する
+        """
+        if self.closed:
+            return
+        self._write(OP_TEXT, text.encode("utf-8"))
+        if self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            self.close()
+
+    def send_json(self, message):
+        """JSON メッセージを送信する"""
+        self.send(json.dumps(message, ensure_ascii=False, separators=(",", ":")))
+
+    def close(self):
+        """接続を閉じる"""
+        if not self.closed:
+            self.closed = True
+            self._write(OP_CLOSE, struct.pack("!H", 1000))
+        self.writer.close()
+
+class ImageService:
+    """
+    全セッションで共有するアイコンとピクセル化画像
+
+    画像は形式ごとにエンコードしたバイト列と ETag（内容のハッシュ）の組として
+    容量上限付きの LRU キャッシュに保持し、同じ画像の2回目以降の要求はキャッシュを
+    引くだけで返す。デコード、ピクセル化、エンコードは1つのワーカースレッドで順に行うため
+    ピクセル化画像のキャッシュにロックは要らず、イベントループも止めない
+    （エンコード済みのキャッシュはイベントループのスレッドだけが読み書きする）。
+    """
+    def __init__(self, store, resolutions, engine=DEFAULT_PIXELATE_ENGINE, max_icons=1024,
+                 max_bytes=64 * 1024 * 1024):
+        """
+        Args:
+            store: アイコンストア（IconStore）
+            resolutions: ピクセル化の解像度ステップ
+            engine: ピクセル化の方式（"scale" または "mosaic"）
+            max_icons: ピクセル化画像を保持するアイコン数の上限（同時に出題中のアイコン数より多くする）
+            max_bytes: エンコード済みの画像を保持する合計サイズの上限（バイト）
+        """
+        if engine == "mosaic" and numpy is None:
+            print("警告: NumPy がインストールされていないため、モザイク化の代わりに縮小・拡大でピクセル化します")
+            engine = "scale"
+        self.store = store
+        self.resolutions = list(resolutions)
+        self.levels = self.resolutions + [ORIGINAL_LEVEL]
+        self.engine = engine
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._blocks = LRUCache(max_icons)  # サービス名 -> {解像度: ブロック画像}（ワーカースレッドだけが使う）
+        # (サービス名, 解像度, 形式) -> (バイト列, ETag)
+        self._encoded = LRUCache(max_entries=max_icons * len(self.levels) * len(IMAGE_FORMATS),
+                                 max_bytes=max_bytes, sizeof=lambda item: len(item[0]))
+        self._pending = {}  # エンコード中の (サービス名, 解像度, 形式) -> Future
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ImageService")
+
+    def _render_levels(self, name):
+        icon = self.store[name]
+        levels = dict(pixelation_blocks(icon, self.resolutions, self.engine))
+        levels[ORIGINAL_LEVEL] = icon
+        return levels
+
+    def _levels(self, name, keep=True):
+        if isinstance(self.store, SharedIconStore):
+            # 共有メモリのブロック画像をそのまま参照する（ピクセル化もコピーも不要）
+            return self.store.levels(name)
+        levels = self._blocks.get(name)
+        if levels is None:
+            levels = self._render_levels(name)
+            if keep:
+                self._blocks.put(name, levels)
+        return levels
+
+    @staticmethod
+    def _encode_surface(surface, fmt):
+        buffer = io.BytesIO()
+        pygame.image.save(surface, buffer, f"image.{fmt}")
+        body = buffer.getvalue()
+        return body, '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+    def _encode(self, name, level, fmt):
+        return self._encode_surface(self._levels(name)[level], fmt)
+
+    def _encode_levels(self, name, levels, fmt, keep=True):
+        surfaces = self._levels(name, keep)
+        return [(level, self._encode_surface(surfaces[level], fmt)) for level in levels]
+
+    def _missing_levels(self, name, fmt):
+        return [level for level in self.levels if (name, level, fmt) not in self._encoded]
+
+    def _store_levels(self, name, fmt, items):
+        for level, item in items:
+            self._encoded.put((name, level, fmt), item)
+
+    async def encoded(self, name, level, fmt="png"):
+        """
+        アイコンの指定した解像度のエンコード済みの画像を返す
+
+        キャッシュにあればそのまま返し、なければワーカーでエンコードしてキャッシュに加える
+        （同じ画像を同時に要求された場合もエンコードは1回だけ行う）
+
+        Returns:
+            (バイト列, ETag)
+        """
+        key = (name, level, fmt)
+        item = self._encoded.get(key)
+        if item is not None:
+            self.hits += 1
+            return item
+        future = self._pending.get(key)
+        if future is None:
+            self.misses += 1
+            future = asyncio.get_running_loop().run_in_executor(self._executor, self._encode, name, level, fmt)
+            self._pending[key] = future
+            future.add_done_callback(lambda f: self._finish(key, f))
+        # 要求した接続が切れても、他の要求とキャッシュのためにエンコードは最後まで行う
+        return await asyncio.shield(future)
+
+    def _finish(self, key, future):
+        del self._pending[key]
+        if not future.cancelled() and future.exception() is None:
+            self._encoded.put(key, future.result())
+
+    def prepare(self, name, fmt="png"):
+        """次に出題するアイコンの全ての解像度をワーカーでエンコードしておく（完了は待たない）"""
+        missing = self._missing_levels(name, fmt)
+        if not missing:
+            return
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._encode_levels, name, missing, fmt)
+
+        def done(future):
+            # 失敗は出題時に改めて扱う
+            if not future.cancelled() and future.exception() is None:
+                self._store_levels(name, fmt, future.result())
+
+        future.add_done_callback(done)
+
+    async def warm(self, names, fmt="png"):
+        """
+        アイコンの全ての解像度をエンコードしてキャッシュを満たす（起動時に使う）
+
+        1アイコンずつワーカーに渡すため、実行中もプレイヤーの要求は間に処理される。
+        キャッシュが上限に達した時点で止める。
+
+        Returns:
+            エンコードしたアイコンの数
+        """
+        loop = asyncio.get_running_loop()
+        count = 0
+        for name in names:
+            if self._encoded.total_bytes >= self.max_bytes:
+                break
+            missing = self._missing_levels(name, fmt)
+            if not missing:
+                continue
+            try:
+                # 出題中のアイコンのピクセル化画像を追い出さないよう、ブロック画像は保持しない
+                items = await loop.run_in_executor(self._executor, self._encode_levels, name, missing, fmt, False)
+            except (KeyError, pygame.error):
+                continue
+            self._store_levels(name, fmt, items)
+            count += 1
+        return count
+
+    def cache_stats(self):
+        """エンコード済みの画像のキャッシュの統計を返す"""
+        return {"entries": len(self._encoded), "bytes": self._encoded.total_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+class Session:
+    """1人のプレイヤーのセッション（エンジンと WebSocket の組）"""
+    def __init__(self, session_id, engine, ws, now):
+        self.id = session_id
+        self.engine = engine
+        self.ws = ws
+        self.last_time = now  # エンジンの時間を最後に進めた時刻
+        self.sent_level = None  # 最後に送った画像の解像度
+        self.stream = None  # 記録のストリーム番号（記録しない場合は None）
+
+class QuizServer:
+    """多数のセッションを1つのイベントループで扱うクイズサーバー"""
+    def __init__(self, store, engine=DEFAULT_PIXELATE_ENGINE, speed=1.0, tick=0.05, max_sessions=10000,
+                 question_options=None, cache_bytes=64 * 1024 * 1024, session_prefix="", recorder=None):
+        """
+        Args:
+            store: アイコンストア（IconStore）
+            engine: ピクセル化の方式
+            speed: ゲームの時間の進む速さ（負荷試験で 1 ゲームを短くする場合に 1 より大きくする）
+            tick: 全セッションの時間を進める間隔（秒）
+            max_sessions: 同時に扱うセッション数の上限
+            question_options: QuizEngine に渡す追加の引数
+            cache_bytes: エンコード済みの画像のキャッシュの上限（バイト）
+            session_prefix: セッション ID の先頭に付ける文字列（複数のワーカーで動かす場合のワーカー番号）
+            recorder: 全セッションのプレイを記録する SessionRecorder（None の場合は記録しない）
+        """
+        self.store = store
+        self.speed = speed
+        self.tick = tick
+        self.max_sessions = max_sessions
+        self.session_prefix = session_prefix
+        self.recorder = recorder
+        self.question_options = question_options or {}
+        self.catalog = SharedCatalog(store)  # 全セッションで共有するサービス名の一覧
+        self.rng = random.Random()  # 全セッションで共有する乱数生成器
+        self.sessions = {}
+        self.images = ImageService(store, self.question_options.get("resolution_steps", RESOLUTION_STEPS), engine,
+                                   max_bytes=cache_bytes)
+        self.started = time.monotonic()
+        self.stats = {"connections": 0, "requests": 0, "games": 0, "answers": 0, "images": 0, "not_modified": 0}
+        self._server = None
+        self._ticker = None
+        self._connections = set()  # 親プロセスから受け取った接続を処理するタスク
+
+    async def start(self, host, port):
+        """サーバーを起動する"""
+        self._server = await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+        self._ticker = asyncio.create_task(self.run_ticker())
+        return self._server
+
+    async def serve_channel(self, channel):
+        """
+        親プロセス（Dispatcher）から渡される接続を処理する（複数のワーカーで動かす場合）
+
+        Args:
+            channel: 親プロセスとの UNIX ドメインソケット（SOCK_SEQPACKET）
+
+        親プロセスがソケットを閉じると戻る
+        """
+        self._ticker = asyncio.create_task(self.run_ticker())
+        channel.setblocking(False)
+        while True:
+            await _wait_readable(channel)
+            try:
+                message, fds, _, _ = socket.recv_fds(channel, 1, 1)
+            except BlockingIOError:
+                continue
+            if not message:
+                return
+            for fd in fds:
+                reader, writer = await asyncio.open_connection(sock=socket.socket(fileno=fd))
+                task = asyncio.create_task(self.handle_connection(reader, writer))
+                self._connections.add(task)
+                task.add_done_callback(self._connections.discard)
+
+    async def close(self):
+        """サーバーを停止し、全セッションを閉じる"""
+        if self._ticker is not None:
+            self._ticker.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for session in list(self.sessions.values()):
+            session.ws.close()
+        self.images.close()
+
+    # --- HTTP ---
+
+    async def handle_connection(self, reader, writer):
+        """1つの TCP 接続の HTTP リクエストを順に処理する（keep-alive に対応する）"""
+        self.stats["connections"] += 1
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                method, path, headers = self._parse_request(head)
+                self.stats["requests"] += 1
+                if path == "/ws":
+                    await self.handle_websocket(reader, writer, headers)
+                    return
+                keep_alive = await self.handle_request(writer, method, path, headers)
+                if not keep_alive:
+                    return
+        except ProtocolError as e:
+            self._respond(writer, 400, str(e).encode("utf-8"), "text/plain; charset=utf-8", keep_alive=False)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _parse_request(head):
+        try:
+            lines = head.decode("latin-1").split("\r\n")
+            method, path, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise ProtocolError("リクエストの形式が正しくありません") from None
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        return method, path.split("?", 1)[0], headers
+
+    def _respond(self, writer, status, body, content_type, keep_alive=True, extra_headers=()):
+        reason = {200: "OK", 304: "Not Modified", 307: "Temporary Redirect", 400: "Bad Request", 404: "Not Found",
+                  405: "Method Not Allowed", 503: "Service Unavailable"}.get(status, "OK")
+        lines = [f"HTTP/1.1 {status} {reason}"]
+        if status != 304:  # 304 には本文がないため、本文の形式と長さは送らない
+            lines += [f"Content-Type: {content_type}", f"Content-Length: {len(body)}"]
+        lines.append("Connection: " + ("keep-alive" if keep_alive else "close"))
+        lines.extend(extra_headers)
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+
+    async def handle_request(self, writer, method, path, headers):
+        """
+        WebSocket 以外の HTTP リクエストを処理する
+
+        Returns:
+            接続を維持するか
+        """
+        keep_alive = headers.get("connection", "").lower() != "close"
+        if method != "GET":
+            self._respond(writer, 405, b"", "text/plain", keep_alive)
+        elif path == "/":
+            self._respond(writer, 200, CLIENT_HTML.encode("utf-8"), "text/html; charset=utf-8", keep_alive)
+        elif path == "/stats":
+            body = json.dumps(self.snapshot()).encode("utf-8")
+            self._respond(writer, 200, body, "application/json", keep_alive)
+        elif path.startswith("/image/") and not path.startswith("/image/" + self.session_prefix):
+            # 複数のワーカーで動かす場合に keep-alive の接続が別のワーカーのセッションの画像に使われたら、
+            # 接続を閉じて同じ URL に転送し、新しい接続として親プロセスに振り分け直させる
+            keep_alive = False
+            self._respond(writer, 307, b"", "text/plain", keep_alive, [f"Location: {path}"])
+        elif path.startswith("/image/"):
+            await self.handle_image(writer, path, headers, keep_alive)
+        else:
+            self._respond(writer, 404, b"", "text/plain", keep_alive)
+        await writer.drain()
+        return keep_alive
+
+    async def handle_image(self, writer, path, headers, keep_alive):
+        """
+        出題中のアイコンの画像を返す（現在の解像度より細かい画像は返さない）
+
+        If-None-Match の ETag が一致する場合は本文を送らずに 304 を返す
+        """
+        try:
+            session_id, number, filename = path[len("/image/"):].split("/")
+            number = int(number)
+            level, fmt = filename.rsplit(".", 1)
+            level = int(level)
+            content_type = IMAGE_FORMATS[fmt]
+        except (ValueError, KeyError):
+            self._respond(writer, 404, b"", "text/plain", keep_alive)
+            return
+        session = self.sessions.get(session_id)
+        if session is None or session.engine.question_count != number or level not in self.allowed_levels(session):
+            self._respond(writer, 404, b"", "text/plain", keep_alive)
+            return
+        try:
+            body, etag = await self.images.encoded(session.engine.correct_answer, level, fmt)
+        except (KeyError, pygame.error) as e:
+            self._respond(writer, 503, str(e).encode("utf-8"), "text/plain; charset=utf-8", keep_alive)
+            return
+        self.stats["images"] += 1
+        cache_headers = [f"ETag: {etag}", "Cache-Control: private, max-age=60"]
+        if etag_matches(headers.get("if-none-match"), etag):
+            self.stats["not_modified"] += 1
+            self._respond(writer, 304, b"", content_type, keep_alive, cache_headers)
+        else:
+            self._respond(writer, 200, body, content_type, keep_alive, cache_headers)
+
+    @staticmethod
+    def allowed_levels(session):
+        """セッションが取得できる解像度（現在の解像度まで。元のアイコンは表示される時点から）"""
+        engine = session.engine
+        steps = engine.resolution_steps
+        levels = set(steps[:steps.index(engine.resolution_level) + 1])
+        if engine.show_original or engine.selected_answer is not None:
+            levels.add(ORIGINAL_LEVEL)
+        return levels
+
+    # --- WebSocket ---
+
+    async def handle_websocket(self, reader, writer, headers):
+        """WebSocket のハンドシェイクを行い、セッションのメッセージを処理する"""
+        key = headers.get("sec-websocket-key")
+        if headers.get("upgrade", "").lower() != "websocket" or not key:
+            raise ProtocolError("WebSocket のハンドシェイクが正しくありません")
+        if len(self.sessions) >= self.max_sessions:
+            self._respond(writer, 503, "セッション数が上限に達しています".encode("utf-8"),
+                          "text/plain; charset=utf-8", keep_alive=False)
+            return
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {websocket_accept(key)}\r\n\r\n").encode("latin-1"))
+
+        ws = WebSocket(reader, writer)
+        session = self.create_session(ws)
+        try:
+            ws.send_json({"type": "hello", "session": session.id, "questions": session.engine.max_questions,
+                          "countdown": session.engine.countdown_time, "speed": self.speed})
+            while not ws.closed:
+                text = await ws.recv()
+                if text is None:
+                    break
+                try:
+                    message = json.loads(text)
+                except ValueError:
+                    continue
+                self.handle_message(session, message)
+        finally:
+            self.sessions.pop(session.id, None)
+            if self.recorder is not None:
+                self.recorder.end(session.stream)
+            ws.close()
+
+    def create_session(self, ws):
+        """セッションを作成する（山札はセッションごとに持ち、サービス名の一覧は全セッションで共有する）"""
+        session_id = self.session_prefix + secrets.token_urlsafe(12)
+        # 読み込めなかったアイコンはストアの索引から外れるため、出題前に索引にあるかを確かめる
+        deck = QuestionDeck(self.catalog, rng=self.rng)
+        engine = QuizEngine(deck, rng=self.rng, validate=self.store.__contains__, sampler=deck,
+                            **self.question_options)
+        session = Session(session_id, engine, ws, time.monotonic())
+        engine.add_listener(lambda event, engine: self.on_engine_event(session, event))
+        if self.recorder is not None:
+            # 乱数生成器は全セッションで共有するため、シードは記録しない（出題はログから再現する）
+            session.stream = self.recorder.attach(engine)
+        self.sessions[session_id] = session
+        return session
+
+    def handle_message(self, session, message):
+        """クライアントからのメッセージを処理する"""
+        kind = message.get("type") if isinstance(message, dict) else None
+        engine = session.engine
+        self.advance(session, time.monotonic())
+        if kind == "start" and engine.state != "playing":
+            self.stats["games"] += 1
+            session.sent_level = None
+            engine.start()
+        elif kind == "answer" and engine.waiting:
+            option = message.get("option")
+            if option in engine.current_options:
+                self.stats["answers"] += 1
+                engine.answer(option)
+
+    def on_engine_event(self, session, event):
+        """エンジンの状態の変化をクライアントに通知する"""
+        engine = session.engine
+        ws = session.ws
+        if event == "question":
+            session.sent_level = engine.resolution_level
+            ws.send_json({"type": "question", "number": engine.question_count, "options": engine.current_options,
+                          "time": engine.current_time, "image": self.image_url(session, session.sent_level)})
+        elif event == "upcoming":
+            self.images.prepare(engine.upcoming[0])
+        elif event in ("answer", "timeout"):
+            ws.send_json({"type": "result", "correct": engine.result_correct, "answer": engine.correct_answer,
+                          "timeout": event == "timeout", "score": engine.score, "combo": engine.combo,
+                          "image": self.image_url(session, ORIGINAL_LEVEL)})
+        elif event == "game_over":
+            ws.send_json({"type": "game_over", "score": engine.score, "correct": engine.correct_count,
+                          "questions": engine.max_questions})
+
+    def image_url(self, session, level):
+        return f"/image/{session.id}/{session.engine.question_count}/{level}.png"
+
+    # --- 時間の経過 ---
+
+    def advance(self, session, now):
+        """セッションのエンジンの時間を現在時刻まで進める"""
+        dt = (now - session.last_time) * self.speed
+        session.last_time = now
+        engine = session.engine
+        if engine.state != "playing":
+            return
+        engine.update(dt)
+        if engine.waiting:
+            level = ORIGINAL_LEVEL if engine.show_original else engine.resolution_level
+            if level != session.sent_level:
+                session.sent_level = level
+                session.ws.send_json({"type": "level", "time": engine.current_time,
+                                      "image": self.image_url(session, level)})
+
+    async def run_ticker(self):
+        """一定間隔で全セッションの時間を進める"""
+        while True:
+            await asyncio.sleep(self.tick)
+            now = time.monotonic()
+            for session in list(self.sessions.values()):
+                self.advance(session, now)
+
+    def snapshot(self):
+        """統計を返す"""
+        playing = sum(1 for session in self.sessions.values() if session.engine.state == "playing")
+        return dict(self.stats, sessions=len(self.sessions), playing=playing, image_cache=self.images.cache_stats(),
+                    uptime=round(time.monotonic() - self.started, 1))
+
+class Dispatcher:
+    """
+    複数のワーカープロセスに接続を振り分ける親プロセス側の受付
+
+    接続ごとに最初のリクエスト行を読み取らずに覗き（MSG_PEEK）、セッションの画像の要求は
+    そのセッションを持つワーカー（セッション ID の先頭のワーカー番号）へ、それ以外は
+    順番にワーカーへ、接続のファイル記述子ごと渡す。以降の通信はワーカーが直接行う。
+    """
+    def __init__(self, channels):
+        """
+        Args:
+            channels: ワーカーごとの UNIX ドメインソケット（SOCK_SEQPACKET）のリスト
+        """
+        self.channels = channels
+        for channel in channels:
+            # ワーカーが受け取りきれずに送信バッファが埋まっても、イベントループを止めない
+            channel.setblocking(False)
+        self._locks = [asyncio.Lock() for _ in channels]  # ワーカーごとに送信を1つずつ待つ
+        self._next = 0
+        self._tasks = set()
+
+    def route(self, request_line):
+        """リクエスト行から接続を渡すワーカーの番号を返す"""
+        parts = request_line.split(b" ")
+        if len(parts) >= 2 and parts[1].startswith(b"/image/"):
+            session_id = parts[1][len(b"/image/"):].split(b"/", 1)[0]
+            worker, _, _ = session_id.partition(b".")
+            if worker.isdigit() and int(worker) < len(self.channels):
+                return int(worker)
+        index = self._next
+        self._next = (index + 1) % len(self.channels)
+        return index
+
+    async def serve(self, host, port):
+        """接続を受け付けて振り分け続ける"""
+        loop = asyncio.get_running_loop()
+        listener = socket.create_server((host, port), backlog=1024)
+        listener.setblocking(False)
+        try:
+            while True:
+                conn, _ = await loop.sock_accept(listener)
+                task = asyncio.create_task(self.dispatch(conn))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            listener.close()
+
+    async def dispatch(self, conn):
+        """1つの接続をワーカーに渡す"""
+        try:
+            request_line = await asyncio.wait_for(self._peek_request_line(conn), DISPATCH_TIMEOUT)
+            await self._send(self.route(request_line), conn)
+        except (asyncio.TimeoutError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    async def _send(self, index, conn):
+        """接続のファイル記述子をワーカーに渡す（送信バッファが空くまで待つ）"""
+        channel = self.channels[index]
+        async with self._locks[index]:
+            while True:
+                try:
+                    socket.send_fds(channel, [b"c"], [conn.fileno()])
+                    return
+                except BlockingIOError:
+                    await _wait_writable(channel)
+
+    @staticmethod
+    async def _peek_request_line(conn):
+        while True:
+            await _wait_readable(conn)
+            data = conn.recv(MAX_REQUEST_LINE, socket.MSG_PEEK)
+            if not data:
+                raise ConnectionError("リクエストの前に接続が閉じられました")
+            if b"\r\n" in data or len(data) >= MAX_REQUEST_LINE:
+                return data.split(b"\r\n", 1)[0]
+            # 覗いたデータは読み込み可能なまま残るため、行の残りが届くまで少し待つ
+            await asyncio.sleep(0.01)
+
+CLIENT_HTML = """<!DOCTYPE html>
+<html lang="ja"><head><meta charset="utf-8"><title>AWS サービスアイコン認識ゲーム</title>
+<style>
+body { font-family: sans-serif; text-align: center; }
+#icon { width: 200px; height: 200px; image-rendering: pixelated; }
+button { display: block; width: 400px; margin: 6px auto; padding: 6px; font-size: 16px; }
+</style></head><body>
+<h1>AWS サービスアイコン認識ゲーム</h1>
+<p id="status">接続しています...</p>
+<img id="icon" alt="">
+<div id="options"></div>
+<p id="score"></p>
+<button id="start">スタート</button>
+<script>
+const ws = new WebSocket((location.protocol === "https:" ? "wss://" : "ws://") + location.host + "/ws");
+const $ = (id) => document.getElementById(id);
+let total = 10;
+$("start").onclick = () => { ws.send(JSON.stringify({type: "start"})); $("start").hidden = true; };
+ws.onmessage = (event) => {
+  const m = JSON.parse(event.data);
+  if (m.type === "hello") { total = m.questions; $("status").textContent = "スタートを押してください"; }
+  if (m.image) $("icon").src = m.image;
+  if (m.type === "question") {
+    $("status").textContent = `問題 ${m.number}/${total}`;
+    $("options").replaceChildren(...m.options.map((option) => {
+      const button = document.createElement("button");
+      button.textContent = option;
+      button.onclick = () => ws.send(JSON.stringify({type: "answer", option}));
+      return button;
+    }));
+  }
+  if (m.type === "result") {
+    $("status").textContent = m.timeout ? `時間切れ！ 正解: ${m.answer}` : (m.correct ? "正解！" : `不正解... 正解: ${m.answer}`);
+    $("score").textContent = `スコア: ${m.score}  コンボ: ${m.combo}`;
+  }
+  if (m.type === "game_over") {
+    $("status").textContent = `ゲーム終了 スコア: ${m.score}（${m.correct}/${m.questions}問正解）`;
+    $("options").replaceChildren();
+    $("start").hidden = false;
+  }
+};
+ws.onclose = () => { $("status").textContent = "切断されました"; };
+</script></body></html>
+"""
+
+def load_store(icons_dir):
+    """サーバーで共有するアイコンストアを作成する（アイコンがない場合はダミーアイコンを使う）"""
+    store = IconStore(icons_dir, max_entries=64)
+    store.index()
+    if len(store) < 4:
+        print("AWSサービスアイコンが見つかりません。ダミーアイコンを使います")
+        pygame.font.init()
+        for name, icon in create_dummy_icons().items():
+            store.add_surface(name, icon)
+    return store
+
+async def serve(args):
+    store = load_store(args.icons_dir)
+    recorder = SessionRecorder(args.record) if args.record else None
+    server = QuizServer(store, engine=args.pixelate, speed=args.speed, max_sessions=args.max_sessions,
+                        cache_bytes=int(args.cache_mb * 1024 * 1024), recorder=recorder)
+    await server.start(args.host, args.port)
+    print(f"{len(store)}個のアイコンで http://{args.host}:{args.port}/ を起動しました（Ctrl+C で終了）")
+
+    async def warm():
+        start = time.perf_counter()
+        count = await server.images.warm(list(store))
+        stats = server.images.cache_stats()
+        print(f"{count}個のアイコンの画像をエンコードしました"
+              f"（{stats['entries']}件、{stats['bytes'] / 1024 / 1024:.1f}MB、{time.perf_counter() - start:.1f}秒）")
+
+    warming = None if args.no_warm else asyncio.create_task(warm())
+    try:
+        await asyncio.Event().wait()
+    finally:
+        if warming is not None:
+            warming.cancel()
+        await server.close()
+        if recorder is not None:
+            recorder.close()
+        store.close()
+
+async def serve_worker(index, shared_name, channel, args):
+    """ワーカープロセスで共有メモリのアイコンストアに接続し、親プロセスから渡される接続を処理する"""
+    store = SharedIconStore.attach(shared_name)
+    # 記録はワーカーごとのファイルに分ける（ファイル名の末尾にワーカー番号を付ける）
+    recorder = SessionRecorder(f"{args.record}.{index}") if args.record else None
+    server = QuizServer(store, engine=args.pixelate, speed=args.speed,
+                        max_sessions=math.ceil(args.max_sessions / args.workers),
+                        cache_bytes=int(args.cache_mb * 1024 * 1024 / args.workers), session_prefix=f"{index}.",
+                        recorder=recorder)
+    warming = None if args.no_warm else asyncio.create_task(server.images.warm(list(store)))
+    try:
+        await server.serve_channel(channel)
+    finally:
+        if warming is not None:
+            warming.cancel()
+        await server.close()
+        if recorder is not None:
+            recorder.close()
+        store.close()
+
+def run_worker(index, shared_name, channel, args):
+    """ワーカープロセスのエントリーポイント"""
+    # spawn で起動したプロセスは親のシグナルハンドラーを引き継がないため、SIGTERM でも終了処理を行う
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        asyncio.run(serve_worker(index, shared_name, channel, args))
+    except KeyboardInterrupt:
+        pass
+
+async def serve_workers(args):
+    """
+    アイコンを共有メモリに格納し、複数のワーカープロセスでサーバーを動かす
+
+    ワーカーはアイコンとピクセル化画像を共有メモリから直接参照するため、
+    ワーカーを増やしてもアイコンのメモリ使用量は増えない。セッションはワーカーごとに持ち、
+    エンコード済みの画像のキャッシュの上限（--cache-mb）はワーカーで分け合う。
+    """
+    store = load_store(args.icons_dir)
+    start = time.perf_counter()
+    shared = SharedIconStore.create(store, RESOLUTION_STEPS, args.pixelate)
+    store.close()
+    print(f"{len(shared)}個のアイコンを共有メモリに格納しました"
+          f"（{shared.size / 1024 / 1024:.1f}MB、{time.perf_counter() - start:.1f}秒）")
+
+    # fork で起動すると先に作ったワーカーとの接続の親側のソケットまで引き継ぎ、親が閉じても
+    # ワーカーに EOF が届かなくなる。spawn で起動し、各ワーカーには自分の子側のソケットだけを渡す
+    context = multiprocessing.get_context("spawn")
+    pairs = [socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET) for _ in range(args.workers)]
+    channels = [parent_end for parent_end, _ in pairs]
+    processes = []
+    try:
+        for index, (_, child_end) in enumerate(pairs):
+            process = context.Process(target=run_worker, args=(index, shared.name, child_end, args),
+                                      name=f"QuizWorker-{index}", daemon=True)
+            process.start()
+            child_end.close()
+            processes.append(process)
+        print(f"{args.workers}個のワーカーで http://{args.host}:{args.port}/ を起動しました（Ctrl+C で終了）")
+        await Dispatcher(channels).serve(args.host, args.port)
+    finally:
+        # ソケットを閉じるとワーカーは処理中のセッションを閉じて終了する
+        for parent_end, child_end in pairs:
+            parent_end.close()
+            child_end.close()
+        for process in processes:
+            process.join(timeout=5)
+        shared.close()
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def workers_supported():
+    """
+    --workers で複数のワーカープロセスを使えるか
+
+    接続をワーカーに渡すには UNIX ドメインソケット（SOCK_SEQPACKET）でのファイル記述子の受け渡しと、
+    イベントループの add_reader が必要になる（Windows と macOS では使えない）
+    """
+    if sys.platform == "win32" or not hasattr(socket, "send_fds"):
+        return False
+    try:
+        parent_end, child_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    except (AttributeError, OSError):
+        return False
+    parent_end.close()
+    child_end.close()
+    return True
+
+def main():
+    """コマンドラインからサーバーを起動する"""
+    parser = argparse.ArgumentParser(description="クイズサーバーを起動する")
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けるアドレス")
+    parser.add_argument("--port", type=int, default=8080, help="待ち受けるポート")
+    parser.add_argument("--icons-dir", default=os.path.join("assets", "icons"), help="アイコンディレクトリ")
+    parser.add_argument("--pixelate", choices=PIXELATE_ENGINES, default=DEFAULT_PIXELATE_ENGINE,
+                        help="ピクセル化の方式")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="ゲームの時間の進む速さ（負荷試験で 1 ゲームを短くする場合に 1 より大きくする）")
+    parser.add_argument("--max-sessions", type=int, default=10000, help="同時に扱うセッション数の上限")
+    parser.add_argument("--cache-mb", type=float, default=64, help="エンコード済みの画像のキャッシュの上限（MB）")
+    parser.add_argument("--no-warm", action="store_true", help="起動時に画像のキャッシュを満たさない")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="ワーカープロセス数（2 以上の場合はアイコンを共有メモリに置いて複数のプロセスで動かす）")
+    parser.add_argument("--record",
+                        help="全セッションのプレイを記録するファイル（追記する。--workers の場合は末尾にワーカー番号を付ける）")
+    args = parser.parse_args()
+    if args.workers > 1 and not workers_supported():
+        print("警告: この環境ではワーカープロセスに接続を渡せないため、--workers を指定せずに1つのプロセスで起動します")
+        args.workers = 1
+    if args.workers > 1:
+        # 共有メモリを確実に破棄するため、SIGTERM でも Ctrl+C と同じ終了処理を行う
+        signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        asyncio.run(serve(args) if args.workers <= 1 else serve_workers(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
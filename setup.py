@@ -6,12 +6,15 @@ AWS サービスアイコン認識ゲーム
 import os
 import sys
 import shutil
-import urllib.request
+import urllib.parse
 import zipfile
 import io
 import subprocess
 import platform
 
+from asset_sync import is_package_icon, sync_icons
+from downloader import download_file
+
 def check_python_version():
     """Pythonのバージョンを確認する関数"""
     required_version = (3, 8)
@@ -69,7 +72,7 @@ def download_japanese_font():
         
         # 一時ファイルにダウンロード
         temp_zip = os.path.join(fonts_dir, "temp_font.zip")
-        urllib.request.urlretrieve(font_url, temp_zip)
+        download_file(font_url, temp_zip)
         
         # ZIPファイルを展開
         with zipfile.ZipFile(temp_zip) as zip_ref:
@@ -99,7 +102,10 @@ def download_japanese_font():
 
 def download_aws_icons():
     """
-    AWS Architecture Iconsをダウンロードして展開する関数
+    AWS Architecture Iconsをダウンロードする関数
+    
+    ZIPファイルは展開せずに assets/icons に保存する（ゲームはZIPファイルから
+    直接アイコンを読み込むため、展開やファイルのコピーは不要）
     """
     icons_dir = os.path.join("assets", "icons")
     os.makedirs(icons_dir, exist_ok=True)
@@ -111,36 +117,29 @@ def download_aws_icons():
         print(f"AWSサービスアイコンをダウンロード中: {url}")
         
         # URLからZIPファイルをダウンロード
-        temp_zip = os.path.join(icons_dir, "temp_icons.zip")
-        urllib.request.urlretrieve(url, temp_zip)
+        # （中断した場合は続きから再開する）
+        zip_path = os.path.join(icons_dir, os.path.basename(urllib.parse.urlparse(url).path))
+        download_file(url, zip_path)
         
-        # ZIPファイルを展開
-        with zipfile.ZipFile(temp_zip) as zip_ref:
-            # 一時ディレクトリに展開
-            temp_dir = os.path.join(icons_dir, "temp")
-            os.makedirs(temp_dir, exist_ok=True)
-            zip_ref.extractall(temp_dir)
-            
-            # アイコンを探して移動
-            for root, dirs, files in os.walk(temp_dir):
-                for file in files:
-                    if file.endswith("_64@5x.png") and not file.startswith("._"):
-                        # Architecture-Service-Iconsディレクトリ内のファイルのみコピー
-                        if "Architecture-Service-Icons" in root:
-                            src_path = os.path.join(root, file)
-                            dst_path = os.path.join(icons_dir, file)
-                            shutil.copy2(src_path, dst_path)
-            
-            # 一時ディレクトリとZIPファイルを削除
-            shutil.rmtree(temp_dir)
-            os.remove(temp_zip)
+        # 出題対象のアイコンが含まれているか確認
+        with zipfile.ZipFile(zip_path) as zip_ref:
+            icon_count = sum(1 for name in zip_ref.namelist() if is_package_icon(name))
+        
+        if not icon_count:
+            print(f"エラー: {zip_path} にAWSサービスアイコンが見つかりません")
+            return False
         
-        print("AWSサービスアイコンのダウンロードと展開が完了しました")
+        print(f"AWSサービスアイコンのダウンロードが完了しました（{icon_count}個のアイコン）")
         return True
     except Exception as e:
         print(f"エラー: AWSサービスアイコンのダウンロード中に問題が発生しました: {e}")
         return False
 
+def find_icon_packages(icons_dir):
+    """アイコンディレクトリ内のアセットパッケージ（ZIPファイル）を探す関数"""
+    return [f for f in sorted(os.listdir(icons_dir))
+            if f.lower().endswith(".zip") and not f.startswith(".")]
+
 def check_virtual_env():
     """仮想環境が有効化されているか確認する関数"""
     # 仮想環境が有効化されているか確認
@@ -211,7 +210,10 @@ def main():
     if os.path.exists(icons_dir):
         # アイコンディレクトリが空かどうか確認
         icon_files = [f for f in os.listdir(icons_dir) if f.endswith("_64@5x.png")]
-        if not icon_files:
+        icon_packages = find_icon_packages(icons_dir)
+        if icon_packages and not icon_files:
+            print(f"AWS公式アイコンは既にダウンロード済みです（{', '.join(icon_packages)}）")
+        elif not icon_files:
             print("AWS公式アイコンをダウンロードしますか？ (y/n)")
             response = input().strip().lower()
             
@@ -219,6 +221,14 @@ def main():
                 download_aws_icons()
         else:
             print(f"AWS公式アイコンは既にダウンロード済みです（{len(icon_files)}個のアイコンが見つかりました）")
+            print("最新のアイコンパッケージと同期しますか？（変更のあったアイコンだけを更新します） (y/n)")
+            response = input().strip().lower()
+            
+            if response == 'y':
+                try:
+                    sync_icons()
+                except Exception as e:
+                    print(f"エラー: アイコンの同期中に問題が発生しました: {e}")
     
     print("\nセットアップが完了しました。")
     print("ゲームを開始するには、以下のコマンドを実行してください：")
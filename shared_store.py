@@ -0,0 +1,166 @@
+"""
+AWS サービスアイコン認識ゲーム
+複数のプロセスで共有するアイコンストア（共有メモリ）
+
+前処理済みのアイコンとピクセル化画像の RGBA ピクセル列を、アイコンキャッシュ
+（icon_cache.py のパックファイル）と同じ形式で1つの共有メモリに並べる。
+親プロセスが create で一度だけ作成し、ワーカープロセスは名前を指定して attach する。
+ワーカーはピクセル列をコピーせずに Surface や NumPy 配列として参照するため、
+ワーカーを増やしてもアイコンのメモリ使用量は増えない。
+
+エントリのキーはサービス名、解像度レベルは ORIGINAL_LEVEL が元のアイコン、
+それ以外は解像度ごとのブロック画像（pixelation_blocks の結果）になる。
+"""
+import tempfile
+from multiprocessing import shared_memory
+
+import pygame
+
+from icon_cache import CODEC_RAW, IconPack, write_pack_to
+from utils import DEFAULT_PIXELATE_ENGINE, ORIGINAL_LEVEL, mosaic_blocks_bulk, numpy, pixelation_blocks
+
+def _chunk_records(chunk, resolutions, engine):
+    if engine == "mosaic":
+        levels = mosaic_blocks_bulk([icon for _, icon in chunk], resolutions)
+    else:
+        levels = [pixelation_blocks(icon, resolutions, engine) for _, icon in chunk]
+    for (name, icon), blocks in zip(chunk, levels):
+        for level, surface in [(ORIGINAL_LEVEL, icon)] + sorted(blocks.items()):
+            width, height = surface.get_size()
+            yield name, name, (0, 0), level, width, height, CODEC_RAW, pygame.image.tobytes(surface, "RGBA")
+
+def _records(store, resolutions, engine, chunk_size):
+    """アイコンストアの全アイコンのパックのレコードを順に返す（読み込めないアイコンは飛ばす）"""
+    chunk = []
+    for name in list(store):
+        try:
+            chunk.append((name, store[name]))
+        except (KeyError, pygame.error):
+            continue
+        if len(chunk) >= chunk_size:
+            yield from _chunk_records(chunk, resolutions, engine)
+            chunk = []
+    if chunk:
+        yield from _chunk_records(chunk, resolutions, engine)
+
+class SharedIconStore:
+    """
+    共有メモリ上のアイコンストア
+
+    IconStore と同じくサービス名で反復・参照でき、返す Surface は共有メモリを直接参照する
+    （Surface に描き込むと全プロセスの画像が変わるため、読み取り専用として扱う）
+    """
+    def __init__(self, shm, owner=False):
+        """
+        Args:
+            shm: パックの内容を持つ共有メモリ（multiprocessing.shared_memory.SharedMemory）
+            owner: 作成したプロセスか（close 時に共有メモリを破棄する）
+        """
+        self._shm = shm
+        self._owner = owner
+        self.pack = IconPack(shm.buf)
+        self._levels = {}  # サービス名 -> {解像度レベル: PackEntry}
+        for entry in self.pack.entries():
+            self._levels.setdefault(entry.name, {})[entry.level] = entry
+
+    @classmethod
+    def create(cls, store, resolutions, engine=DEFAULT_PIXELATE_ENGINE, chunk_size=64):
+        """
+        アイコンストアの全アイコンとピクセル化画像を共有メモリに格納する
+
+        Args:
+            store: アイコンストア（IconStore または {サービス名: pygame.Surface} の辞書）
+            resolutions: ピクセル化の解像度ステップ
+            engine: ピクセル化の方式（"scale" または "mosaic"）
+            chunk_size: まとめてピクセル化するアイコンの数
+
+        Returns:
+            SharedIconStore（name をワーカーに渡して attach させる）
+        """
+        if engine == "mosaic" and numpy is None:
+            engine = "scale"
+        # 大きさが決まるまで一時ファイルに書き出す（全アイコンのピクセル列をメモリに溜めない）
+        with tempfile.TemporaryFile() as f:
+            write_pack_to(f, _records(store, resolutions, engine, chunk_size))
+            size = f.tell()
+            shm = shared_memory.SharedMemory(create=True, size=size)
+            try:
+                f.seek(0)
+                pos = 0
+                while pos < size:
+                    pos += f.readinto(shm.buf[pos:size])
+                return cls(shm, owner=True)
+            except BaseException:
+                shm.close()
+                shm.unlink()
+                raise
+
+    @classmethod
+    def attach(cls, name):
+        """別のプロセスが作成した共有メモリに接続する"""
+        return cls(shared_memory.SharedMemory(name=name))
+
+    @property
+    def name(self):
+        """共有メモリの名前"""
+        return self._shm.name
+
+    @property
+    def size(self):
+        """共有メモリの大きさ（バイト）"""
+        return self._shm.size
+
+    def __len__(self):
+        return len(self._levels)
+
+    def __iter__(self):
+        return iter(list(self._levels))
+
+    def __contains__(self, name):
+        return name in self._levels
+
+    def __getitem__(self, name):
+        return self.pack.surface(self._levels[name][ORIGINAL_LEVEL])
+
+    def get(self, name, level=ORIGINAL_LEVEL):
+        """
+        アイコンまたはピクセル化のブロック画像を返す
+
+        Returns:
+            共有メモリを参照する pygame.Surface（ない場合は None）
+        """
+        entry = self._levels.get(name, {}).get(level)
+        return self.pack.surface(entry) if entry is not None else None
+
+    def levels(self, name):
+        """
+        アイコンの全ての解像度レベルの画像を返す
+
+        Returns:
+            {解像度レベル: pygame.Surface} の辞書（ORIGINAL_LEVEL は元のアイコン）
+        """
+        return {level: self.pack.surface(entry) for level, entry in self._levels[name].items()}
+
+    def array(self, name, level=ORIGINAL_LEVEL):
+        """
+        アイコンまたはブロック画像のピクセルを NumPy 配列として返す（コピーしない）
+
+        Returns:
+            (高さ, 幅, 4) の uint8 配列（RGBA）
+        """
+        if numpy is None:
+            raise RuntimeError("配列として参照するには NumPy が必要です（pip install numpy）")
+        entry = self._levels[name][level]
+        return numpy.frombuffer(self.pack.pixels(entry), numpy.uint8).reshape(entry.height, entry.width, 4)
+
+    def close(self):
+        """共有メモリから切断する（作成したプロセスの場合は共有メモリを破棄する）"""
+        self.pack.close()
+        try:
+            self._shm.close()
+        except BufferError:
+            # Surface や配列が参照中の場合は、プロセスの終了時に解放される
+            pass
+        if self._owner:
+            self._shm.unlink()
+            self._owner = False
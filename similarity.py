@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+AWS サービスアイコン認識ゲーム
+アイコンの見た目の近さの索引（紛らわしい選択肢を選ぶため）
+
+アイコンごとに次のビット列（指紋）を作り、ハミング距離で見た目の近さを比べる。
+
+- 形: 9x8 に縮小した明るさの横方向の差分の符号（dHash、64 ビット）
+- 色: 平均色の RGB をそれぞれ 16 段階に量子化した温度計符号（各 16 ビット）
+  （温度計符号のハミング距離は段階の差の絶対値になる）
+
+指紋は 2 つの 64 ビット整数に詰め、NumPy がある場合は全アイコンとの距離を
+1 回の配列演算で求める。
+
+使い方:
+    python similarity.py [--icons-dir assets/icons] [--name サービス名] [--count 3]
+"""
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import time
+
+import pygame
+
+from icon_store import IconStore
+from utils import ICON_SIZE, numpy
+
+HASH_SIZE = (9, 8)  # dHash を求める縮小画像の大きさ（横方向の差分で 8x8 = 64 ビットになる）
+COLOR_LEVELS = 16  # 平均色の量子化の段階数（温度計符号のビット数）
+_PRESCALE = 4  # 縮小前に最近傍で HASH_SIZE のこの倍数まで縮めておく（面積平均の計算量を減らす）
+
+def icon_thumbnail(image):
+    """
+    指紋の元になる HASH_SIZE の縮小画像（白い背景に合成した RGB のバイト列）を返す関数
+
+    Args:
+        image: アイコン（pygame.Surface）
+    """
+    width, height = HASH_SIZE
+    small = pygame.transform.scale(image, (width * _PRESCALE, height * _PRESCALE))
+    small = pygame.transform.smoothscale(small, HASH_SIZE)
+    # 透明な部分は白い背景として扱う
+    thumbnail = pygame.Surface(HASH_SIZE, 0, 32)
+    thumbnail.fill((255, 255, 255))
+    thumbnail.blit(small, (0, 0))
+    return pygame.image.tobytes(thumbnail, "RGB")
+
+def _thermometer(value):
+    """0〜255 の値を COLOR_LEVELS ビットの温度計符号にする"""
+    level = value * COLOR_LEVELS // 256
+    return (1 << level) - 1
+
+def thumbnail_fingerprint(thumbnail):
+    """
+    縮小画像から指紋を求める関数
+
+    Returns:
+        (形の 64 ビット整数, 色の 48 ビット整数)
+    """
+    width, height = HASH_SIZE
+    pixels = [thumbnail[i:i + 3] for i in range(0, len(thumbnail), 3)]
+    gray = [(299 * r + 587 * g + 114 * b) // 1000 for r, g, b in pixels]
+    shape = 0
+    for y in range(height):
+        row = gray[y * width:(y + 1) * width]
+        for x in range(width - 1):
+            shape = (shape << 1) | (row[x] < row[x + 1])
+    color = 0
+    for channel in range(3):
+        mean = sum(pixel[channel] for pixel in pixels) // len(pixels)
+        color |= _thermometer(mean) << (channel * COLOR_LEVELS)
+    return shape, color
+
+def _fingerprints_numpy(thumbnails):
+    """複数の縮小画像の指紋を 1 回の配列演算で求める（結果は (件数, 2) の uint64 配列）"""
+    width, height = HASH_SIZE
+    pixels = numpy.frombuffer(b"".join(thumbnails), numpy.uint8).reshape(-1, height, width, 3)
+    pixels = pixels.astype(numpy.int32)
+    gray = (299 * pixels[..., 0] + 587 * pixels[..., 1] + 114 * pixels[..., 2]) // 1000
+    bits = (gray[:, :, :-1] < gray[:, :, 1:]).reshape(len(thumbnails), -1).astype(numpy.uint64)
+    weights = numpy.uint64(1) << numpy.arange(bits.shape[1] - 1, -1, -1, dtype=numpy.uint64)
+    shape = (bits * weights).sum(axis=1, dtype=numpy.uint64)
+
+    means = pixels.reshape(len(thumbnails), -1, 3).sum(axis=1) // (width * height)
+    levels = (means * COLOR_LEVELS // 256).astype(numpy.uint64)
+    codes = (numpy.uint64(1) << levels) - numpy.uint64(1)
+    color = codes[:, 0] | (codes[:, 1] << numpy.uint64(COLOR_LEVELS)) | (codes[:, 2] << numpy.uint64(2 * COLOR_LEVELS))
+    return numpy.stack([shape, color], axis=1)
+
+def _popcount(words):
+    """uint64 配列の各要素の 1 のビット数を返す"""
+    if hasattr(numpy, "bitwise_count"):
+        return numpy.bitwise_count(words)
+    return numpy.unpackbits(words.view(numpy.uint8).reshape(words.shape + (8,)), axis=-1).sum(axis=-1)
+
+class SimilarityIndex:
+    """
+    アイコンの指紋の索引
+
+    add で1つずつ、add_many でまとめて登録し、nearest で見た目の近いアイコンを探す
+    """
+    def __init__(self):
+        self._names = []
+        self._positions = {}  # サービス名 -> 添字
+        self._fingerprints = []  # (形, 色) のリスト（NumPy がない場合の検索に使う）
+        self._array = None  # NumPy がある場合の (件数, 2) の uint64 配列（検索時に作成する）
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._positions
+
+    def add(self, name, image):
+        """アイコンを登録する"""
+        self.add_fingerprints([name], [thumbnail_fingerprint(icon_thumbnail(image))])
+
+    def add_many(self, icons):
+        """
+        複数のアイコンをまとめて登録する
+
+        Args:
+            icons: (サービス名, pygame.Surface) のリスト
+        """
+        if not icons:
+            return
+        names = [name for name, _ in icons]
+        thumbnails = [icon_thumbnail(image) for _, image in icons]
+        if numpy is not None:
+            fingerprints = [(int(shape), int(color)) for shape, color in _fingerprints_numpy(thumbnails)]
+        else:
+            fingerprints = [thumbnail_fingerprint(thumbnail) for thumbnail in thumbnails]
+        self.add_fingerprints(names, fingerprints)
+
+    def add_fingerprints(self, names, fingerprints):
+        """求めた指紋を登録する（同じサービス名は置き換える）"""
+        for name, fingerprint in zip(names, fingerprints):
+            position = self._positions.get(name)
+            if position is None:
+                self._positions[name] = len(self._names)
+                self._names.append(name)
+                self._fingerprints.append(fingerprint)
+            else:
+                self._fingerprints[position] = fingerprint
+        self._array = None
+
+    def distances(self, name):
+        """
+        指定したアイコンと全アイコンの距離を返す
+
+        Returns:
+            登録順の距離の並び（NumPy がある場合は配列）
+        """
+        shape, color = self._fingerprints[self._positions[name]]
+        if numpy is None:
+            return [bin(shape ^ other_shape).count("1") + bin(color ^ other_color).count("1")
+                    for other_shape, other_color in self._fingerprints]
+        if self._array is None:
+            self._array = numpy.array(self._fingerprints, dtype=numpy.uint64).reshape(-1, 2)
+        query = numpy.array([shape, color], dtype=numpy.uint64)
+        return _popcount(self._array ^ query).sum(axis=1)
+
+    def nearest(self, name, count, exclude=()):
+        """
+        見た目の近いアイコンを近い順に返す
+
+        Args:
+            name: 基準のサービス名
+            count: 返す数
+            exclude: 除外するサービス名の集まり（基準のサービス名は常に除外する）
+
+        Returns:
+            (サービス名, 距離) のリスト（登録されていない場合は空のリスト）
+        """
+        if name not in self._positions or count <= 0:
+            return []
+        distances = self.distances(name)
+        skip = {self._positions[name]}
+        skip.update(self._positions[other] for other in exclude if other in self._positions)
+        # 除外する分だけ多めに候補を取り、そこから近い順に選ぶ
+        wanted = min(len(self._names), count + len(skip))
+        if numpy is not None:
+            candidates = numpy.argpartition(distances, wanted - 1)[:wanted] if wanted < len(self._names) \
+                else numpy.arange(len(self._names))
+            candidates = sorted(candidates.tolist(), key=lambda i: (distances[i], i))
+        else:
+            candidates = sorted(range(len(self._names)), key=lambda i: (distances[i], i))[:wanted]
+        return [(self._names[i], int(distances[i])) for i in candidates if i not in skip][:count]
+
+    def similar(self, name, count, rng, pool=3, exclude=()):
+        """
+        見た目の近いアイコンから count 個をランダムに選ぶ（紛らわしい選択肢用）
+
+        毎回同じ組み合わせにならないよう、近い順に count * pool 個の候補から選ぶ
+
+        Args:
+            name: 基準のサービス名
+            count: 選ぶ数
+            rng: 乱数生成器
+            pool: 候補を count の何倍まで広げるか
+            exclude: 除外するサービス名の集まり
+        """
+        candidates = [other for other, _ in self.nearest(name, count * pool, exclude)]
+        if len(candidates) <= count:
+            return candidates
+        return rng.sample(candidates, count)
+
+def build_index(store, pack=None, chunk_size=256):
+    """
+    アイコンストアの全アイコンの索引を作成する関数
+
+    アイコンキャッシュ（パックファイル）に元ファイルの署名が一致する元のアイコンがあれば、
+    Surface をデコードせずにキャッシュのピクセルを直接参照する
+
+    Args:
+        store: IconStore または {サービス名: pygame.Surface} の辞書
+        pack: アイコンキャッシュ（IconPack、None の場合は store から読み込む）
+        chunk_size: まとめて指紋を求めるアイコンの数
+
+    Returns:
+        SimilarityIndex
+    """
+    index = SimilarityIndex()
+    chunk = []
+    for name in list(store):
+        image = None
+        located = store.locate(name) if pack is not None else None
+        if located is not None:
+            source, key = located
+            # 元ファイルが変わったエントリは古いため、署名が一致しなければデコードし直す
+            try:
+                entry = pack.find(key, source.signature(key), size=ICON_SIZE)
+            except OSError:
+                entry = None
+            if entry is not None:
+                image = pack.surface(entry)
+        if image is None:
+            image = store.get(name)
+            if image is None:
+                continue
+        chunk.append((name, image))
+        if len(chunk) >= chunk_size:
+            index.add_many(chunk)
+            chunk = []
+    index.add_many(chunk)
+    return index
+
+def main():
+    """コマンドラインから索引を作成し、見た目の近いアイコンを表示する"""
+    parser = argparse.ArgumentParser(description="見た目の近いアイコンを探す")
+    parser.add_argument("--icons-dir", default=os.path.join("assets", "icons"), help="アイコンディレクトリ")
+    parser.add_argument("--name", help="基準のサービス名（省略した場合は先頭のいくつかを表示する）")
+    parser.add_argument("--count", type=int, default=3, help="表示する数")
+    args = parser.parse_args()
+
+    pygame.init()
+    store = IconStore(args.icons_dir)
+    store.index()
+    start = time.perf_counter()
+    index = build_index(store, store.pack)
+    elapsed = time.perf_counter() - start
+    print(f"{len(index)}個のアイコンの索引を作成しました（{elapsed:.2f}秒）")
+
+    names = [args.name] if args.name else list(store)[:5]
+    for name in names:
+        if name not in index:
+            print(f"{name} は索引にありません")
+            continue
+        neighbours = "、".join(f"{other}（{distance}）" for other, distance in index.nearest(name, args.count))
+        print(f"{name}: {neighbours}")
+    store.close()
+
+if __name__ == "__main__":
+    main()
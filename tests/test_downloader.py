@@ -0,0 +1,113 @@
+"""
+downloader.py のテスト
+
+ローカルの http.server を配布元の代わりにして、download_file のダウンロード、
+.part からの再開、完了済みの場合の 416、SHA-256 の不一致を確かめる
+"""
+import contextlib
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from downloader import DownloadError, download_file
+
+PAYLOAD = bytes(range(256)) * 4096  # 1MB
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Range リクエストに対応した、PAYLOAD だけを返すハンドラー"""
+    def do_GET(self):
+        self.server.ranges.append(self.headers.get("Range"))
+        start = 0
+        match = re.match(r"bytes=(\d+)-", self.headers.get("Range") or "")
+        if match:
+            start = int(match.group(1))
+            if start >= len(PAYLOAD):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(PAYLOAD)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}")
+        else:
+            self.send_response(200)
+        body = PAYLOAD[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.server.drop_after is not None:
+            # 最初の接続だけ途中で切断する
+            self.wfile.write(body[:self.server.drop_after])
+            self.server.drop_after = None
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class DownloadFileTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        self.server.ranges = []
+        self.server.drop_after = None
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/icons.zip"
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = os.path.join(self.tmp.name, "icons.zip")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def download(self, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return download_file(self.url, self.dest, **kwargs)
+
+    def read_dest(self):
+        with open(self.dest, "rb") as f:
+            return f.read()
+
+    def test_full_download(self):
+        size = self.download(sha256=hashlib.sha256(PAYLOAD).hexdigest())
+        self.assertEqual(size, len(PAYLOAD))
+        self.assertEqual(self.read_dest(), PAYLOAD)
+        self.assertFalse(os.path.exists(self.dest + ".part"))
+        self.assertEqual(self.server.ranges, [None])
+
+    def test_resume_from_part_file(self):
+        with open(self.dest + ".part", "wb") as f:
+            f.write(PAYLOAD[:300000])
+        self.download()
+        self.assertEqual(self.read_dest(), PAYLOAD)
+        self.assertEqual(self.server.ranges, ["bytes=300000-"])
+
+    def test_resume_after_dropped_connection(self):
+        self.server.drop_after = 100000
+        with contextlib.redirect_stdout(io.StringIO()):
+            download_file(self.url, self.dest, retries=2)
+        self.assertEqual(self.read_dest(), PAYLOAD)
+        self.assertEqual(self.server.ranges, [None, "bytes=100000-"])
+
+    def test_complete_part_file_answered_with_416(self):
+        with open(self.dest + ".part", "wb") as f:
+            f.write(PAYLOAD)
+        size = self.download()
+        self.assertEqual(size, len(PAYLOAD))
+        self.assertEqual(self.read_dest(), PAYLOAD)
+        self.assertEqual(self.server.ranges, [f"bytes={len(PAYLOAD)}-"])
+
+    def test_sha256_mismatch(self):
+        with self.assertRaises(DownloadError):
+            self.download(sha256="0" * 64)
+        self.assertFalse(os.path.exists(self.dest))
+        self.assertFalse(os.path.exists(self.dest + ".part"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+engine.py のテスト
+
+シードを固定した QuizEngine を update(dt) で進め、出題から回答・時間切れ、
+ゲーム終了までの流れと、大きな dt と細かい dt で同じ結果になることを確かめる
+"""
+import random
+import unittest
+
+from engine import QuizEngine, RandomPlayer, simulate_session
+
+CATALOG = [f"Service {i:04d}" for i in range(50)]
+
+def make_engine(seed=1, **kwargs):
+    """イベントを events に記録するエンジンを作成する"""
+    engine = QuizEngine(CATALOG, rng=random.Random(seed), **kwargs)
+    engine.events = []
+    engine.add_listener(lambda event, engine: engine.events.append(event))
+    return engine
+
+def play_timeouts(engine, dt):
+    """回答せずに dt 秒ずつ進めてゲームを終える"""
+    engine.start()
+    steps = 0
+    while engine.state == "playing":
+        engine.update(dt)
+        steps += 1
+    return steps
+
+class QuizEngineTest(unittest.TestCase):
+    def test_question_answer_and_game_over(self):
+        engine = make_engine(max_questions=3)
+        engine.start()
+        self.assertEqual(engine.state, "playing")
+        self.assertEqual(engine.question_count, 1)
+        self.assertIn(engine.correct_answer, engine.current_options)
+        self.assertEqual(len(set(engine.current_options)), engine.num_options)
+
+        # 10秒後に正解すると残り時間のボーナスとコンボが加わる
+        engine.update(10.0)
+        self.assertTrue(engine.answer(engine.correct_answer))
+        self.assertEqual(engine.score, 100 + 200 + 5)
+        self.assertEqual(engine.combo, 1)
+        self.assertIsNotNone(engine.upcoming)
+        self.assertIsNone(engine.answer(engine.correct_answer))  # 結果表示中は回答を受け付けない
+
+        # 結果表示が終わると先に選んだ問題を出題する
+        upcoming = engine.upcoming
+        engine.update(engine.result_display_time)
+        self.assertEqual(engine.question_count, 2)
+        self.assertEqual((engine.correct_answer, engine.current_options), upcoming)
+
+        # 不正解でコンボが切れる
+        wrong = next(option for option in engine.current_options if option != engine.correct_answer)
+        self.assertFalse(engine.answer(wrong))
+        self.assertEqual(engine.combo, 0)
+        engine.finish_result()
+
+        # 時間切れ
+        engine.update(engine.countdown_time)
+        self.assertEqual(engine.selected_answer, "")
+        self.assertEqual(engine.timeout_count, 1)
+        engine.update(engine.timeout_display_time)
+        self.assertEqual(engine.state, "game_over")
+        self.assertEqual(engine.score, 305)
+        self.assertEqual(engine.correct_count, 1)
+        self.assertEqual(engine.events.count("question"), 3)
+        self.assertEqual(engine.events[-1], "game_over")
+
+    def test_large_dt_matches_small_steps(self):
+        # 0.25 秒刻みは誤差なく表せるため、時刻まで完全に一致する
+        small = make_engine()
+        large = make_engine()
+        steps = play_timeouts(small, 0.25)
+        large.start()
+        large.update(0.25 * steps)
+
+        self.assertEqual(large.state, "game_over")
+        self.assertEqual(large.time, small.time)
+        self.assertEqual(large.timeout_count, small.max_questions)
+        self.assertEqual(large.timeout_count, small.timeout_count)
+        self.assertEqual(large.score, small.score)
+        events = [event for event in small.events if event != "update"]
+        self.assertEqual([event for event in large.events if event != "update"], events)
+
+    def test_start_resets_state(self):
+        engine = make_engine()
+        simulate_session(engine, RandomPlayer(accuracy=1.0, reaction=1.0, rng=random.Random(2)))
+        self.assertEqual(engine.state, "game_over")
+        self.assertGreater(engine.score, 0)
+
+        engine.start()
+        self.assertEqual(engine.state, "playing")
+        self.assertEqual(engine.score, 0)
+        self.assertEqual(engine.combo, 0)
+        self.assertEqual(engine.correct_count, 0)
+        self.assertEqual(engine.timeout_count, 0)
+        self.assertEqual(engine.question_count, 1)
+        self.assertEqual(engine.current_time, engine.countdown_time)
+        self.assertIsNone(engine.selected_answer)
+
+    def test_same_seed_same_session(self):
+        scores = []
+        for _ in range(2):
+            engine = make_engine(seed=7)
+            player = RandomPlayer(rng=random.Random(8))
+            scores.append([simulate_session(engine, player) for _ in range(3)])
+        self.assertEqual(scores[0], scores[1])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+recorder.py のテスト
+
+出題対象から外すサービス名のあるゲームを記録してログを読み直し、途中で切れたセグメントの
+後に追記したセグメントも読めることと、シードから再実行した出題が記録と一致することを確かめる
+"""
+import os
+import random
+import tempfile
+import unittest
+
+from engine import QuizEngine, RandomPlayer, simulate_session
+from recorder import SessionRecorder, _read_varint, _write_varint, read_log, replay
+
+CATALOG = [f"Service {i:03d}" for i in range(40)]
+BROKEN = set(CATALOG[::7])  # アイコンを読み込めなかったことにするサービス名
+
+def record_games(path, seed, games):
+    """seed のエンジンで games ゲームを記録し、記録したエンジンを返す"""
+    recorder = SessionRecorder(path)
+    engine = QuizEngine(CATALOG, rng=random.Random(seed), validate=lambda name: name not in BROKEN)
+    stream = recorder.attach(engine, seed)
+    player = RandomPlayer(accuracy=0.7, reaction=8.0, rng=random.Random(seed + 1))
+    for _ in range(games):
+        simulate_session(engine, player)
+    recorder.end(stream)
+    recorder.close()
+    return engine
+
+class VarintTest(unittest.TestCase):
+    def test_round_trip(self):
+        values = [0, 1, 127, 128, 255, 16383, 16384, 2 ** 32, 2 ** 63 - 1]
+        buffer = bytearray()
+        for value in values:
+            _write_varint(buffer, value)
+        pos = 0
+        for value in values:
+            decoded, pos = _read_varint(bytes(buffer), pos)
+            self.assertEqual(decoded, value)
+        self.assertEqual(pos, len(buffer))
+
+class SessionLogTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "play.rec")
+
+    def test_seeded_replay_matches(self):
+        engine = record_games(self.path, seed=11, games=3)
+        self.assertTrue(engine.excluded)
+        [log] = read_log(self.path)
+        self.assertEqual(log.seed, 11)
+        kinds = [record[0] for record in log.records]
+        self.assertEqual(kinds.count("start"), 3)
+        self.assertEqual(kinds.count("question"), 3 * engine.max_questions)
+        self.assertEqual(kinds.count("exclude"), len(engine.excluded))
+
+        result = replay(log)
+        self.assertTrue(result.seeded)
+        self.assertIsNone(result.warning)
+        self.assertIsNone(result.mismatch)
+        questions = [record for record in log.records if record[0] == "question"]
+        self.assertEqual([record for record in result.records if record[0] == "question"], questions)
+        self.assertEqual(result.engine.score, engine.score)
+
+        # 別のシードでは出題が一致しない
+        self.assertIsNotNone(replay(log._replace(seed=12)).mismatch)
+
+    def test_truncated_segment(self):
+        record_games(self.path, seed=21, games=2)
+        complete = os.path.getsize(self.path)
+        record_games(self.path, seed=22, games=2)
+        # 2つ目のセグメントを途中で切り、その後に3つ目のセグメントを追記する
+        with open(self.path, "r+b") as f:
+            f.truncate(complete + (os.path.getsize(self.path) - complete) // 2)
+        record_games(self.path, seed=23, games=1)
+
+        first, cut, last = read_log(self.path)
+        self.assertEqual([first.seed, cut.seed, last.seed], [21, 22, 23])
+        for log in (first, last):
+            result = replay(log)
+            self.assertTrue(result.seeded)
+            self.assertIsNone(result.mismatch)
+        self.assertEqual([record[0] for record in first.records].count("game_over"), 2)
+        self.assertEqual([record[0] for record in last.records].count("game_over"), 1)
+
+        # 切れたセグメントは切れる前までのレコードを読み込む
+        record_games(os.path.join(os.path.dirname(self.path), "whole.rec"), seed=22, games=2)
+        [whole] = read_log(os.path.join(os.path.dirname(self.path), "whole.rec"))
+        self.assertLess(len(cut.records), len(whole.records))
+        self.assertEqual(cut.records, whole.records[:len(cut.records)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+sampler.py のテスト
+
+FenwickTree の累積和と探索、QuestionSampler の山札（一巡するまで同じ正解を出さない）と
+Floyd の方法で選ぶ不正解の選択肢、共有する一覧の上のセッションごとの山札（QuestionDeck）を、
+シードを固定して確かめる
+"""
+import random
+import unittest
+
+from sampler import FenwickTree, QuestionDeck, QuestionSampler, SharedCatalog
+
+NAMES = [f"Service {i:02d}" for i in range(20)]
+
+def naive_find(weights, value):
+    """累積和が value を超える最初の添字（素朴な実装）"""
+    total = 0.0
+    for index, weight in enumerate(weights):
+        total += weight
+        if total > value:
+            return index
+    return len(weights) - 1
+
+class FenwickTreeTest(unittest.TestCase):
+    def test_prefix_sum_and_find(self):
+        weights = [3.0, 0.0, 1.0, 4.0, 1.0, 5.0, 0.0, 2.0, 6.0]
+        tree = FenwickTree(weights)
+        self.assertEqual(tree.total, sum(weights))
+        for count in range(len(weights) + 1):
+            self.assertEqual(tree.prefix_sum(count), sum(weights[:count]))
+        # 境界（累積和ちょうど）では次の添字になり、重み 0 の添字は選ばれない
+        for value in [0.0, 2.5, 3.0, 3.5, 4.0, 7.9, 8.0, 13.0, 14.0, 15.0, 16.0, 21.5]:
+            self.assertEqual(tree.find(value), naive_find(weights, value), value)
+
+    def test_set_append_pop(self):
+        rng = random.Random(1)
+        weights = [rng.randint(0, 9) * 1.0 for _ in range(13)]
+        tree = FenwickTree()
+        for weight in weights:
+            tree.append(weight)
+        for _ in range(50):
+            index = rng.randrange(len(weights))
+            weights[index] = rng.randint(0, 9) * 1.0
+            tree.set(index, weights[index])
+            if rng.random() < 0.2:
+                self.assertEqual(tree.pop(), weights.pop())
+            if rng.random() < 0.2:
+                weights.append(rng.randint(1, 9) * 1.0)
+                tree.append(weights[-1])
+            self.assertEqual(len(tree), len(weights))
+            for count in range(len(weights) + 1):
+                self.assertEqual(tree.prefix_sum(count), sum(weights[:count]))
+            value = rng.random() * tree.total
+            self.assertEqual(tree.find(value), naive_find(weights, value))
+
+class QuestionSamplerTest(unittest.TestCase):
+    def test_deck_does_not_repeat_until_reshuffle(self):
+        sampler = QuestionSampler(NAMES, rng=random.Random(2))
+        for _ in range(5):
+            deck = [sampler.draw() for _ in NAMES]
+            self.assertEqual(sorted(deck), sorted(NAMES))
+
+    def test_added_and_removed_names(self):
+        sampler = QuestionSampler(NAMES[:10], rng=random.Random(3))
+        drawn = [sampler.draw() for _ in range(4)]
+        sampler.add(NAMES[0])  # 登録済みは無視する
+        for name in NAMES[10:]:
+            sampler.add(name)
+        sampler.remove(drawn[0])
+        sampler.remove(NAMES[19])
+        self.assertEqual(len(sampler), 18)
+        rest = [sampler.draw() for _ in range(len(sampler) - 3)]
+        # 取り除いたもの以外を、引いたものを繰り返さずに最後まで引く
+        self.assertEqual(sorted(drawn[1:] + rest), sorted(set(NAMES) - {drawn[0], NAMES[19]}))
+
+    def test_weighted_deck(self):
+        weights = {name: (0.0 if i % 5 == 0 else float(i)) for i, name in enumerate(NAMES)}
+        sampler = QuestionSampler(NAMES, rng=random.Random(4), weight=weights.get)
+        positive = sorted(name for name, weight in weights.items() if weight > 0)
+        for _ in range(3):
+            deck = [sampler.draw() for _ in positive]
+            self.assertEqual(sorted(deck), positive)
+        with self.assertRaises(ValueError):
+            QuestionSampler(NAMES[:1], weight=lambda name: 0).draw()
+
+    def test_distractors_are_unique_and_exclude_answer(self):
+        sampler = QuestionSampler(NAMES, rng=random.Random(5))
+        counts = dict.fromkeys(NAMES, 0)
+        for trial in range(2000):
+            correct = NAMES[trial % len(NAMES)]
+            chosen = sampler.distractors(correct, 3)
+            self.assertEqual(len(set(chosen)), 3)
+            self.assertNotIn(correct, chosen)
+            for name in chosen:
+                counts[name] += 1
+        # 正解以外は全て選ばれる（添字のずらし間違いで末尾が選ばれないことがない）
+        self.assertTrue(all(counts.values()))
+        # 全てを選ぶ場合と、足りない場合
+        self.assertEqual(sorted(sampler.distractors(NAMES[0], 19)), NAMES[1:])
+        with self.assertRaises(ValueError):
+            sampler.distractors(NAMES[0], 20)
+
+    def test_question(self):
+        sampler = QuestionSampler(NAMES, rng=random.Random(6))
+        for _ in range(100):
+            correct, options = sampler.question(4)
+            self.assertIn(correct, options)
+            self.assertEqual(len(set(options)), 4)
+
+    def test_same_seed_same_questions(self):
+        first = QuestionSampler(NAMES, rng=random.Random(7))
+        second = QuestionSampler(NAMES, rng=random.Random(7))
+        self.assertEqual([first.question() for _ in range(30)], [second.question() for _ in range(30)])
+
+class QuestionDeckTest(unittest.TestCase):
+    def test_decks_sharing_catalog_and_rng_do_not_repeat(self):
+        catalog = SharedCatalog(NAMES)
+        rng = random.Random(8)
+        decks = [QuestionDeck(catalog, rng=rng) for _ in range(3)]
+        # 他の山札が引いても、それぞれの山札は一巡するまで同じサービス名を引かない
+        for _ in range(4):
+            drawn = [[] for _ in decks]
+            for _ in NAMES:
+                for deck, names in zip(decks, drawn):
+                    names.append(deck.draw())
+            for names in drawn:
+                self.assertEqual(sorted(names), NAMES)
+
+    def test_removed_names(self):
+        deck = QuestionDeck(SharedCatalog(NAMES), rng=random.Random(9))
+        removed = set(NAMES[::4])
+        for name in removed:
+            deck.remove(name)
+        self.assertEqual(len(deck), len(NAMES) - len(removed))
+        self.assertNotIn(NAMES[0], deck)
+        rest = sorted(set(NAMES) - removed)
+        self.assertEqual(sorted(deck.draw() for _ in rest), rest)
+        for _ in range(200):
+            correct, options = deck.question(4)
+            self.assertEqual(len(set(options)), 4)
+            self.assertFalse(removed & set(options))
+
+    def test_distractors(self):
+        deck = QuestionDeck(SharedCatalog(NAMES), rng=random.Random(10))
+        for trial in range(500):
+            correct = NAMES[trial % len(NAMES)]
+            chosen = deck.distractors(correct, 3)
+            self.assertEqual(len(set(chosen)), 3)
+            self.assertNotIn(correct, chosen)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,91 +5,370 @@ AWS サービスアイコン認識ゲーム
 import os
 import pygame
 import random
-import urllib.request
+import urllib.parse
 import zipfile
 import io
-import shutil
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from asset_sync import is_icon_filename, is_package_icon, sync_icons
+from downloader import download_file
+from icon_cache import IconPack, CODEC_RAW, DEFAULT_CACHE_PATH, file_signature, write_pack
 
-def load_aws_icons():
+try:
+    import numpy
+except ImportError:  # NumPy がない場合は pygame.transform.scale によるピクセル化だけを使う
+    numpy = None
+
+# アイコンの表示サイズ
+ICON_SIZE = (200, 200)
+
+# PixelationCache で元のアイコンを保持する解像度レベル（アイコンキャッシュのレベル 0 と同じ扱い）
+ORIGINAL_LEVEL = 0
+
+# ピクセル化の方式（"scale": 最近傍の縮小・拡大、"mosaic": ブロックごとの平均色）
+PIXELATE_ENGINES = ("scale", "mosaic")
+# "mosaic" は見た目は良いが、1つのアイコンの全解像度ステップ（7段階）の生成に約 5ms かかり、
+# "scale" の約 1.3ms の 3〜4 倍遅い（python benchmark.py --filter pixelate）。ブロック内の全ピクセルを
+# 足し合わせる分の計算は縮小・拡大より減らせないため、"mosaic" は指定した場合だけ使い、既定値は "scale" にする。
+# 出題のたびの生成を避けるには prerender.py --engine mosaic で事前に生成しておく
+DEFAULT_PIXELATE_ENGINE = "scale"
+
+def service_name_from_filename(filename):
+    """
+    アイコンのファイル名からサービス名を抽出する関数
+    
+    例: Arch_Elastic-Load-Balancing_64@5x.png -> Elastic Load Balancing
+    """
+    base_name = os.path.splitext(filename)[0]  # 拡張子を除去
+    base_name = base_name.replace("_64@5x", "")  # サイズ指定を除去
+    
+    # サービス名から余分な接頭辞を削除
+    if base_name.startswith("Arch_"):
+        base_name = base_name[5:]  # "Arch_" を削除
+    
+    # ハイフンをスペースに置換
+    return base_name.replace("-", " ")
+
+def load_icon_file(icon_file, namehint=""):
+    """
+    アイコンファイルを読み込み、表示サイズに揃える関数
+    
+    Args:
+        icon_file: アイコンファイルのパスまたはファイルオブジェクト
+        namehint: ファイルオブジェクトの場合の画像形式のヒント（ファイル名）
+    
+    Raises:
+        pygame.error: 画像の読み込みに失敗した場合
+    """
+    icon = pygame.image.load(icon_file, namehint)
+    # アイコンのサイズを統一（200x200）
+    return pygame.transform.scale(icon, ICON_SIZE)
+
+class DirectoryIconSource:
+    """
+    アイコンディレクトリ内の PNG ファイルを読み込むアイコンソース
+    
+    キーはファイル名、署名はファイルの (mtime_ns, サイズ)
+    """
+    def __init__(self, icons_dir):
+        self.icons_dir = icons_dir
+    
+    def scan(self):
+        """出題対象のアイコンのキーをファイル名順に返す"""
+        if not os.path.isdir(self.icons_dir):
+            return []
+        return sorted(f for f in os.listdir(self.icons_dir) if is_icon_filename(f))
+    
+    def describe(self, key):
+        """警告表示用のアイコンの場所"""
+        return os.path.join(self.icons_dir, key)
+    
+    def signature(self, key):
+        """キャッシュの有効性判定に使う署名"""
+        return file_signature(os.path.join(self.icons_dir, key))
+    
+    def load(self, key):
+        """アイコンを読み込む"""
+        return load_icon_file(os.path.join(self.icons_dir, key))
+    
+    def close(self):
+        pass
+
+class ZipIconSource:
+    """
+    アセットパッケージの ZIP ファイルから、展開せずにアイコンを読み込むアイコンソース
+    
+    最初の scan で出題対象のメンバーの索引（ZipInfo: ローカルヘッダーの位置、
+    圧縮サイズ、CRC-32）を作成し、以降は必要になったメンバーだけを展開・デコードする。
+    キーはメンバー名、署名は (CRC-32, 展開後のサイズ)
+    """
+    def __init__(self, zip_path):
+        self.zip_path = zip_path
+        self._zip = None
+        self._members = None
+        self._lock = threading.Lock()
+    
+    def _index(self):
+        """出題対象のメンバーの索引を返す（初回のみ中央ディレクトリを読み込む）"""
+        with self._lock:
+            if self._members is None:
+                self._members = {}
+                try:
+                    self._zip = zipfile.ZipFile(self.zip_path)
+                except (OSError, zipfile.BadZipFile) as e:
+                    print(f"警告: {self.zip_path} を開けませんでした: {e}")
+                    return self._members
+                for info in self._zip.infolist():
+                    # Architecture-Service-Iconsディレクトリ内のファイルのみ対象とする（同期と同じ判定）
+                    if is_package_icon(info.filename):
+                        self._members[info.filename] = info
+        return self._members
+    
+    def scan(self):
+        """出題対象のアイコンのキー（メンバー名）を名前順に返す"""
+        return sorted(self._index())
+    
+    def describe(self, key):
+        """警告表示用のアイコンの場所"""
+        return f"{self.zip_path}:{key}"
+    
+    def signature(self, key):
+        """キャッシュの有効性判定に使う署名"""
+        info = self._index()[key]
+        return (info.CRC, info.file_size)
+    
+    def load(self, key):
+        """メンバーを展開してアイコンを読み込む"""
+        info = self._index()[key]
+        data = self._zip.read(info)
+        return load_icon_file(io.BytesIO(data), key.rsplit("/", 1)[-1])
+    
+    def close(self):
+        with self._lock:
+            if self._zip is not None:
+                self._zip.close()
+                self._zip = None
+            self._members = None
+
+def find_icon_sources(icons_dir):
+    """
+    アイコンディレクトリからアイコンソースを探す関数
+    
+    展開済みの PNG ファイルがあればそれを使い、なければディレクトリ内に置かれた
+    アセットパッケージ（ZIP ファイル）から直接読み込む
+    
+    Returns:
+        アイコンソースのリスト
+    """
+    if not icons_dir or not os.path.isdir(icons_dir):
+        return []
+    
+    directory = DirectoryIconSource(icons_dir)
+    if directory.scan():
+        return [directory]
+    return [ZipIconSource(os.path.join(icons_dir, f)) for f in sorted(os.listdir(icons_dir))
+            if f.lower().endswith(".zip") and not f.startswith(".")]
+
+def list_icons(sources):
+    """
+    アイコンソースから出題対象のアイコンを列挙する関数
+    
+    Returns:
+        (アイコンソース, キー, サービス名) のリスト（同じサービス名は最初のものだけ）
+    """
+    items = []
+    seen = set()
+    for source in sources:
+        for key in source.scan():
+            service_name = service_name_from_filename(key.rsplit("/", 1)[-1])
+            if service_name not in seen:
+                seen.add(service_name)
+                items.append((source, key, service_name))
+    return items
+
+# アイコンの読み込み失敗として扱う例外
+ICON_LOAD_ERRORS = (pygame.error, OSError, KeyError, zipfile.BadZipFile, zlib.error)
+
+def _decode_icon(item):
+    """アイコンを読み込む（失敗した場合は None を返す）"""
+    source, key = item
+    try:
+        return source.load(key)
+    except ICON_LOAD_ERRORS:
+        return None
+
+def _decode_icons(items, workers=None):
+    """
+    複数のアイコンをスレッドプールで並列に読み込む関数
+    
+    pygame の画像デコードと縮小処理は GIL を解放するため、スレッドで並列化できる
+    
+    Args:
+        items: (アイコンソース, キー) のリスト
+        workers: ワーカー数（None の場合は CPU コア数）
+    
+    Returns:
+        items と同じ順序の Surface のリスト（失敗したものは None）
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(items)))
+    if workers == 1:
+        return [_decode_icon(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_decode_icon, items))
+
+def resolve_icons(items, pack=None, workers=None):
+    """
+    アイコンをキャッシュから、またはデコードして読み込む関数
+    
+    キャッシュが有効なアイコンはデコードせず、それ以外は並列にデコードする。
+    読み込めなかったアイコンは警告を表示して結果から除く
+    
+    Args:
+        items: list_icons が返す (アイコンソース, キー, サービス名) のリスト
+        pack: アイコンキャッシュ（IconPack または None）
+        workers: 並列にデコードするワーカー数（None の場合は CPU コア数）
+    
+    Returns:
+        (アイコンソース, キー, サービス名, 署名, キャッシュのエントリ, Surface) のリスト
+        （キャッシュを使った場合は Surface が None、デコードした場合はエントリが None）
+    """
+    candidates = []
+    for source, key, service_name in items:
+        try:
+            signature = source.signature(key)
+        except (OSError, KeyError):
+            print(f"警告: {source.describe(key)} の読み込みに失敗しました")
+            continue
+        entry = pack.find(key, signature, size=ICON_SIZE) if pack else None
+        candidates.append((source, key, service_name, signature, entry))
+    
+    # キャッシュにないアイコンは複数のワーカーで並列にデコード・縮小する
+    misses = [(source, key) for source, key, _, _, entry in candidates if entry is None]
+    decoded = dict(zip(misses, _decode_icons(misses, workers)))
+    
+    # 元の順序で結果を組み立てる（並列化しても順序は変わらない）
+    results = []
+    for source, key, service_name, signature, entry in candidates:
+        icon = None
+        if entry is None:
+            icon = decoded[(source, key)]
+            if icon is None:
+                print(f"警告: {source.describe(key)} の読み込みに失敗しました")
+                continue
+        results.append((source, key, service_name, signature, entry, icon))
+    return results
+
+def create_dummy_icons():
+    """ダミーのアイコン（色付きの四角形）を生成する関数"""
+    icons = {}
+    aws_services = [
+        "Amazon EC2", "Amazon S3", "Amazon RDS", "Amazon DynamoDB",
+        "AWS Lambda", "Amazon SQS", "Amazon SNS", "Amazon CloudWatch",
+        "AWS IAM", "Amazon VPC", "Amazon Route 53", "AWS CloudFormation",
+        "Amazon ECS", "Amazon EKS", "AWS Fargate", "Amazon API Gateway",
+        "AWS Step Functions", "Amazon SageMaker", "AWS Glue", "Amazon Redshift"
+    ]
+    
+    # 各サービスに対して、ダミーのアイコン（色付きの四角形）を生成
+    for service in aws_services:
+        # ランダムな色を生成
+        color = (
+            random.randint(100, 255),
+            random.randint(100, 255),
+            random.randint(100, 255)
+        )
+        
+        # 200x200のサーフェスを作成
+        icon = pygame.Surface(ICON_SIZE)
+        icon.fill(color)
+        
+        # サービス名の頭文字を描画
+        font = pygame.font.SysFont('Arial', 100)
+        text = font.render(service[0], True, (0, 0, 0))
+        text_rect = text.get_rect(center=(100, 100))
+        icon.blit(text, text_rect)
+        
+        icons[service] = icon
+    
+    return icons
+
+def load_aws_icons(icons_dir=os.path.join("assets", "icons"), cache_path=DEFAULT_CACHE_PATH, workers=None):
     """
     AWSサービスアイコンを読み込む関数
     
-    実際の実装では、assets/icons ディレクトリからアイコンを読み込む
+    assets/icons ディレクトリからアイコンを読み込む
+    （展開済みの PNG ファイルがなければ、ディレクトリ内のアセットパッケージの ZIP から直接読み込む）
     アイコンがない場合はダミーデータを返す
+    
+    前回の読み込み結果（200x200 に縮小済みの RGBA ピクセル）はパックファイルに
+    キャッシュし、元ファイルが変わっていない（署名が一致する）アイコンは
+    PNG デコードせずにキャッシュから Surface を作成する
+    
+    Args:
+        icons_dir: アイコンディレクトリ
+        cache_path: キャッシュファイルのパス（None の場合はキャッシュを使わない）
+        workers: アイコンを並列にデコードするワーカー数（None の場合は CPU コア数）
+    
+    Returns:
+        {サービス名: pygame.Surface} の辞書
     """
     icons = {}
-    icons_dir = os.path.join("assets", "icons")
     
-    # アイコンディレクトリが存在し、中にPNGファイルがあるか確認
-    has_icons = False
-    if os.path.exists(icons_dir):
-        # 特に "_64@5x.png" で終わるファイルを探す
-        for filename in os.listdir(icons_dir):
-            if filename.endswith("_64@5x.png") and not filename.startswith("._"):
-                has_icons = True
-                break
+    # 特に "_64@5x.png" で終わるファイル（またはアセットパッケージ内のメンバー）を探す
+    sources = find_icon_sources(icons_dir)
+    items = list_icons(sources)
     
     # 実際のアイコンがある場合は読み込む
-    if has_icons:
+    if items:
         print("AWSサービスアイコンを読み込んでいます...")
-        for filename in os.listdir(icons_dir):
-            # 隠しファイルでなく、"_64@5x.png"で終わるファイルのみを対象とする
-            if filename.endswith("_64@5x.png") and not filename.startswith("._"):
-                # ファイル名からサービス名を抽出
-                base_name = os.path.splitext(filename)[0]  # 拡張子を除去
-                base_name = base_name.replace("_64@5x", "")  # サイズ指定を除去
-                
-                # サービス名から余分な接頭辞を削除
-                if base_name.startswith("Arch_"):
-                    base_name = base_name[5:]  # "Arch_" を削除
-                
-                # ハイフンをスペースに置換
-                service_name = base_name.replace("-", " ")
-                
-                icon_path = os.path.join(icons_dir, filename)
-                try:
-                    icon = pygame.image.load(icon_path)
-                    # アイコンのサイズを統一（200x200）
-                    icon = pygame.transform.scale(icon, (200, 200))
-                    icons[service_name] = icon
-                except pygame.error:
-                    print(f"警告: {icon_path} の読み込みに失敗しました")
+        start = time.perf_counter()
+        pack = IconPack.open(cache_path) if cache_path else None
+        keys = {}
+        hits = 0
+        
+        for source, key, service_name, signature, entry, icon in resolve_icons(items, pack, workers):
+            if entry is not None:
+                # キャッシュが有効であればデコード済みのピクセルを使う
+                icon = pack.surface(entry)
+                hits += 1
+            icons[service_name] = icon
+            keys[service_name] = (key, signature, entry is not None)
         
-        print(f"{len(icons)}個のAWSサービスアイコンを読み込みました")
+        # 追加・更新・削除されたアイコンがあればキャッシュを作り直す
+        if cache_path and (pack is None or hits != len(icons) or hits != len(pack)):
+            records = []
+            for service_name, (key, signature, cached) in keys.items():
+                data = pygame.image.tobytes(icons[service_name], "RGBA")
+                if cached:
+                    # キャッシュファイルを置き換えられるよう、マッピングへの参照を手放す
+                    icons[service_name] = pygame.image.frombytes(data, ICON_SIZE, "RGBA")
+                records.append((key, service_name, signature, 0,
+                                ICON_SIZE[0], ICON_SIZE[1], CODEC_RAW, data))
+            if pack is not None:
+                pack.close()
+            try:
+                write_pack(cache_path, records)
+            except OSError as e:
+                print(f"警告: アイコンキャッシュを書き込めませんでした: {e}")
+        
+        for source in sources:
+            source.close()
+        elapsed = time.perf_counter() - start
+        print(f"{len(icons)}個のAWSサービスアイコンを読み込みました"
+              f"（{elapsed:.2f}秒、キャッシュ利用 {hits}/{len(icons)}）")
     
     # アイコンがない場合はダミーデータを生成
     if not icons:
         print("AWSサービスアイコンが見つかりません。ダミーアイコンを生成します...")
-        aws_services = [
-            "Amazon EC2", "Amazon S3", "Amazon RDS", "Amazon DynamoDB",
-            "AWS Lambda", "Amazon SQS", "Amazon SNS", "Amazon CloudWatch",
-            "AWS IAM", "Amazon VPC", "Amazon Route 53", "AWS CloudFormation",
-            "Amazon ECS", "Amazon EKS", "AWS Fargate", "Amazon API Gateway",
-            "AWS Step Functions", "Amazon SageMaker", "AWS Glue", "Amazon Redshift"
-        ]
-        
-        # 各サービスに対して、ダミーのアイコン（色付きの四角形）を生成
-        for service in aws_services:
-            # ランダムな色を生成
-            color = (
-                random.randint(100, 255),
-                random.randint(100, 255),
-                random.randint(100, 255)
-            )
-            
-            # 200x200のサーフェスを作成
-            icon = pygame.Surface((200, 200))
-            icon.fill(color)
-            
-            # サービス名の頭文字を描画
-            font = pygame.font.SysFont('Arial', 100)
-            text = font.render(service[0], True, (0, 0, 0))
-            text_rect = text.get_rect(center=(100, 100))
-            icon.blit(text, text_rect)
-            
-            icons[service] = icon
+        icons = create_dummy_icons()
     
-    return icons
+    # 描画のたびにピクセル形式を変換しないよう、画面と同じ形式にしておく
+    return {name: to_display_format(icon) for name, icon in icons.items()}
 
 def pixelate_image(image, resolution):
     """
@@ -105,54 +384,541 @@ def pixelate_image(image, resolution):
     # 元画像のサイズを取得
     width, height = image.get_size()
     
-    # 解像度の平方根を計算（例: 256 -> 16x16）
-    pixel_size = int(resolution ** 0.5)
-    
     # 小さいサイズにスケールダウン
-    small = pygame.transform.scale(image, (pixel_size, pixel_size))
+    small = pixelate_blocks(image, resolution)
     
     # 元のサイズにスケールアップ（ピクセル化効果）
     pixelated = pygame.transform.scale(small, (width, height))
     
     return pixelated
 
+def pixelate_blocks(image, resolution):
+    """
+    画像を最近傍でブロック数のサイズに縮小する関数（pixelate_image の引き伸ばす前の画像）
+    
+    Args:
+        image: 元の画像（pygame.Surface）
+        resolution: ピクセル化の解像度
+    
+    Returns:
+        縮小した画像（pygame.Surface）
+    """
+    # 解像度の平方根を計算（例: 256 -> 16x16）
+    pixel_size = int(resolution ** 0.5)
+    return pygame.transform.scale(image, (pixel_size, pixel_size))
+
+def _mosaic_pixels(image):
+    """
+    モザイク化の元画像の RGBA のバイト列を返す
+    
+    半透明のピクセルを含む場合は、透明な部分の色が混ざらないよう色にアルファを掛けておく
+    （不透明な画像はアルファが全て 255 のため、そのままでよい）
+    """
+    if image.get_bitsize() != 32 or not image.get_flags() & pygame.SRCALPHA:
+        if image.get_bitsize() in (24, 32):
+            return pygame.image.tobytes(image, "RGBA")
+        converted = pygame.Surface(image.get_size(), pygame.SRCALPHA, 32)
+        converted.blit(image, (0, 0))
+        image = converted
+    alpha = pygame.surfarray.pixels_alpha(image)
+    translucent = bool(alpha.min() < 255)
+    del alpha  # Surface のロックを解除する
+    if translucent:
+        if image.get_parent() is not None:
+            # premul_alpha は部分 Surface（アトラスのスロット）の行の間隔を考慮しないため、コピーしてから使う
+            image = image.copy()
+        image = image.premul_alpha()
+    return pygame.image.tobytes(image, "RGBA")
+
+_MOSAIC_CHUNK = 4  # mosaic_blocks_bulk でまとめて行列の積を求める画像の数
+_BLOCK_MATRICES = {}  # (長さ, ブロック数) -> (ブロック行列, ブロックごとのピクセル数)
+
+def _block_matrix(length, cells):
+    """
+    長さ length の並びを cells 個のブロックに分ける 0/1 の行列を返す
+    
+    Returns:
+        ((cells, length) の float32 配列（ブロック i の範囲の列が 1）, ブロックごとの長さ)
+    """
+    key = (length, cells)
+    if key not in _BLOCK_MATRICES:
+        edges = numpy.arange(cells + 1) * length // cells
+        index = numpy.arange(length)
+        matrix = ((index >= edges[:-1, None]) & (index < edges[1:, None])).astype(numpy.float32)
+        _BLOCK_MATRICES[key] = matrix, numpy.diff(edges).astype(numpy.float32)
+    return _BLOCK_MATRICES[key]
+
+def mosaic_blocks_bulk(images, resolutions):
+    """
+    複数の画像について、全解像度のブロックの平均色（1ブロック1ピクセルの小さな画像）をまとめて求める関数
+    
+    最近傍の縮小と違ってブロック内の全ピクセルの平均色を使うため、細い線や小さな模様が
+    消えたりちらついたりしない。半透明の画像は色にアルファを掛けてから平均して、透明な部分の
+    色が混ざらないようにする。
+    
+    ブロックの合計は 0/1 のブロック行列との積で求める。全解像度の行のブロック行列を縦に積んだ
+    行列を掛けて全解像度の行の合計を1回で求め、解像度ごとに列のブロック行列を掛ける。
+    値は 8 ビットの整数の合計のため、アイコンの大きさ（200x200）では float32 でも誤差は出ない。
+    
+    Args:
+        images: 画像（pygame.Surface）のリスト
+        resolutions: 生成する解像度のリスト（256 -> 16x16 ブロック）
+    
+    Returns:
+        images と同じ順の {解像度: ブロック画像（pygame.Surface）} の辞書のリスト
+    """
+    if numpy is None:
+        raise RuntimeError("モザイク化には NumPy が必要です（pip install numpy）")
+    
+    results = [{} for _ in images]
+    groups = {}  # 画像のサイズ -> 画像の番号のリスト
+    for i, image in enumerate(images):
+        groups.setdefault(image.get_size(), []).append(i)
+    # 一度に処理する画像の数を抑えて、途中の配列を CPU のキャッシュに収める
+    chunks = [(size, indices[start:start + _MOSAIC_CHUNK])
+              for size, indices in groups.items() for start in range(0, len(indices), _MOSAIC_CHUNK)]
+    
+    for (width, height), indices in chunks:
+        count = len(indices)
+        pixels = numpy.frombuffer(b"".join(_mosaic_pixels(images[i]) for i in indices), numpy.uint8)
+        pixels = pixels.reshape(count, height, width * 4).astype(numpy.float32)
+        # 解像度の平方根を1辺のブロック数とする（例: 256 -> 16x16）
+        cells = [(max(1, min(int(resolution ** 0.5), width)), max(1, min(int(resolution ** 0.5), height)))
+                 for resolution in resolutions]
+        row_blocks = numpy.concatenate([_block_matrix(height, rows)[0] for _, rows in cells])
+        # (画像, 全解像度の行, 4, 幅) に並べ替えて、列の合計も解像度ごとに1回の行列の積にする
+        row_sums = (row_blocks @ pixels).reshape(count, -1, width, 4).transpose(0, 1, 3, 2)
+        
+        offset = 0
+        for resolution, (columns, rows) in zip(resolutions, cells):
+            column_matrix, widths = _block_matrix(width, columns)
+            _, heights = _block_matrix(height, rows)
+            level = row_sums[:, offset:offset + rows].reshape(-1, width) @ column_matrix.T
+            offset += rows
+            level = level.reshape(count, rows, 4, columns).transpose(0, 1, 3, 2)  # (画像, 行, 列, 4)
+            alpha = level[..., 3:]
+            area = (heights[:, None] * widths[None, :])[..., None]
+            blocks = numpy.empty(level.shape, numpy.uint8)
+            # アルファを掛けた色の合計をアルファの合計で割って元の色に戻す
+            blocks[..., :3] = numpy.minimum(level[..., :3] * 255 / numpy.maximum(alpha, 1) + 0.5, 255)
+            blocks[..., 3:] = alpha / area + 0.5
+            for i, block in zip(indices, blocks):
+                results[i][resolution] = pygame.image.frombytes(block.tobytes(), (columns, rows), "RGBA")
+    return results
+
+def mosaic_levels_bulk(images, resolutions):
+    """
+    複数の画像について、全解像度のモザイク画像（ブロックごとの平均色）をまとめて生成する関数
+    
+    Args:
+        images: 画像（pygame.Surface）のリスト
+        resolutions: 生成する解像度のリスト
+    
+    Returns:
+        images と同じ順の {解像度: pygame.Surface} の辞書のリスト
+    """
+    results = []
+    for image, blocks in zip(images, mosaic_blocks_bulk(images, resolutions)):
+        # ブロックの平均色を元のサイズに引き伸ばす
+        size = image.get_size()
+        results.append({resolution: pygame.transform.scale(block, size) for resolution, block in blocks.items()})
+    return results
+
+def pixelation_blocks(image, resolutions, engine=DEFAULT_PIXELATE_ENGINE):
+    """
+    全解像度のブロック画像（元のサイズに引き伸ばす前の小さな画像）を求める関数
+    
+    ブロック画像を最近傍で元のサイズに引き伸ばすと、その方式のピクセル化画像になる
+    
+    Args:
+        image: 元の画像（pygame.Surface）
+        resolutions: 解像度のリスト
+        engine: ピクセル化の方式（"scale" または "mosaic"）
+    
+    Returns:
+        {解像度: ブロック画像（pygame.Surface）} の辞書
+    """
+    if engine == "mosaic":
+        return mosaic_blocks_bulk([image], resolutions)[0]
+    return {resolution: pixelate_blocks(image, resolution) for resolution in resolutions}
+
+def mosaic_levels(image, resolutions):
+    """
+    1つの画像の全解像度のモザイク画像をまとめて生成する関数
+    
+    Returns:
+        {解像度: pygame.Surface} の辞書
+    """
+    return mosaic_levels_bulk([image], resolutions)[0]
+
+class LRUCache:
+    """
+    件数・容量上限付きの LRU キャッシュ
+    
+    上限を超えた場合は最も長く参照されていないエントリから破棄する
+    """
+    def __init__(self, max_entries=64, max_bytes=None, sizeof=None, on_evict=None):
+        """
+        Args:
+            max_entries: 保持する最大エントリ数
+            max_bytes: 保持する合計サイズの上限（None の場合は制限しない）
+            sizeof: 値のサイズ（バイト数）を返す関数（max_bytes を指定する場合に使用）
+            on_evict: 上限を超えて破棄したエントリについて on_evict(キー, 値) の形で呼び出す関数
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda value: 0)
+        self._on_evict = on_evict
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self.total_bytes = 0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def __contains__(self, key):
+        return key in self._entries
+    
+    def get(self, key, default=None):
+        """キーに対応する値を返す（参照したエントリは最新扱いになる）"""
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            return default
+        return self._entries[key]
+    
+    def put(self, key, value):
+        """値を登録し、上限を超えた分を古い順に破棄する"""
+        self.pop(key)
+        size = self._sizeof(value)
+        self._entries[key] = value
+        self._sizes[key] = size
+        self.total_bytes += size
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes is not None and self.total_bytes > self.max_bytes)):
+            old_key, old_value = self._entries.popitem(last=False)
+            self.total_bytes -= self._sizes.pop(old_key)
+            if self._on_evict is not None:
+                self._on_evict(old_key, old_value)
+    
+    def pop(self, key, default=None):
+        """キーに対応するエントリを削除して値を返す"""
+        if key not in self._entries:
+            return default
+        self.total_bytes -= self._sizes.pop(key)
+        return self._entries.pop(key)
+    
+    def clear(self):
+        """全エントリを破棄する"""
+        self._entries.clear()
+        self._sizes.clear()
+        self.total_bytes = 0
+
+def surface_nbytes(surface):
+    """Surface のピクセルデータのバイト数を返す関数"""
+    return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+def to_display_format(surface):
+    """
+    Surface を画面と同じピクセル形式に変換する関数
+    （描画のたびにピクセル形式を変換しなくて済む。画面をまだ作成していない場合はそのまま返す）
+    """
+    if pygame.display.get_surface() is None:
+        return surface
+    if surface.get_flags() & pygame.SRCALPHA:
+        return surface.convert_alpha()
+    return surface.convert()
+
+class PixelationCache:
+    """
+    アイコンごとのピクセル化画像（解像度ステップ別）を保持するキャッシュ
+    
+    問題が切り替わった時点で全解像度ステップを生成しておけば、
+    描画ループではピクセル化済みの Surface を blit するだけで済む
+    """
+    def __init__(self, max_icons=8, engine=DEFAULT_PIXELATE_ENGINE, variants=None, atlas=None):
+        """
+        Args:
+            max_icons: ピクセル化画像を保持するアイコン数の上限
+            engine: ピクセル化の方式（"scale" または "mosaic"、"mosaic" には NumPy が必要）
+            variants: prerender.py で事前レンダリングしたブロック画像のパック（IconPack または None）
+            atlas: ピクセル化画像と元のアイコンを格納するテクスチャアトラス（TextureAtlas または None）
+        """
+        if engine not in PIXELATE_ENGINES:
+            raise ValueError(f"ピクセル化の方式が正しくありません: {engine}")
+        if engine == "mosaic" and numpy is None:
+            print("警告: NumPy がインストールされていないため、モザイク化の代わりに縮小・拡大でピクセル化します")
+            engine = "scale"
+        self.engine = engine
+        self.variants = variants
+        self.atlas = atlas
+        self._levels = LRUCache(max_icons, on_evict=self._release)
+        self._pending = {}  # 先読み中のキー -> Future
+        self._executor = None
+    
+    def _pixelate(self, image, resolutions):
+        """指定した解像度のピクセル化画像を生成する"""
+        if self.engine == "mosaic":
+            return mosaic_levels(image, resolutions)
+        return {resolution: pixelate_image(image, resolution) for resolution in resolutions}
+    
+    def _entry(self, key):
+        levels = self._levels.get(key)
+        if levels is None:
+            levels = {}
+            self._levels.put(key, levels)
+        return levels
+    
+    def _store(self, key, levels, images):
+        """生成したピクセル化画像を登録する（アトラスがあればアトラスに格納する）"""
+        for level, image in images.items():
+            if self.atlas is not None:
+                image = self.atlas.add((key, level), image) or to_display_format(image)
+            levels[level] = image
+    
+    def _release(self, key, levels):
+        """LRU で破棄したアイコンのアトラスのスロットを解放する"""
+        if self.atlas is not None:
+            for level in levels:
+                self.atlas.remove((key, level))
+    
+    def build(self, key, image, resolutions, variant=None):
+        """
+        指定したアイコンの全解像度ステップを生成する
+        
+        Args:
+            key: アイコンを識別するキー（サービス名）
+            image: 元の画像（pygame.Surface）
+            resolutions: 生成する解像度のリスト
+            variant: 事前レンダリングしたパックを参照する (元ファイルのキー, 署名)
+                （パックに有効なエントリがある解像度は生成せずにパックから読み込む）
+        """
+        self._collect(key, wait=True)
+        levels = self._entry(key)
+        missing = [resolution for resolution in resolutions if resolution not in levels]
+        if missing and variant is not None and self.variants is not None:
+            self._store(key, levels, self._load_variants(image.get_size(), variant, missing))
+            missing = [resolution for resolution in missing if resolution not in levels]
+        if missing:
+            self._store(key, levels, self._pixelate(image, missing))
+        return levels
+    
+    def prefetch(self, key, load, resolutions):
+        """
+        指定したアイコンのピクセル化画像をバックグラウンドで生成しておく（次の問題の先読み）
+        
+        生成した画像は collect（または build）を呼び出した時点でキャッシュに登録する。
+        
+        Args:
+            key: アイコンを識別するキー（サービス名）
+            load: (元の画像, 事前レンダリングしたパックを参照する (元ファイルのキー, 署名) または None) を
+                返す関数（バックグラウンドで呼び出す。読み込めない場合は None を返す）
+            resolutions: 生成する解像度のリスト
+        """
+        if key in self._levels or key in self._pending:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending[key] = self._executor.submit(self._render, load, resolutions)
+    
+    def _render(self, load, resolutions):
+        """
+        ピクセル化画像を生成する（キャッシュやアトラスには触れないため、バックグラウンドで実行できる）
+        
+        Returns:
+            {解像度: pygame.Surface} の辞書（元の画像を読み込めない場合は None）
+        """
+        loaded = load()
+        if loaded is None:
+            return None
+        image, variant = loaded
+        levels = {}
+        if variant is not None and self.variants is not None:
+            levels.update(self._load_variants(image.get_size(), variant, resolutions))
+        missing = [resolution for resolution in resolutions if resolution not in levels]
+        if missing:
+            levels.update(self._pixelate(image, missing))
+        if self.atlas is None:
+            return levels
+        # アトラスへの格納がピクセルのコピーだけで済むよう、画面と同じ形式にしておく
+        levels[ORIGINAL_LEVEL] = image
+        return {level: to_display_format(surface) for level, surface in levels.items()}
+    
+    def collect(self):
+        """先読みが完了したピクセル化画像をキャッシュに登録する（描画ループから毎フレーム呼び出す）"""
+        for key in [key for key, future in self._pending.items() if future.done()]:
+            self._collect(key)
+    
+    def _collect(self, key, wait=False):
+        """先読みしたピクセル化画像をキャッシュに登録する（wait が True の場合は完了を待つ）"""
+        future = self._pending.get(key)
+        if future is None or not (wait or future.done()):
+            return
+        del self._pending[key]
+        try:
+            levels = future.result()
+        except ICON_LOAD_ERRORS as e:
+            print(f"警告: {key} のピクセル化画像を先読みできませんでした: {e}")
+            return
+        if levels:
+            self._store(key, self._entry(key), levels)
+    
+    def _load_variants(self, size, variant, resolutions):
+        """事前レンダリングしたブロック画像を読み込み、元のサイズに引き伸ばす"""
+        source_key, signature = variant
+        levels = {}
+        for resolution in resolutions:
+            entry = self.variants.find(source_key, signature, level=resolution)
+            if entry is not None:
+                try:
+                    block = self.variants.surface(entry)
+                except (ValueError, zlib.error):
+                    continue
+                levels[resolution] = pygame.transform.scale(block, size)
+        return levels
+    
+    def build_many(self, icons, resolutions):
+        """
+        複数のアイコンの全解像度ステップをまとめて生成する
+        （"mosaic" の場合は同じサイズのアイコンを1回の配列演算で処理する）
+        
+        Args:
+            icons: (キー, 画像) のリスト
+            resolutions: 生成する解像度のリスト
+        """
+        if self.engine != "mosaic":
+            for key, image in icons:
+                self.build(key, image, resolutions)
+            return
+        groups = {}
+        for key, image in icons:
+            if key not in self._levels:
+                groups.setdefault(image.get_size(), []).append((key, image))
+        for group in groups.values():
+            for (key, _), levels in zip(group, mosaic_levels_bulk([image for _, image in group], resolutions)):
+                self._store(key, self._entry(key), levels)
+    
+    def get(self, key, image, resolution):
+        """
+        ピクセル化画像を返す（未生成の場合はその場で生成してキャッシュする）
+        
+        Args:
+            key: アイコンを識別するキー（サービス名）
+            image: 元の画像（pygame.Surface）
+            resolution: ピクセル化の解像度
+        
+        Returns:
+            ピクセル化された画像（pygame.Surface）
+        """
+        levels = self._entry(key)
+        pixelated = levels.get(resolution)
+        if pixelated is None:
+            self._store(key, levels, self._pixelate(image, [resolution]))
+            pixelated = levels[resolution]
+        return pixelated
+    
+    def original(self, key, image):
+        """
+        元のアイコンを返す（アトラスがあればアトラスに格納した Surface を返す）
+        
+        Args:
+            key: アイコンを識別するキー（サービス名）
+            image: 元の画像（pygame.Surface）
+        """
+        if self.atlas is None:
+            return image
+        levels = self._entry(key)
+        if ORIGINAL_LEVEL not in levels:
+            self._store(key, levels, {ORIGINAL_LEVEL: image})
+        return levels[ORIGINAL_LEVEL]
+    
+    def clear(self):
+        """キャッシュを破棄する（先読み中の結果も破棄する）"""
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        self._levels.clear()
+        if self.atlas is not None:
+            self.atlas.clear()
+    
+    def close(self):
+        """先読み用のワーカーを停止してキャッシュを破棄し、事前レンダリングしたパックを閉じる"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self.clear()
+        if self.variants is not None:
+            self.variants.close()
+            self.variants = None
+
+class TextCache:
+    """
+    font.render の結果を (フォント, テキスト, 色, アンチエイリアス) ごとに保持するキャッシュ
+    
+    毎フレーム同じ文字列を描画しても、ラスタライズは最初の1回だけで済む
+    （日本語フォントのグリフ描画は特に重い）
+    """
+    def __init__(self, max_entries=256):
+        """
+        Args:
+            max_entries: 保持するテキストの Surface の最大数
+        """
+        self._surfaces = LRUCache(max_entries)
+    
+    def render(self, font, text, color, antialias=True):
+        """
+        テキストを描画した Surface を返す
+        
+        Args:
+            font: pygame.font.Font
+            text: 描画する文字列
+            color: 文字色
+            antialias: アンチエイリアスを有効にするか
+        
+        Returns:
+            テキストを描画した pygame.Surface
+        """
+        key = (font, text, tuple(color), antialias)
+        surface = self._surfaces.get(key)
+        if surface is None:
+            surface = font.render(text, antialias, color)
+            self._surfaces.put(key, surface)
+        return surface
+    
+    def clear(self):
+        """キャッシュを破棄する"""
+        self._surfaces.clear()
+
 def download_aws_icons(url="https://d1.awsstatic.com/webteam/architecture-icons/q1-2025/Asset-Package_02072025.dee42cd0a6eaacc3da1ad9519579357fb546f803.zip"):
     """
-    AWS Architecture Iconsをダウンロードして展開する関数
+    AWS Architecture Iconsをダウンロードする関数
+    
+    ZIPファイルは展開せずに assets/icons に保存し、ゲームはZIPファイルから
+    直接アイコンを読み込む
     
     Args:
         url: AWSアイコンのZIPファイルのURL
     """
     icons_dir = os.path.join("assets", "icons")
+    os.makedirs(icons_dir, exist_ok=True)
+    zip_path = os.path.join(icons_dir, os.path.basename(urllib.parse.urlparse(url).path))
     
     try:
         print(f"AWSサービスアイコンをダウンロード中: {url}")
         
-        # URLからZIPファイルをダウンロード
-        response = urllib.request.urlopen(url)
-        zip_data = io.BytesIO(response.read())
-        
-        # ZIPファイルを展開
-        with zipfile.ZipFile(zip_data) as zip_ref:
-            # 一時ディレクトリに展開
-            temp_dir = os.path.join("assets", "temp")
-            os.makedirs(temp_dir, exist_ok=True)
-            zip_ref.extractall(temp_dir)
-            
-            # アイコンを探して移動
-            for root, dirs, files in os.walk(temp_dir):
-                for file in files:
-                    if file.endswith(".png") or file.endswith(".svg"):
-                        # Architecture-Service-Iconsディレクトリ内のファイルのみコピー
-                        if "Architecture-Service-Icons" in root:
-                            src_path = os.path.join(root, file)
-                            dst_path = os.path.join(icons_dir, file)
-                            shutil.copy2(src_path, dst_path)
-            
-            # 一時ディレクトリを削除
-            shutil.rmtree(temp_dir)
-        
-        print("AWSサービスアイコンのダウンロードと展開が完了しました")
+        # URLからZIPファイルをダウンロード（中断した場合は続きから再開する）
+        download_file(url, zip_path)
+        
+        # ZIPファイルからアイコンを読み込めるか確認
+        source = ZipIconSource(zip_path)
+        icon_count = len(list_icons([source]))
+        source.close()
+        if not icon_count:
+            print(f"エラー: {zip_path} にAWSサービスアイコンが見つかりません")
+            return False
+        
+        print(f"AWSサービスアイコンのダウンロードが完了しました（{icon_count}個のアイコン）")
         return True
     except Exception as e:
         print(f"エラー: AWSサービスアイコンのダウンロード中に問題が発生しました: {e}")
@@ -179,6 +945,14 @@ def create_assets_directory():
             print("AWS サービスアイコンをこのディレクトリに手動で配置してください。")
     else:
         print("assets/icons ディレクトリは既に存在し、ファイルが含まれています。")
+        print("最新のアイコンパッケージと同期しますか？（変更のあったアイコンだけを更新します） (y/n)")
+        response = input().strip().lower()
+        
+        if response == 'y':
+            try:
+                sync_icons()
+            except Exception as e:
+                print(f"エラー: アイコンの同期中に問題が発生しました: {e}")
 
 if __name__ == "__main__":
     # このファイルが直接実行された場合、アセットディレクトリを作成